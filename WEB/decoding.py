@@ -1,4 +1,5 @@
 import numpy as np
+from itertools import chain
 
 
 def forward_backward(lls, tr, ip, fs, evaluate_only=False):
@@ -79,15 +80,77 @@ def nstate_monophn_rec(lls, phns, penalty, sil_index=0):
     return path
 
 
+def _insertion_pass(dist, ins_cost):
+    # dist[j] = min(dist[j], dist[j-1] + ins_cost) for all j from left to right
+    if np.issubdtype(dist.dtype, np.integer):
+        # For integers this is a running minimum of dist[k] - k*ins_cost, shifted back by j*ins_cost.
+        offsets = np.arange(len(dist)) * ins_cost
+        np.minimum.accumulate(dist - offsets, out=dist)
+        dist += offsets
+    else:
+        # float costs are accumulated in the same order as before to keep the results identical
+        for ii in range(len(dist) - 1):
+            if dist[ii + 1] > dist[ii] + ins_cost:
+                dist[ii + 1] = dist[ii] + ins_cost
+    return dist
+
+
+def _bit_parallel_levenshtein_distance(source, target):
+    """
+    Levenshtein distance with unit costs computed by the bit-parallel algorithm of Myers (1999) in the formulation of
+    Hyyro (2001). One column of the dynamic programming matrix is kept as bit vectors of vertical differences, so
+    a column costs a few operations on len(pattern)-bit integers. Symbols must be hashable.
+    """
+    pattern, text = (source, target) if len(source) >= len(target) else (target, source)
+
+    if len(pattern) == 0:
+        return 0
+
+    peq = {}
+    for index, symbol in enumerate(pattern):
+        peq[symbol] = peq.get(symbol, 0) | (1 << index)
+
+    mask = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    pv = mask
+    mv = 0
+    score = len(pattern)
+
+    for symbol in text:
+        eq = peq.get(symbol, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+
+        # the first row of the matrix increases by one in every column
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+
+    return score
+
+
 def levenshtein_distance(source, target, sub_cost=1, ins_cost=1, del_cost=1):
+    if sub_cost == 1 and ins_cost == 1 and del_cost == 1:
+        try:
+            return _bit_parallel_levenshtein_distance(source, target)
+        except TypeError:
+            # unhashable symbols
+            pass
+
     target = np.array(target)
     dist = np.arange(len(target) + 1) * ins_cost
     for s in source:
         dist[1:] = np.minimum(dist[1:] + del_cost, dist[:-1] + (target != s) * sub_cost)
         dist[0] += del_cost
-        for ii in range(len(dist) - 1):
-            if dist[ii + 1] > dist[ii] + ins_cost:
-                dist[ii + 1] = dist[ii] + ins_cost
+        _insertion_pass(dist, ins_cost)
     return dist[-1]
 
 
@@ -137,3 +200,62 @@ def print_confusion_matrix(alig, phns, tab=4, empty_symbol=None):
     for phn, row in zip(list(phns), conf_mx[:-1]):
         print("%" + str(tab) + "s") % phn + (" %" + str(tab) + "s") * (len(phns) + 1) % tuple(row)
     print(" " * (tab - 3) + "Ins") + ((" %" + str(tab) + "s") * len(phns) % tuple(conf_mx[-1][:-1]))
+
+
+def batch_levenshtein_distance(sources, targets, bucket_size=256):
+    """
+    Unit-cost Levenshtein distances of many (source, target) pairs at once. Symbols are encoded to integers, pairs
+    are sorted by length and split into buckets, and every bucket is padded and computed by one dynamic programming
+    pass that is vectorized over all of its pairs. Sequences can be strings (characters) or lists of symbols.
+    """
+    flat_sources = list(chain.from_iterable(sources))
+    flat_targets = list(chain.from_iterable(targets))
+    vocabulary = {symbol: index for index, symbol in enumerate(set(flat_sources).union(flat_targets))}
+
+    source_codes = np.fromiter(map(vocabulary.__getitem__, flat_sources), dtype=np.int64, count=len(flat_sources))
+    target_codes = np.fromiter(map(vocabulary.__getitem__, flat_targets), dtype=np.int64, count=len(flat_targets))
+
+    source_lengths = np.fromiter(map(len, sources), dtype=np.int64, count=len(sources))
+    target_lengths = np.fromiter(map(len, targets), dtype=np.int64, count=len(targets))
+    source_starts = np.cumsum(source_lengths) - source_lengths
+    target_starts = np.cumsum(target_lengths) - target_lengths
+
+    distances = np.zeros(len(sources), dtype=np.int64)
+    order = np.lexsort((source_lengths, target_lengths))
+
+    for start in range(0, len(order), bucket_size):
+        bucket = order[start:start + bucket_size]
+        padded_sources = _pad(source_codes, source_starts[bucket], source_lengths[bucket], -1)
+        padded_targets = _pad(target_codes, target_starts[bucket], target_lengths[bucket], -2)
+        distances[bucket] = _bucket_levenshtein_distance(padded_sources, padded_targets, source_lengths[bucket], target_lengths[bucket])
+
+    return distances
+
+
+def _pad(codes, starts, lengths, padding):
+    # rows of the result are codes[starts[i]:starts[i] + lengths[i]] padded to the same length
+    padded = np.full((len(lengths), max(lengths.max(), 1)), padding, dtype=np.int64)
+
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    columns = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    padded[rows, columns] = codes[np.repeat(starts, lengths) + columns]
+
+    return padded
+
+
+def _bucket_levenshtein_distance(padded_sources, padded_targets, source_lengths, target_lengths):
+    # padding symbols never match, and the padded columns do not influence the columns before them
+    offsets = np.arange(padded_targets.shape[1] + 1)
+    dist = np.tile(offsets, (len(source_lengths), 1))
+    distances = target_lengths.copy()
+
+    for ii in range(source_lengths.max()):
+        substitution = dist[:, :-1] + (padded_targets != padded_sources[:, ii:ii + 1])
+        dist[:, 1:] = np.minimum(dist[:, 1:] + 1, substitution)
+        dist[:, 0] += 1
+        dist = np.minimum.accumulate(dist - offsets, axis=1) + offsets
+
+        finished = np.nonzero(source_lengths == ii + 1)[0]
+        distances[finished] = dist[finished, target_lengths[finished]]
+
+    return distances
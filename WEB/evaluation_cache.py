@@ -0,0 +1,55 @@
+import os
+import threading
+from collections import OrderedDict
+
+import test_transcriptions
+
+
+class GroundTruth:
+    """
+    Ground-truth transcriptions kept in memory. The file is parsed again only when its modification time or size
+    changes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._result = None
+
+    def get(self):
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if version != self._version:
+                self._result = test_transcriptions.load_transcriptions(self.path)
+                self._version = version
+
+            return self._result, self._version
+
+
+class ResultCache:
+    """Least recently used cache of evaluation results, max_entries = 0 disables the cache."""
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,73 @@
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Optional
+from result import Result, Status
+
+
+class JobStatus(Enum):
+    QUEUED = 0
+    RUNNING = 1
+    FINISHED = 2
+
+
+class Job:
+    def __init__(self, id):
+        self.id = id
+        self.status = JobStatus.QUEUED
+        self.result = None
+
+
+class JobQueue:
+    """
+    Runs submitted functions on a bounded pool of worker threads. At most max_pending jobs can wait or run at the
+    same time, further submissions are refused. Only the last max_finished finished jobs are kept for the status
+    requests.
+    """
+    def __init__(self, workers, max_pending, max_finished):
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._pending = 0
+
+    def submit(self, function, *args) -> Optional[Job]:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+
+            job = Job(uuid.uuid4().hex)
+            self._jobs[job.id] = job
+            self._pending += 1
+
+        self._executor.submit(self._run, job, function, args)
+
+        return job
+
+    def get(self, job_id) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, function, args):
+        job.status = JobStatus.RUNNING
+
+        try:
+            job.result = function(*args)
+        except Exception:
+            # the status requests expect a result of every finished job
+            job.result = Result(Status.FAILURE, None, "The job unexpectedly failed.")
+        finally:
+            with self._lock:
+                job.status = JobStatus.FINISHED
+                self._pending -= 1
+                self._forget_finished()
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status == JobStatus.FINISHED]
+
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
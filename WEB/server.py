@@ -1,18 +1,24 @@
 import os
 import sys
 import argparse
+import hashlib
 import uuid
 import config_helper
 import test_transcriptions
 
 from typing import Optional
-from flask import Flask, request, render_template
+from flask import Flask, request, render_template, jsonify, abort
 from eval_data import EvalData
+from evaluation_cache import GroundTruth, ResultCache
+from job_queue import JobQueue, JobStatus
 from result import Result, Status
 
 app = Flask(__name__, template_folder=".")
 
 configuration = None
+ground_truth = None
+result_cache = None
+job_queue = None
 
 
 def parse_args():
@@ -25,42 +31,104 @@ def parse_args():
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        file_path = save_file(request, "bmod_uploaded_transcription_file", configuration["BMOD"]["upload_path"])
+        file_path, content_hash = save_file(request, "bmod_uploaded_transcription_file", configuration["BMOD"]["upload_path"])
 
-        if file_path is not None:
-            result = evaluate(file_path, configuration["BMOD"]["ground_truth_path"])
+        if file_path is None:
+            output = get_page(Result(Status.FAILURE, None, "Could not save file from the request."))
         else:
-            result = Result(Status.FAILURE, None, "Could not save file from the request.")
+            result = get_cached_result(content_hash)
 
-        output = get_page(result)
+            if result is not None:
+                output = get_page(result)
+            else:
+                job = job_queue.submit(evaluate, file_path, content_hash, configuration["BMOD"].get("evaluation_workers", 1))
+
+                if job is not None:
+                    output = render_template('bmod.html', job_id=job.id)
+                else:
+                    output = get_page(Result(Status.FAILURE, None, "Too many submissions are being evaluated, please try it again later."))
     else:
         output = get_page()
 
     return output
 
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+
+    output = {"id": job.id, "status": job.status.name.lower()}
+
+    if job.status == JobStatus.FINISHED:
+        output["success"] = job.result.status == Status.SUCCESS
+        output["message"] = job.result.message
+
+        if job.result.status == Status.SUCCESS:
+            output["cer"] = float(job.result.data.cer)
+            output["wer"] = float(job.result.data.wer)
+
+    return jsonify(output)
+
+
+@app.route('/results/<job_id>', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        abort(404)
+
+    if job.status != JobStatus.FINISHED:
+        return render_template('bmod.html', job_id=job.id)
+
+    return get_page(job.result)
+
+
 def save_file(req, input_name, path):
     if not os.path.exists(path):
         os.makedirs(path)
 
     file_path = None
+    content_hash = None
     name = uuid.uuid4().hex + ".txt"
 
     if input_name in req.files:
-        file = req.files[input_name]
+        content = req.files[input_name].read()
+        content_hash = hashlib.sha256(content).hexdigest()
         file_path = os.path.join(path, name)
-        file.save(file_path)
 
-    return file_path
+        with open(file_path, "wb") as f:
+            f.write(content)
+
+    return file_path, content_hash
+
+
+def get_cached_result(content_hash):
+    try:
+        _, version = ground_truth.get()
+    except OSError:
+        return None
+
+    return result_cache.get((content_hash, version))
 
 
-def evaluate(transcription_path, ground_truth_path):
+def evaluate(transcription_path, content_hash, workers=1):
     try:
-        result = test_transcriptions.test_files(transcription_path, ground_truth_path)
-        cer, wer = result.data
-        result = Result(result.status, EvalData(transcription_path, cer, wer), result.message)
+        ground_truths_result, version = ground_truth.get()
+        if ground_truths_result.status == Status.FAILURE:
+            return ground_truths_result
+
+        # results are valid only for the ground truth they were computed with
+        key = (content_hash, version)
+        result = result_cache.get(key)
+
+        if result is None:
+            result = test_transcriptions.test_file(transcription_path, ground_truths_result.data, workers)
+            cer, wer = result.data
+            result = Result(result.status, EvalData(transcription_path, cer, wer), result.message)
+            result_cache.put(key, result)
     except:
-        result = Result(Status.FAILURE, "Something unexpectedly failed during evaluation.")
+        result = Result(Status.FAILURE, None, "Something unexpectedly failed during evaluation.")
 
     return result
 
@@ -81,8 +149,11 @@ def get_page(result: Optional[Result] = None):
 def main():
     args = parse_args()
 
-    global configuration
+    global configuration, ground_truth, result_cache, job_queue
     configuration = config_helper.parse_configuration(args.config_file)
+    ground_truth = GroundTruth(configuration["BMOD"]["ground_truth_path"])
+    result_cache = ResultCache(configuration["BMOD"].get("result_cache_size", 0))
+    job_queue = JobQueue(configuration["BMOD"].get("job_workers", 1), configuration["BMOD"].get("job_queue_size", 16), configuration["BMOD"].get("job_retention", 1000))
 
     host = configuration["common"]["host"]
     port = configuration["common"]["port"]
@@ -1,5 +1,25 @@
 window.onload = function () {
     document.getElementById("bmod_upload_file_input").addEventListener("change", updateInputText);
+
+    var jobId = document.getElementById("pending_block").getAttribute("data-job-id");
+    if (jobId) {
+        waitForJob(jobId);
+    }
+}
+
+function waitForJob(jobId) {
+    var request = new XMLHttpRequest();
+
+    request.onload = function () {
+        if (request.status === 200 && JSON.parse(request.responseText).status === "finished") {
+            window.location = "/results/" + jobId;
+        } else {
+            setTimeout(function () { waitForJob(jobId); }, 2000);
+        }
+    }
+
+    request.open("GET", "/jobs/" + jobId);
+    request.send();
 }
 
 function updateInputText() {
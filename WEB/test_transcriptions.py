@@ -1,15 +1,17 @@
-import os
 import sys
 import argparse
+import numpy as np
+import decoding
+from multiprocessing import get_context
 from transcription import Transcription
 from result import Status, Result
-from eval_data import EvalData
 
 
 def parse_arguments():
     parser = argparse.ArgumentParser()
     parser.add_argument('-t', '--transcriptions', help='Path to transcriptions file.', required=True)
     parser.add_argument('-g', '--ground-truth', help='Path to ground truth file.', required=True)
+    parser.add_argument('-w', '--workers', help='Number of processes used for large submissions.', type=int, default=1)
     args = parser.parse_args()
     return args
 
@@ -34,7 +36,30 @@ def load_transcriptions(path):
     return Result(Status.SUCCESS, transcriptions)
 
 
-def test(transcriptions, ground_truths):
+# below this number of lines the submission is evaluated in a single process
+PARALLEL_EVALUATION_THRESHOLD = 20000
+
+
+def calculate_distances(sources, targets, workers=1):
+    if workers <= 1 or len(sources) < PARALLEL_EVALUATION_THRESHOLD:
+        return decoding.batch_levenshtein_distance(sources, targets)
+
+    # pairs sorted by length are dealt to the workers in turns, so every worker gets similar amount of work
+    order = np.argsort([len(target) for target in targets], kind="stable")
+    chunks = [order[index::workers] for index in range(workers)]
+
+    # the evaluation runs in a thread of the web server, forking a multithreaded process could deadlock the workers
+    with get_context("spawn").Pool(workers) as pool:
+        results = pool.starmap(decoding.batch_levenshtein_distance, [([sources[i] for i in chunk], [targets[i] for i in chunk]) for chunk in chunks])
+
+    distances = np.zeros(len(sources), dtype=np.int64)
+    for chunk, result in zip(chunks, results):
+        distances[chunk] = result
+
+    return distances
+
+
+def test(transcriptions, ground_truths, workers=1):
     lines_result = process_lines(transcriptions, ground_truths)
     if lines_result.status == Status.FAILURE:
         return lines_result
@@ -43,8 +68,11 @@ def test(transcriptions, ground_truths):
     if len(lines) == 0:
         return Result(Status.FAILURE, None, "There are no lines to calculate CER and WER.")
 
-    cer = float(sum([line.char_distance() for line in lines])) / sum([len(line.ground_truth) for line in lines])
-    wer = float(sum([line.word_distance() for line in lines])) / sum([len(line.ground_truth.split()) for line in lines])
+    char_distances = calculate_distances([line.transcription for line in lines], [line.ground_truth for line in lines], workers)
+    word_distances = calculate_distances([line.transcription.split() for line in lines], [line.ground_truth.split() for line in lines], workers)
+
+    cer = float(char_distances.sum()) / sum([len(line.ground_truth) for line in lines])
+    wer = float(word_distances.sum()) / sum([len(line.ground_truth.split()) for line in lines])
 
     return Result(Status.SUCCESS, (cer, wer))
 
@@ -71,11 +99,12 @@ def process_lines(transcriptions, ground_truths):
     return Result(Status.SUCCESS, lines, message=message)
 
 
-def test_files(transcriptions_path: str, ground_truths_path: str) -> Result:
+def test_file(transcriptions_path: str, ground_truths: dict, workers: int = 1) -> Result:
     '''
     Args:
         transcriptions_path (str): Path to transcription file.
-        ground_truths_path (str): Path to ground-truth file.
+        ground_truths (dict): Already loaded ground-truth transcriptions.
+        workers (int): Number of processes used for large submissions.
 
     Returns:
         Result: Result object with success status and optionally with data or with detailed information about failure.
@@ -84,19 +113,30 @@ def test_files(transcriptions_path: str, ground_truths_path: str) -> Result:
     if transcriptions_result.status == Status.FAILURE:
         return transcriptions_result
 
+    return test(transcriptions_result.data, ground_truths, workers)
+
+
+def test_files(transcriptions_path: str, ground_truths_path: str, workers: int = 1) -> Result:
+    '''
+    Args:
+        transcriptions_path (str): Path to transcription file.
+        ground_truths_path (str): Path to ground-truth file.
+        workers (int): Number of processes used for large submissions.
+
+    Returns:
+        Result: Result object with success status and optionally with data or with detailed information about failure.
+    '''
     ground_truths_result = load_transcriptions(ground_truths_path)
     if ground_truths_result.status == Status.FAILURE:
         return ground_truths_result
 
-    result = test(transcriptions_result.data, ground_truths_result.data)
-
-    return result
+    return test_file(transcriptions_path, ground_truths_result.data, workers)
 
 
 def main():
     args = parse_arguments()
 
-    result = test_files(args.transcriptions, args.ground_truth)
+    result = test_files(args.transcriptions, args.ground_truth, args.workers)
     if result.status == Status.SUCCESS:
         cer, wer = result.data
         print("CER: {cer}\nWER: {wer}".format(cer=cer, wer=wer))
@@ -0,0 +1,364 @@
+import io
+import os
+import re
+import sys
+import time
+import random
+import threading
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import decoding
+import test_transcriptions
+from evaluation_cache import GroundTruth, ResultCache
+import server
+from eval_data import EvalData
+from job_queue import JobQueue, JobStatus
+from result import Result, Status
+
+
+def parse_arguments():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-v", "--verbose", help="Verbose.", required=False, default=False, action="store_true")
+    args = parser.parse_args()
+    return args
+
+
+def random_texts(count, max_length, seed=42):
+    generator = random.Random(seed)
+    alphabet = "abcdeěščřžý "
+    return [("".join(generator.choice(alphabet) for _ in range(generator.randint(0, max_length))),
+             "".join(generator.choice(alphabet) for _ in range(generator.randint(0, max_length)))) for _ in range(count)]
+
+
+class BatchLevenshteinDistanceTests(unittest.TestCase):
+    def assert_pairwise(self, sources, targets, distances):
+        self.assertEqual(len(distances), len(sources))
+        self.assertEqual(list(distances), [decoding.levenshtein_distance(source, target) for source, target in zip(sources, targets)])
+
+    def test_characters(self):
+        sources, targets = zip(*random_texts(500, 40))
+        self.assert_pairwise(sources, targets, decoding.batch_levenshtein_distance(sources, targets))
+
+    def test_words(self):
+        sources, targets = zip(*random_texts(500, 60))
+        sources = [source.split() for source in sources]
+        targets = [target.split() for target in targets]
+        self.assert_pairwise(sources, targets, decoding.batch_levenshtein_distance(sources, targets))
+
+    def test_empty(self):
+        sources = ["", "", "abc", "", "a"]
+        targets = ["", "abc", "", "", "a"]
+        self.assertEqual(list(decoding.batch_levenshtein_distance(sources, targets)), [0, 3, 3, 0, 0])
+        self.assertEqual(list(decoding.batch_levenshtein_distance([], [])), [])
+        self.assertEqual(list(decoding.batch_levenshtein_distance([""] * 3, [""] * 3)), [0, 0, 0])
+        self.assertEqual(list(decoding.batch_levenshtein_distance([[]], [["slovo"]])), [1])
+
+    def test_bucket_boundaries(self):
+        pairs = random_texts(1100, 30)
+
+        for count in [1, 255, 256, 257, 512, 513]:
+            sources, targets = zip(*pairs[:count])
+            self.assert_pairwise(sources, targets, decoding.batch_levenshtein_distance(sources, targets))
+
+        # the lengths change inside the buckets and between them
+        sources, targets = zip(*pairs[:50])
+        for bucket_size in [1, 2, 3, 7, 49, 50, 51]:
+            self.assert_pairwise(sources, targets, decoding.batch_levenshtein_distance(sources, targets, bucket_size=bucket_size))
+
+    def test_lengths_at_bucket_boundaries(self):
+        # pairs sorted by length are split into buckets, the neighbouring buckets get very different lengths
+        sources = ["a" * length for length in [0, 1, 255, 256, 257, 0, 1, 2]]
+        targets = ["b" * length + "a" for length in [256, 0, 1, 255, 0, 257, 3, 2]]
+
+        for bucket_size in [1, 2, 3, 256]:
+            self.assert_pairwise(sources, targets, decoding.batch_levenshtein_distance(sources, targets, bucket_size=bucket_size))
+
+    def test_parallel_evaluation(self):
+        sources, targets = zip(*random_texts(test_transcriptions.PARALLEL_EVALUATION_THRESHOLD + 1, 12))
+        sources, targets = list(sources), list(targets)
+
+        serial = test_transcriptions.calculate_distances(sources, targets)
+        parallel = test_transcriptions.calculate_distances(sources, targets, workers=3)
+
+        self.assertEqual(parallel.tolist(), serial.tolist())
+        self.assert_pairwise(sources[:2000], targets[:2000], parallel[:2000])
+        self.assert_pairwise(sources[-2000:], targets[-2000:], parallel[-2000:])
+
+        sources = [source.split() for source in sources]
+        targets = [target.split() for target in targets]
+        self.assertEqual(test_transcriptions.calculate_distances(sources, targets, workers=2).tolist(), test_transcriptions.calculate_distances(sources, targets).tolist())
+
+
+class GroundTruthTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.ground_truth_path = os.path.join(self.path, "lines.tst")
+        self.write("line1 first line\nline2 second\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, content):
+        with open(self.ground_truth_path, "w") as f:
+            f.write(content)
+
+    def test_loaded_once(self):
+        ground_truth = GroundTruth(self.ground_truth_path)
+        result, version = ground_truth.get()
+
+        self.assertEqual(result.status, Status.SUCCESS)
+        self.assertEqual(result.data, {"line1": "first line", "line2": "second"})
+        self.assertIs(ground_truth.get()[0], result)
+        self.assertEqual(ground_truth.get()[1], version)
+
+    def test_reloaded_when_changed(self):
+        ground_truth = GroundTruth(self.ground_truth_path)
+        result, version = ground_truth.get()
+
+        self.write("line1 first line\nline2 second\nline3 third\n")
+        changed, changed_version = ground_truth.get()
+
+        self.assertNotEqual(changed_version, version)
+        self.assertEqual(changed.data["line3"], "third")
+
+        # the same size, only the modification time changes
+        stat = os.stat(self.ground_truth_path)
+        os.utime(self.ground_truth_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        touched, touched_version = ground_truth.get()
+
+        self.assertIsNot(touched, changed)
+        self.assertNotEqual(touched_version, changed_version)
+        self.assertEqual(touched.data, changed.data)
+
+    def test_missing_file(self):
+        with self.assertRaises(OSError):
+            GroundTruth(os.path.join(self.path, "missing.tst")).get()
+
+
+class ResultCacheTests(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = ResultCache(3)
+
+        for key in "abc":
+            cache.put(key, key.upper())
+
+        # a is used, so b is the least recently used entry
+        self.assertEqual(cache.get("a"), "A")
+        cache.put("d", "D")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual([cache.get(key) for key in "acd"], ["A", "C", "D"])
+
+        # putting an existing key refreshes it as well
+        cache.put("a", "A2")
+        cache.put("e", "E")
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual([cache.get(key) for key in "ade"], ["A2", "D", "E"])
+
+    def test_size(self):
+        cache = ResultCache(2)
+
+        for index in range(10):
+            cache.put(index, index)
+
+        self.assertEqual([cache.get(index) for index in range(10)], [None] * 8 + [8, 9])
+
+    def test_disabled(self):
+        cache = ResultCache(0)
+        cache.put("a", "A")
+        self.assertIsNone(cache.get("a"))
+
+
+def wait_until(condition, timeout=10.0):
+    end = time.monotonic() + timeout
+
+    while not condition():
+        if time.monotonic() > end:
+            raise AssertionError("Condition was not met in {timeout} s.".format(timeout=timeout))
+
+        time.sleep(0.01)
+
+
+class JobQueueTests(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+
+    def blocked(self, value):
+        self.release.wait()
+        return value
+
+    def test_status_and_result(self):
+        queue = JobQueue(workers=1, max_pending=4, max_finished=10)
+        first = queue.submit(self.blocked, "first")
+        second = queue.submit(self.blocked, "second")
+
+        wait_until(lambda: first.status == JobStatus.RUNNING)
+        self.assertEqual(second.status, JobStatus.QUEUED)
+        self.assertIs(queue.get(first.id), first)
+        self.assertIsNone(queue.get("unknown"))
+
+        self.release.set()
+        wait_until(lambda: second.status == JobStatus.FINISHED)
+        self.assertEqual((first.result, second.result), ("first", "second"))
+
+    def test_refused_when_full(self):
+        queue = JobQueue(workers=1, max_pending=2, max_finished=10)
+        jobs = [queue.submit(self.blocked, index) for index in range(2)]
+
+        self.assertIsNone(queue.submit(self.blocked, 2))
+
+        self.release.set()
+        wait_until(lambda: all(job.status == JobStatus.FINISHED for job in jobs))
+
+        job = queue.submit(self.blocked, 3)
+        self.assertIsNotNone(job)
+        wait_until(lambda: job.status == JobStatus.FINISHED)
+        self.assertEqual(job.result, 3)
+
+    def test_retention(self):
+        queue = JobQueue(workers=1, max_pending=4, max_finished=2)
+        self.release.set()
+        jobs = []
+
+        for index in range(4):
+            jobs.append(queue.submit(self.blocked, index))
+            wait_until(lambda: jobs[-1].status == JobStatus.FINISHED)
+
+        # only the last max_finished finished jobs are kept
+        self.assertEqual([queue.get(job.id) for job in jobs], [None, None, jobs[2], jobs[3]])
+
+    def test_failing_job_is_finished(self):
+        queue = JobQueue(workers=1, max_pending=1, max_finished=10)
+        job = queue.submit(lambda: 1 / 0)
+
+        wait_until(lambda: job.status == JobStatus.FINISHED)
+        self.assertEqual(job.result.status, Status.FAILURE)
+        self.assertIsNotNone(queue.submit(self.blocked, 0))
+
+
+class ServerTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        ground_truth_path = os.path.join(self.path, "lines.tst")
+
+        with open(ground_truth_path, "w") as f:
+            f.write("line1 text\n")
+
+        self.release = threading.Event()
+        self.result = Result(Status.SUCCESS, EvalData("submission", 0.25, 0.5))
+        self.evaluated = []
+
+        self.original = (server.configuration, server.ground_truth, server.result_cache, server.job_queue, server.evaluate)
+        server.configuration = {"BMOD": {"upload_path": os.path.join(self.path, "uploaded"), "evaluation_workers": 1}}
+        server.ground_truth = GroundTruth(ground_truth_path)
+        server.result_cache = ResultCache(4)
+        server.job_queue = JobQueue(workers=1, max_pending=1, max_finished=10)
+        server.evaluate = self.evaluate
+
+        self.client = server.app.test_client()
+
+    def tearDown(self):
+        self.release.set()
+        server.configuration, server.ground_truth, server.result_cache, server.job_queue, server.evaluate = self.original
+        shutil.rmtree(self.path)
+
+    def evaluate(self, transcription_path, content_hash, workers=1):
+        self.evaluated.append(transcription_path)
+        self.release.wait()
+        return self.result
+
+    def submit(self, content=b"line1 text\n"):
+        response = self.client.post("/", data={"bmod_uploaded_transcription_file": (io.BytesIO(content), "transcriptions.txt")}, content_type="multipart/form-data")
+        self.assertEqual(response.status_code, 200)
+
+        match = re.search(r'data-job-id="([0-9a-f]*)"', response.get_data(as_text=True))
+        return match.group(1) if match is not None else "", response.get_data(as_text=True)
+
+    def get_status(self, job_id):
+        response = self.client.get("/jobs/" + job_id)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_job_flow(self):
+        job_id, _ = self.submit()
+        self.assertNotEqual(job_id, "")
+        self.assertIn(self.get_status(job_id)["status"], ["queued", "running"])
+
+        # the result page keeps polling until the job is finished
+        pending = self.client.get("/results/" + job_id).get_data(as_text=True)
+        self.assertIn('data-job-id="{job_id}"'.format(job_id=job_id), pending)
+
+        self.release.set()
+        wait_until(lambda: self.get_status(job_id)["status"] == "finished")
+
+        self.assertEqual(self.get_status(job_id), {"id": job_id, "status": "finished", "success": True, "message": "", "cer": 0.25, "wer": 0.5})
+        finished = self.client.get("/results/" + job_id).get_data(as_text=True)
+        self.assertIn("<td>0.25</td>", finished)
+        self.assertEqual(len(self.evaluated), 1)
+        self.assertTrue(os.path.exists(self.evaluated[0]))
+
+    def test_failed_evaluation(self):
+        self.result = Result(Status.FAILURE, None, "Missing lines.")
+        self.release.set()
+
+        job_id, _ = self.submit()
+        wait_until(lambda: self.get_status(job_id)["status"] == "finished")
+
+        self.assertEqual(self.get_status(job_id), {"id": job_id, "status": "finished", "success": False, "message": "Missing lines."})
+        self.assertIn("Error message: Missing lines.", self.client.get("/results/" + job_id).get_data(as_text=True))
+
+    def test_refused_when_queue_is_full(self):
+        job_id, _ = self.submit()
+        refused_id, page = self.submit(b"line1 other text\n")
+
+        self.assertEqual(refused_id, "")
+        self.assertIn("Too many submissions", page)
+
+        self.release.set()
+        wait_until(lambda: self.get_status(job_id)["status"] == "finished")
+        self.assertNotEqual(self.submit(b"line1 other text\n")[0], "")
+
+    def test_cached_result(self):
+        server.result_cache.put((server.hashlib.sha256(b"line1 text\n").hexdigest(), server.ground_truth.get()[1]), self.result)
+
+        job_id, page = self.submit()
+
+        self.assertEqual(job_id, "")
+        self.assertIn("<td>0.25</td>", page)
+        self.assertEqual(self.evaluated, [])
+
+    def test_unexpected_error(self):
+        def evaluate(transcription_path, content_hash, workers=1):
+            raise RuntimeError("unexpected")
+
+        server.evaluate = evaluate
+        job_id, _ = self.submit()
+        wait_until(lambda: self.get_status(job_id)["status"] == "finished")
+
+        self.assertFalse(self.get_status(job_id)["success"])
+        self.assertEqual(self.client.get("/results/" + job_id).status_code, 200)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/jobs/unknown").status_code, 404)
+        self.assertEqual(self.client.get("/results/unknown").status_code, 404)
+
+
+def main():
+    args = parse_arguments()
+
+    if args.verbose:
+        suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
+        unittest.TextTestRunner(verbosity=2).run(suite)
+    else:
+        unittest.main()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
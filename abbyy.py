@@ -2,15 +2,25 @@ import sys
 from lxml import etree
 from os import listdir
 from os.path import isfile, join, abspath
-import re
+from io import BytesIO
+
+from batch_conversion import convert_directory
 
 
 def parse_arguments():
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input-file', help='Path to input file.', required=True)
-    parser.add_argument('-o', '--output-file', help='Path to output file.', required=True)
+    parser.add_argument('-i', '--input-file', help='Path to input file.', required=False, default=None)
+    parser.add_argument('-o', '--output-file', help='Path to output file.', required=False, default=None)
+    parser.add_argument('--input-folder', help='Path to folder with input files (*.htm) converted in batch mode.', required=False, default=None)
+    parser.add_argument('--output-folder', help='Path to output folder of batch mode.', required=False, default=None)
+    parser.add_argument('-w', '--workers', help='Number of processes used in batch mode.', required=False, default=1, type=int)
+    parser.add_argument('--force', help='Convert also files whose output is newer than the input in batch mode.', required=False, default=False, action='store_true')
     args = parser.parse_args()
+
+    if (args.input_file is None) == (args.input_folder is None) or (args.input_file is None) != (args.output_file is None) or (args.input_folder is None) != (args.output_folder is None):
+        parser.error("either --input-file and --output-file or --input-folder and --output-folder are required")
+
     return args
 
 
@@ -32,49 +42,64 @@ def process_paragraph(lines, output):
         process_line(line, region)
 
 
-def process(original_content):
-    html_tag_position = original_content.find("<html")
+def process(content):
+    """
+    Converts ABBYY HTML export (str or UTF-8 bytes) to PAGE XML in a single pass. Every paragraph becomes a TextRegion
+    with a TextLine for each of its non-blank text nodes.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    html_tag_position = content.find(b"<html")
     if html_tag_position < 0:
         return None
 
-    content = original_content[html_tag_position:]
-    content = re.sub("&.*?;", "", content)
-
-    content = bytes(content.encode(encoding="utf16"))
+    source = BytesIO(content)
+    source.seek(html_tag_position)
 
-    parser = etree.XMLParser(recover=True)
+    output_root = etree.Element("PcGts")
+    page = etree.SubElement(output_root, "Page")
 
-    try:
-        root = etree.fromstring(content, parser)
-    except Exception as e:
-        print(e)
-        sys.exit(1)
+    for _, element in etree.iterparse(source, events=("end",), tag="p", html=True, encoding="utf-8"):
+        process_paragraph([text for text in element.itertext() if len(text.strip()) > 0], page)
 
-    output_root = etree.Element("PcGts")    
-    page = etree.SubElement(output_root, "Page")
-    
-    for element in root.iter():
-        if element.tag == "p":
-            lines = element.xpath("descendant-or-self::*/text()")
-            process_paragraph(lines, page)
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
 
     return output_root
 
 
-def main():
-    args = parse_arguments()
-
+def convert_file(input_file, output_file):
     content = None
-    with open(args.input_file, "r") as f:
+    with open(input_file, "rb") as f:
         content = f.read()
 
     output = process(content)
 
-    if output is not None:
-        output_xml_string = str(etree.tostring(output, pretty_print=True).decode("utf-8"))
+    if output is None:
+        return False
+
+    output_xml_string = str(etree.tostring(output, pretty_print=True).decode("utf-8"))
+
+    with open(output_file, "w") as f:
+        f.write(output_xml_string)
+
+    return True
+
+
+def main():
+    args = parse_arguments()
+
+    if args.input_folder is not None:
+        failures = convert_directory(convert_file, args.input_folder, args.output_folder, ".htm", args.workers, not args.force)
+        return 1 if len(failures) > 0 else 0
 
-        with open(args.output_file, "w") as f:
-            f.write(output_xml_string)
+    try:
+        convert_file(args.input_file, args.output_file)
+    except Exception as e:
+        print(e)
+        return 1
 
     return 0
 
@@ -0,0 +1,91 @@
+import os
+import time
+from os.path import join, splitext
+from multiprocessing import Pool
+from typing import List, Tuple
+
+
+def get_tasks(convert, input_folder, output_folder, input_extension, skip_up_to_date=True) -> Tuple[list, int]:
+    """
+    Pairs of input and output files of the input folder, outputs are named after the inputs with the .xml extension.
+    Files whose output is newer than the input are skipped when skip_up_to_date is set.
+    """
+    tasks = []
+    skipped = 0
+
+    for name in sorted(os.listdir(input_folder)):
+        if not name.endswith(input_extension):
+            continue
+
+        input_path = join(input_folder, name)
+        output_path = join(output_folder, splitext(name)[0] + ".xml")
+
+        if skip_up_to_date and os.path.exists(output_path) and os.stat(output_path).st_mtime_ns > os.stat(input_path).st_mtime_ns:
+            skipped += 1
+            continue
+
+        tasks.append((convert, input_path, output_path))
+
+    return tasks, skipped
+
+
+def convert_task(task):
+    """Converts one file, the output is written atomically. Returns the error message or None."""
+    convert, input_path, output_path = task
+    temporary_path = output_path + ".tmp"
+
+    try:
+        if not convert(input_path, temporary_path):
+            return "no output"
+
+        os.replace(temporary_path, output_path)
+    except Exception as e:
+        return "{name}: {message}".format(name=type(e).__name__, message=e)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+    return None
+
+
+def collect_failures(tasks, results) -> List[Tuple[str, str]]:
+    failures = []
+
+    for index, (task, error) in enumerate(zip(tasks, results)):
+        if error is not None:
+            failures.append((task[1], error))
+
+        print("\r{current}/{total} ({percentage:.2f} %)".format(current=index + 1, total=len(tasks), percentage=100 * float(index + 1) / len(tasks)), end="")
+
+    return failures
+
+
+def convert_directory(convert, input_folder, output_folder, input_extension, workers=1, skip_up_to_date=True) -> List[Tuple[str, str]]:
+    """
+    Converts all files with the extension from the input folder by convert(input_path, output_path), which returns
+    whether the output was written. The files are converted in a pool of workers, convert has to be a module-level
+    function. Prints the throughput and the failures, returns the list of failed files and the errors.
+    """
+    start = time.perf_counter()
+
+    os.makedirs(output_folder, exist_ok=True)
+    tasks, skipped = get_tasks(convert, input_folder, output_folder, input_extension, skip_up_to_date)
+
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers) as pool:
+            failures = collect_failures(tasks, pool.imap(convert_task, tasks, chunksize=4))
+    else:
+        failures = collect_failures(tasks, map(convert_task, tasks))
+
+    duration = time.perf_counter() - start
+
+    print()
+    print("Converted:", len(tasks) - len(failures))
+    print("Skipped (up to date):", skipped)
+    print("Failed:", len(failures))
+    print("Time: {duration:0.2f} s ({speed:0.1f} files/s)".format(duration=duration, speed=len(tasks) / duration if duration > 0 else 0.0))
+
+    for path, error in failures:
+        print("  {path}: {error}".format(path=path, error=error))
+
+    return failures
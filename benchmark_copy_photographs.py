@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import cv2
+import numpy as np
+
+import copy_photographs
+
+
+def parse_arguments(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--size", help="Number of generated photographs.", required=False, default=8, type=int)
+    parser.add_argument("--width", help="Width of the generated photographs, the height is 4/3 of the width.", required=False, default=3000, type=int)
+    args = parser.parse_args(argv)
+    return args
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - start
+
+
+def print_measurement(name, duration):
+    print("{name:40} {duration:10.4f} s".format(name=name, duration=duration))
+
+
+# Rotation search as it was before the resized warping, with the cv2 constants of the current OpenCV.
+def find_rotation_original(original_image, rectified_image, transformation):
+    rec_height, rec_width, _ = rectified_image.shape
+
+    def calculate_similarity(img1, img2, scale=0.25):
+        i1 = cv2.resize(img1, (0, 0), fx=scale, fy=scale)
+        i2 = cv2.resize(img2, (0, 0), fx=scale, fy=scale)
+        return cv2.matchTemplate(i1, i2, cv2.TM_SQDIFF)[0][0]
+
+    rotated = [original_image, cv2.rotate(original_image, cv2.ROTATE_90_CLOCKWISE), cv2.rotate(original_image, cv2.ROTATE_180),
+               cv2.rotate(original_image, cv2.ROTATE_90_COUNTERCLOCKWISE)]
+    scores = [calculate_similarity(cv2.warpPerspective(image, transformation, (rec_width, rec_height)), rectified_image) for image in rotated]
+
+    return rotated[int(np.argmin(scores))]
+
+
+def process_photo_original(task):
+    original_photo_path, rectified_photo_path, transformation, output_photo_path = task
+    original_image = cv2.imread(original_photo_path)
+    rectified_image = cv2.imread(rectified_photo_path)
+    cv2.imwrite(output_photo_path, find_rotation_original(original_image, rectified_image, transformation))
+    return output_photo_path
+
+
+def generate_photographs(folder, count, width, height, seed=42):
+    generator = np.random.default_rng(seed)
+    transformation = np.array([[0.8, 0.05, -20], [-0.03, 0.82, 15], [1e-5, -2e-5, 1.0]])
+    tasks = []
+
+    for index in range(count):
+        # smooth random colors survive the downscaling, the photograph is stored in a random rotation
+        photograph = cv2.resize(generator.integers(0, 255, (height // 100, width // 100, 3), dtype=np.uint8), (width, height), interpolation=cv2.INTER_CUBIC)
+        rectified = cv2.warpPerspective(photograph, transformation, (int(width * 0.8), int(height * 0.8)))
+        stored = copy_photographs.rotate(photograph, copy_photographs.ROTATIONS[index % 4])
+
+        original_path, rectified_path = os.path.join(folder, "original{index}.jpg".format(index=index)), os.path.join(folder, "rectified{index}.jpg".format(index=index))
+        cv2.imwrite(original_path, stored)
+        cv2.imwrite(rectified_path, rectified)
+        tasks.append((original_path, rectified_path, transformation, os.path.join(folder, "output{index}.jpg".format(index=index))))
+
+    return tasks
+
+
+def run_photos(function, tasks):
+    return [function(task) for task in tasks]
+
+
+def get_digests(tasks):
+    digests = []
+
+    for task in tasks:
+        with open(task[3], "rb") as f:
+            digests.append(hashlib.sha1(f.read()).hexdigest())
+
+    return digests
+
+
+def benchmark_copy_photographs(args):
+    folder = tempfile.mkdtemp()
+
+    try:
+        tasks = generate_photographs(folder, args.size, args.width, args.width * 4 // 3)
+
+        _, duration = measure(run_photos, process_photo_original, tasks)
+        print_measurement("per photo original", duration / len(tasks))
+        original = get_digests(tasks)
+
+        _, duration = measure(run_photos, copy_photographs.process_photo, tasks)
+        print_measurement("per photo current", duration / len(tasks))
+        current = get_digests(tasks)
+    finally:
+        shutil.rmtree(folder)
+
+    # the same rotation has to be chosen, the outputs are written from the same decoded image
+    same = original == current
+    if not same:
+        print("Results differ!")
+
+    return same
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    return 0 if benchmark_copy_photographs(args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
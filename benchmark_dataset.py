@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import resource
+import tempfile
+import tracemalloc
+from lxml import etree
+from multiprocessing import get_context
+
+from dataset import Baseline, BoundingBox, Dataset, Line, Page, Point
+
+
+def parse_arguments(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", help="Benchmark to run.", choices=sorted(BENCHMARKS.keys()))
+    parser.add_argument("-d", "--dataset", help="Path to dataset used instead of generated lines.", required=False, default=None)
+    parser.add_argument("-n", "--size", help="Number of generated lines.", required=False, default=100000, type=int)
+    args = parser.parse_args(argv)
+    return args
+
+
+def measure(function, *args, trace_memory=False):
+    peak = None
+
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return result, duration, peak
+
+
+def run_in_process(function, *args):
+    with get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def measure_in_process(function, summarize, *args):
+    # lxml allocates outside of the Python heap, so the memory is measured as the growth of the maximum resident set
+    # size of a fresh process; the maximum is inherited from the parent, so only a summary of the result is returned
+    # to keep the parent small
+    return run_in_process(_measure_in_process, function, summarize, *args)
+
+
+def _measure_in_process(function, summarize, *args):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result, duration, _ = measure(function, *args)
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) * 1024
+
+    return summarize(result), duration, peak
+
+
+def print_measurement(name, duration, peak=None):
+    output = "{name:40} {duration:10.4f} s".format(name=name, duration=duration)
+
+    if peak is not None:
+        output += " {peak:10.2f} MB".format(peak=peak / 1024 / 1024)
+
+    print(output)
+
+
+# Geometry classes as they were before __slots__ were introduced, used as the baseline.
+class DictPoint:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class DictRectangle:
+    def __init__(self, start, end, inner_points):
+        self.start = start
+        self.end = end
+        self.inner_points = inner_points
+
+
+class DictLine:
+    def __init__(self, text, bounding_box, baseline, confidence):
+        self.text = text
+        self.bounding_box = bounding_box
+        self.baseline = baseline
+        self.confidence = confidence
+
+
+def get_geometry(args):
+    if args.dataset is not None:
+        geometry = []
+
+        for line in Dataset(args.dataset, lazy=True).iter_lines():
+            bounding_box = [point.get_tuple() for point in [line.bounding_box.start] + line.bounding_box.inner_points + [line.bounding_box.end]] if line.bounding_box is not None else None
+            baseline = [line.baseline.start.get_tuple(), line.baseline.end.get_tuple()] if line.baseline is not None else None
+            geometry.append((line.text, bounding_box, baseline))
+
+        return geometry
+
+    return [("line {index}".format(index=index), [(10, index), (10, index + 20), (500, index), (500, index + 20)], [(10, index + 15), (500, index + 15)]) for index in range(args.size)]
+
+
+def build_lines(geometry, line_class, bounding_box_class, baseline_class, point_class):
+    lines = []
+
+    for text, bounding_box, baseline in geometry:
+        if bounding_box is not None:
+            points = [point_class(x, y) for x, y in bounding_box]
+            bounding_box = bounding_box_class(points[0], points[-1], points[1:-1])
+
+        if baseline is not None:
+            points = [point_class(x, y) for x, y in baseline]
+            baseline = baseline_class(points[0], points[-1], points[1:-1])
+
+        lines.append(line_class(text, bounding_box, baseline, None))
+
+    return lines
+
+
+def get_points(lines):
+    return [[(point.x, point.y) for point in [rectangle.start] + rectangle.inner_points + [rectangle.end]]
+            for line in lines for rectangle in [line.bounding_box, line.baseline] if rectangle is not None]
+
+
+def benchmark_geometry(args):
+    geometry = get_geometry(args)
+    print("Lines:", len(geometry))
+
+    original, duration, peak = measure(build_lines, geometry, DictLine, DictRectangle, DictRectangle, DictPoint, trace_memory=True)
+    print_measurement("__dict__ geometry", duration, peak)
+
+    current, duration, peak = measure(build_lines, geometry, Line, BoundingBox, Baseline, Point, trace_memory=True)
+    print_measurement("__slots__ geometry", duration, peak)
+
+    same = get_points(original) == get_points(current)
+    if not same:
+        print("Results differ!")
+
+    return same
+
+
+# XML loading as it was before the streaming parser, used as the baseline.
+def load_lines_original(path):
+    with open(path, "r") as f:
+        content = f.read()
+
+    lines = []
+    content = bytes(content.encode(encoding="utf16"))
+    root = etree.fromstring(content, etree.XMLParser(recover=True))
+
+    namespace = root.nsmap.get(None, "")
+
+    for element in root.iter():
+        if element.tag == "TextLine" or element.tag == "{" + namespace + "}TextLine":
+            text = element.xpath('*[local-name()="TextEquiv"]/Unicode/text()')
+            coords = element.xpath('*[local-name()="Coords"]/@points')
+            baseline = element.xpath('*[local-name()="Baseline"]/@points')
+
+            try:
+                bounding_box = BoundingBox(xml_string=coords[0])
+            except (ValueError, IndexError):
+                bounding_box = None
+
+            try:
+                baseline = Baseline(xml_string=baseline[0])
+            except (ValueError, IndexError):
+                baseline = None
+
+            lines.append(Line(text[0] if len(text) > 0 else "", bounding_box, baseline, None))
+
+    return lines
+
+
+def load_lines_current(path):
+    return Dataset()._load_lines(path)
+
+
+def get_lines_digest(lines):
+    values = [(line.text, line.bounding_box.get_xml_output() if line.bounding_box is not None else None,
+               line.baseline.get_xml_output() if line.baseline is not None else None) for line in lines]
+
+    return hashlib.sha1(repr(values).encode("utf-8")).hexdigest()
+
+
+def save_page(args, path):
+    lines = build_lines(get_geometry(args), Line, BoundingBox, Baseline, Point)
+    Page("page", lines).save(path)
+
+    return len(lines)
+
+
+def benchmark_load(args):
+    path = tempfile.mkdtemp()
+
+    try:
+        line_count = run_in_process(save_page, args, path)
+        filename = os.path.join(path, "page.xml")
+        print("Lines:", line_count, "File size: {size:.2f} MB".format(size=os.path.getsize(filename) / 1024 / 1024))
+
+        original, duration, peak = measure_in_process(load_lines_original, get_lines_digest, filename)
+        print_measurement("tree + xpath", duration, peak)
+
+        current, duration, peak = measure_in_process(load_lines_current, get_lines_digest, filename)
+        print_measurement("iterparse", duration, peak)
+    finally:
+        shutil.rmtree(path)
+
+    same = original == current
+    if not same:
+        print("Results differ!")
+
+    return same
+
+
+BENCHMARKS = {
+    "geometry": benchmark_geometry,
+    "load": benchmark_load,
+}
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    return 0 if BENCHMARKS[args.benchmark](args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import sys
+import time
+import random
+import numpy as np
+
+import decoding
+
+
+def parse_arguments(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", help="Benchmark to run.", choices=sorted(BENCHMARKS.keys()))
+    parser.add_argument("-n", "--size", help="Number of generated lines or utterances.", required=False, default=200, type=int)
+    parser.add_argument("-p", "--page-length", help="Number of characters of the generated page.", required=False, default=1500, type=int)
+    parser.add_argument("-f", "--frames", help="Maximal number of frames of the generated utterances.", required=False, default=500, type=int)
+    args = parser.parse_args(argv)
+    return args
+
+
+def measure(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+
+    return result, time.perf_counter() - start
+
+
+def print_measurement(name, duration):
+    print("{name:40} {duration:10.4f} s".format(name=name, duration=duration))
+
+
+# Levenshtein distance as it was before the bit-parallel engine, used as the baseline.
+def levenshtein_distance_original(source, target, sub_cost=1, ins_cost=1, del_cost=1):
+    target = np.array(target)
+    dist = np.arange(len(target) + 1) * ins_cost
+    for s in source:
+        dist[1:] = np.minimum(dist[1:] + del_cost, dist[:-1] + (target != s) * sub_cost)
+        dist[0] += del_cost
+        for ii in range(len(dist) - 1):
+            if dist[ii + 1] > dist[ii] + ins_cost:
+                dist[ii + 1] = dist[ii] + ins_cost
+    return dist[-1]
+
+
+def generate_text_pairs(count, length, seed=42):
+    generator = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz      "
+    pairs = []
+
+    for _ in range(count):
+        target = [generator.choice(alphabet) for _ in range(length)]
+        source = [c if generator.random() > 0.1 else generator.choice(alphabet) for c in target]
+        pairs.append((source, target))
+
+    return pairs
+
+
+def run_levenshtein(function, pairs, **kwargs):
+    return [function(source, target, **kwargs) for source, target in pairs]
+
+
+def benchmark_levenshtein(args):
+    same = True
+
+    for name, pairs in [("line (60 chars)", generate_text_pairs(args.size, 60)), ("page ({length} chars)".format(length=args.page_length), generate_text_pairs(1, args.page_length))]:
+        for costs in [{}, {"sub_cost": 2}]:
+            label = name + (" custom costs" if costs else "")
+
+            original, duration = measure(run_levenshtein, levenshtein_distance_original, pairs, **costs)
+            print_measurement(label + " original", duration)
+
+            current, duration = measure(run_levenshtein, decoding.levenshtein_distance, pairs, **costs)
+            print_measurement(label + " current", duration)
+
+            if original != current:
+                print("Results differ!")
+                same = False
+
+    return same
+
+
+# Viterbi as it was before the batched decoding, with range instead of xrange so that it runs at all.
+def viterbi_original(lls, tr, ip, fs):
+    ltr = np.log(tr)
+    bt = np.zeros_like(lls, dtype=int)
+    lf = lls[0] + np.log(ip)
+    for ii in range(1, len(lls)):
+        hypothesis = lf + ltr.T
+        bt[ii] = np.argmax(hypothesis, axis=1)
+        lf = lls[ii] + hypothesis[range(len(tr)), bt[ii]]
+    path = [fs[np.argmax(lf[fs])]]
+    for ii in reversed(range(1, len(lls))):
+        path.insert(0, bt[ii, path[0]])
+    return path
+
+
+def generate_utterances(count, frames, states, seed=42):
+    generator = np.random.default_rng(seed)
+    lengths = generator.integers(frames // 2, frames + 1, size=count)
+    lls = generator.normal(size=(count, frames, states)) * 3
+    # left-to-right model with a loop from the last state to the first one
+    tr = np.eye(states) * 0.7 + np.eye(states, k=1) * 0.3
+    tr[-1, 0] = 0.3
+    tr /= tr.sum(axis=1, keepdims=True)
+    ip = np.full(states, 1.0 / states)
+
+    return lls, lengths, tr, ip, [states - 1]
+
+
+def run_viterbi(function, lls, lengths, tr, ip, fs):
+    return [[int(state) for state in function(utterance[:length], tr, ip, fs)] for utterance, length in zip(lls, lengths)]
+
+
+def run_streaming_viterbi(lls, lengths, tr, ip, fs, chunk=50):
+    paths = []
+
+    for utterance, length in zip(lls, lengths):
+        decoder = decoding.StreamingViterbi(tr, ip, fs)
+        path = []
+
+        for start in range(0, length, chunk):
+            path += decoder.push(utterance[start:min(start + chunk, length)])
+
+        paths.append(path + decoder.finish())
+
+    return paths
+
+
+def benchmark_hmm(args):
+    same = True
+
+    for states in [10, 60]:
+        lls, lengths, tr, ip, fs = generate_utterances(args.size, args.frames, states)
+        frames = lengths.sum()
+        name = "{states} states".format(states=states)
+
+        results = []
+
+        for label, function, function_args in [("original", run_viterbi, (viterbi_original,)), ("current", run_viterbi, (decoding.viterbi,)),
+                                               ("batch", decoding.viterbi_batch, ()), ("streaming", run_streaming_viterbi, ())]:
+            with np.errstate(divide="ignore"):
+                result, duration = measure(function, *function_args, lls, lengths, tr, ip, fs)
+            print_measurement("{name} {label} ({speed:.0f} frames/s)".format(name=name, label=label, speed=frames / duration), duration)
+            results.append(result)
+
+        if any(result != results[0] for result in results[1:]):
+            print("Results differ!")
+            same = False
+
+    return same
+
+
+BENCHMARKS = {
+    "hmm": benchmark_hmm,
+    "levenshtein": benchmark_levenshtein,
+}
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    return 0 if BENCHMARKS[args.benchmark](args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import sys
+import time
+import random
+
+import spatial_index
+from dataset import Baseline, BoundingBox, Dataset, Line, Point
+
+
+def parse_arguments(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--dataset", help="Path to dataset used instead of generated lines.", required=False, default=None)
+    parser.add_argument("-n", "--size", help="Number of generated lines.", required=False, default=100000, type=int)
+    parser.add_argument("-q", "--queries", help="Number of queries of each kind.", required=False, default=200, type=int)
+    args = parser.parse_args(argv)
+    return args
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - start
+
+
+def print_measurement(name, duration):
+    print("{name:40} {duration:10.4f} s".format(name=name, duration=duration))
+
+
+def generate_lines(count, seed=42):
+    generator = random.Random(seed)
+    lines = []
+
+    # lines scattered over a page-like area
+    for index in range(count):
+        x, y = generator.randint(0, 2000), generator.randint(0, 3000)
+        bounding_box = BoundingBox(Point(x, y), Point(x + 490, y + 20), [Point(x, y + 20), Point(x + 490, y)])
+        baseline = Baseline(Point(x, y + 15), Point(x + 490, y + 15))
+        lines.append(Line("line {index}".format(index=index), bounding_box, baseline, None))
+
+    return lines
+
+
+def scan_intersecting(lines, x0, y0, x1, y1):
+    result = []
+
+    for position, line in enumerate(lines):
+        bounds = spatial_index.get_bounds(line.bounding_box)
+
+        if bounds is not None and bounds[0] <= x1 and bounds[2] >= x0 and bounds[1] <= y1 and bounds[3] >= y0:
+            result.append(position)
+
+    return result
+
+
+def scan_nearest(lines, x, y, count):
+    distances = []
+
+    for position, line in enumerate(lines):
+        bounds = spatial_index.get_bounds(line.bounding_box)
+
+        if bounds is not None:
+            dx = max(bounds[0] - x, x - bounds[2], 0)
+            dy = max(bounds[1] - y, y - bounds[3], 0)
+            distances.append(((dx * dx + dy * dy) ** 0.5, position))
+
+    return [position for _, position in sorted(distances)[:count]]
+
+
+def run_queries(function, lines, queries):
+    return [function(lines, *query) for query in queries]
+
+
+def benchmark_spatial_index(args):
+    lines = list(Dataset(args.dataset, lazy=True).iter_lines()) if args.dataset is not None else generate_lines(args.size)
+    print("Lines:", len(lines))
+
+    generator = random.Random(42)
+    rectangles = []
+    for _ in range(args.queries):
+        x, y = generator.randint(0, 2500), generator.randint(0, 3000)
+        rectangles.append((x, y, x + generator.randint(0, 200), y + generator.randint(0, 200)))
+
+    points = [(x, y, 5) for x, y, _, _ in rectangles]
+
+    index, duration = measure(spatial_index.LineIndex, lines)
+    print_measurement("index build", duration)
+
+    same = True
+
+    for name, scan, query, queries in [("intersecting", scan_intersecting, index.intersecting, rectangles), ("nearest 5", scan_nearest, index.nearest, points)]:
+        original, duration = measure(run_queries, scan, lines, queries)
+        print_measurement(name + " linear scan", duration)
+
+        current, duration = measure(run_queries, lambda _, *arguments: query(*arguments), lines, queries)
+        print_measurement(name + " index", duration)
+
+        if original != current:
+            print("Results differ!")
+            same = False
+
+    return same
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    return 0 if benchmark_spatial_index(args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import sys
+import time
+import random
+import tracemalloc
+from lxml import etree
+
+import tesseract
+
+
+def parse_arguments(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--size", help="Number of words of the generated pages.", required=False, default=100000, type=int)
+    args = parser.parse_args(argv)
+    return args
+
+
+def measure(function, *args, trace_memory=False):
+    peak = None
+
+    if trace_memory:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return result, duration, peak
+
+
+def print_measurement(name, duration, peak=None):
+    output = "{name:40} {duration:10.4f} s".format(name=name, duration=duration)
+
+    if peak is not None:
+        output += " {peak:10.2f} MB".format(peak=peak / 1024 / 1024)
+
+    print(output)
+
+
+# Nested traversals of the hOCR as they were before tesseract.process parsed it in a single pass, used as the baseline.
+def process_line_original(line_tag):
+    text = ""
+
+    for span_tag in line_tag.iter():
+        if "class" in span_tag.attrib and span_tag.attrib["class"] == "ocrx_word":
+            for text_element in span_tag.xpath("descendant-or-self::*/text()"):
+                text += text_element + " "
+
+    text = text.strip()
+
+    if len(text) > 0:
+        return tesseract.create_text_line(line_tag, text)
+
+    return None
+
+
+def process_area_original(area_tag):
+    text_region = etree.Element("TextRegion")
+
+    for p_tag in area_tag.iter():
+        if "class" in p_tag.attrib and p_tag.attrib["class"] == "ocr_par":
+            for span_tag in p_tag.iter():
+                if "class" in span_tag.attrib and span_tag.attrib["class"] == "ocr_line":
+                    text_line = process_line_original(span_tag)
+                    if text_line is not None:
+                        text_region.append(text_line)
+
+    return text_region if len(text_region) > 0 else None
+
+
+def process_hocr_original(content):
+    root = etree.fromstring(bytes(content.encode(encoding="utf16")))
+
+    output_root = etree.Element("PcGts")
+    page = etree.SubElement(output_root, "Page")
+
+    for div_tag in root.iter():
+        if "class" in div_tag.attrib and div_tag.attrib["class"] == "ocr_carea":
+            text_region = process_area_original(div_tag)
+            if text_region is not None:
+                page.append(text_region)
+
+    return output_root
+
+
+def generate_hocr_page(columns, lines_per_column, words_per_line, seed=42):
+    generator = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyzáčďéěíňóřšťúůýž0123456789.,;&<>"
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml"><body>\n'
+             '<div class="ocr_page" title="bbox 0 0 {width} 4000">\n'.format(width=columns * 1000)]
+
+    for column in range(columns):
+        x = column * 1000
+        parts.append('<div class="ocr_carea" title="bbox {x0} 0 {x1} 4000"><p class="ocr_par" lang="ces" title="bbox {x0} 0 {x1} 4000">\n'.format(x0=x, x1=x + 900))
+
+        for line in range(lines_per_column):
+            y = line * 40
+            parts.append('<span class="ocr_line" title="bbox {x0} {y0} {x1} {y1}; baseline 0.002 -7; x_size 30">'.format(x0=x, y0=y, x1=x + 900, y1=y + 35))
+
+            for word in range(words_per_line):
+                text = "".join(generator.choice(alphabet) for _ in range(generator.randint(1, 10)))
+                text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+                if generator.random() < 0.1:
+                    text = "<strong>" + text + "</strong>"
+                parts.append('<span class="ocrx_word" title="bbox {x0} {y0} {x1} {y1}; x_wconf 90">{text}</span> '.format(x0=x + word * 60, y0=y, x1=x + word * 60 + 50, y1=y + 35, text=text))
+
+            parts.append('</span>\n')
+
+        parts.append('</p></div>\n')
+
+    parts.append('</div></body></html>\n')
+
+    return "".join(parts)
+
+
+def benchmark_tesseract(args):
+    same = True
+
+    # multi-column pages with args.size words in total
+    for columns in [1, 4]:
+        words_per_line = 12
+        lines_per_column = max(1, args.size // (columns * words_per_line))
+        content = generate_hocr_page(columns, lines_per_column, words_per_line)
+        print("Columns: {columns}, lines: {lines}, size: {size:.1f} MB".format(columns=columns, lines=columns * lines_per_column, size=len(content.encode("utf-8")) / 2 ** 20))
+
+        # tracing the allocations slows down the per-event work of iterparse, the memory is measured in a separate run
+        _, duration, _ = measure(process_hocr_original, content)
+        original, _, peak = measure(process_hocr_original, content, trace_memory=True)
+        print_measurement("original", duration, peak)
+
+        _, duration, _ = measure(tesseract.process, content.encode("utf-8"))
+        current, _, peak = measure(tesseract.process, content.encode("utf-8"), trace_memory=True)
+        print_measurement("current", duration, peak)
+
+        if etree.tostring(original) != etree.tostring(current):
+            print("Results differ!")
+            same = False
+
+    return same
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    return 0 if benchmark_tesseract(args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
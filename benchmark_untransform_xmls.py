@@ -0,0 +1,92 @@
+import sys
+import time
+import numpy as np
+
+import untransform_xmls
+from dataset import Baseline, BoundingBox, Line, Point
+
+
+def parse_arguments(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--size", help="Number of generated lines, 50 lines per page.", required=False, default=100000, type=int)
+    args = parser.parse_args(argv)
+    return args
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+
+    return result, time.perf_counter() - start
+
+
+def print_measurement(name, duration):
+    print("{name:40} {duration:10.4f} s".format(name=name, duration=duration))
+
+
+# Per-point transformation as it was before the points of a page were transformed together, used as the baseline.
+def transform_lines_per_point(lines, transformation):
+    new_lines = []
+
+    for line in lines:
+        new_bb_start = untransform_xmls.transform_point(line.bounding_box.start, transformation)
+        new_bb_end = untransform_xmls.transform_point(line.bounding_box.end, transformation)
+        new_bb_inner_points = [untransform_xmls.transform_point(point, transformation) for point in line.bounding_box.inner_points]
+        new_baseline_start = untransform_xmls.transform_point(line.baseline.start, transformation)
+        new_baseline_end = untransform_xmls.transform_point(line.baseline.end, transformation)
+
+        new_lines.append(Line(line.text, BoundingBox(new_bb_start, new_bb_end, new_bb_inner_points), Baseline(new_baseline_start, new_baseline_end), None))
+
+    return new_lines
+
+
+def generate_pages(count, lines_per_page, seed=42):
+    generator = np.random.RandomState(seed)
+    pages = []
+
+    for _ in range(count):
+        lines = []
+
+        for _ in range(lines_per_page):
+            x, y = generator.randint(0, 3000, 2)
+            bounding_box = BoundingBox(Point(x, y), Point(x + 500, y + 40), [Point(x, y + 40), Point(x + 500, y)])
+            baseline = Baseline(Point(x, y + 30), Point(x + 500, y + 30))
+            lines.append(Line("line", bounding_box, baseline, None))
+
+        pages.append(lines)
+
+    return pages
+
+
+def get_coordinates(pages):
+    return [[point.get_tuple() for line in lines for point in untransform_xmls.get_points([line])] for lines in pages]
+
+
+def benchmark_untransform(args):
+    pages = generate_pages(max(1, args.size // 50), 50)
+    transformation = np.linalg.inv(np.array([[0.98, 0.05, 30.5], [-0.04, 1.01, 12.25], [1e-5, 2e-5, 1.0]]))
+    print("Pages:", len(pages), "Lines:", sum(len(lines) for lines in pages))
+
+    original, duration = measure(lambda: [transform_lines_per_point(lines, transformation) for lines in pages])
+    print_measurement("per-point transformation", duration)
+
+    current, duration = measure(lambda: [untransform_xmls.transform_lines(lines, transformation) for lines in pages])
+    print_measurement("per-page transformation", duration)
+
+    # the rounded coordinates have to be identical
+    same = get_coordinates(original) == get_coordinates(current)
+    if not same:
+        print("Results differ!")
+
+    return same
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+
+    return 0 if benchmark_untransform(args) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,8 +3,9 @@ import sys
 import cv2
 import argparse
 import numpy as np
-import datetime
-from shutil import copy
+from multiprocessing import Pool
+
+from log_index import load_log_index
 
 
 def parse_args():
@@ -15,6 +16,7 @@ def parse_args():
     parser.add_argument("-r", "--rectified-photos-path", required=True)
     parser.add_argument("-p", "--original-photos-path", required=True)
     parser.add_argument("-l", "--logs-path", required=True)
+    parser.add_argument("-w", "--workers", help="Number of processes used for the photographs.", required=False, default=1, type=int)
     return parser.parse_args()
 
 
@@ -30,109 +32,117 @@ def load_translation(path):
     return translation
 
 
-def parse_matrix_row(row):
-    parts = row.split()
-    return [float(part) for part in parts]
+# rotations of the original photograph tried by find_rotation, None keeps the photograph as it is
+ROTATIONS = [None, cv2.ROTATE_90_CLOCKWISE, cv2.ROTATE_180, cv2.ROTATE_90_COUNTERCLOCKWISE]
 
 
-def fill_transformation_row(transformation, row, data):
-    for index, value in enumerate(data):
-        transformation[row][index] = value
+def calculate_similarity(img1, img2):
+    # sum of squared differences of images of the same size, the same as TM_SQDIFF without the template search
+    return cv2.norm(img1, img2, cv2.NORM_L2SQR)
 
-    return transformation
 
+def get_scaling(source_size, target_size):
+    """Homography from the pixels of an image of source_size (width, height) to the resized image of target_size."""
+    scale_x, scale_y = target_size[0] / source_size[0], target_size[1] / source_size[1]
 
-def read_log(path):
-    transformation_width = 3
-    transformation_height = 3
+    # resize aligns the centers of the pixels
+    return np.array([[scale_x, 0, 0.5 * scale_x - 0.5], [0, scale_y, 0.5 * scale_y - 0.5], [0, 0, 1]])
 
-    transformation = [[None for _ in range(transformation_width)] for _ in range(transformation_height)]
 
-    with open(path, "r") as f:
-        for index, line in enumerate(f):
-            line = line.strip()
+def rotate(image, rotation):
+    return image if rotation is None else cv2.rotate(image, rotation)
 
-            if index == 3 and line.startswith("T  [[") and line.endswith("]"):
-                transformation = fill_transformation_row(transformation, 0, parse_matrix_row(line[5:-1]))
 
-            elif index == 4 and line.startswith("[") and line.endswith("]"):
-                transformation = fill_transformation_row(transformation, 1, parse_matrix_row(line[1:-1]))
+def find_rotation(original_image, rectified_image, transformation, scale=0.25):
+    """
+    Returns the rotation of the original photograph which fits the rectified one the best after the transformation.
+    The rotations are compared at the scale, the original photograph is resized once and the transformation is
+    adjusted to the resized images instead of warping the original photograph at the full resolution.
+    """
+    height, width, _ = original_image.shape
+    rec_height, rec_width, _ = rectified_image.shape
 
-            elif index == 5 and line.startswith("[") and line.endswith("]]"):
-                transformation = fill_transformation_row(transformation, 2, parse_matrix_row(line[1:-2]))
+    small_original = cv2.resize(original_image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    small_rectified = cv2.resize(rectified_image, (0, 0), fx=scale, fy=scale)
+    small_height, small_width, _ = small_rectified.shape
+    output_scaling = get_scaling((rec_width, rec_height), (small_width, small_height))
 
-    return np.array(transformation)
+    scores = []
 
+    for rotation in ROTATIONS:
+        rotated = rotate(small_original, rotation)
+        rotated_size = (width, height) if rotation in (None, cv2.ROTATE_180) else (height, width)
+        input_scaling = get_scaling(rotated_size, (rotated.shape[1], rotated.shape[0]))
 
-def calculate_similarity(img1, img2, scale=0.25):
-    i1 = cv2.resize(img1, (0, 0), fx=scale, fy=scale)
-    i2 = cv2.resize(img2, (0, 0), fx=scale, fy=scale)
+        warped = cv2.warpPerspective(rotated, output_scaling @ transformation @ np.linalg.inv(input_scaling), (small_width, small_height))
+        scores.append(calculate_similarity(warped, small_rectified))
 
-    return cv2.matchTemplate(i1, i2, cv2.cv2.TM_SQDIFF)[0][0]
+    return rotate(original_image, ROTATIONS[int(np.argmin(scores))])
 
 
-def find_rotation(original_image, rectified_image, transformation):
-    height, width, _ = original_image.shape
-    rec_height, rec_width, _ = rectified_image.shape
+def process_photo(task):
+    """Writes the original photograph rotated to fit the rectified one, returns the output path."""
+    original_photo_path, rectified_photo_path, transformation, output_photo_path = task
 
-    center = (width / 2, height / 2)
-    scale = 1.0
+    original_image = cv2.imread(original_photo_path)
+    rectified_image = cv2.imread(rectified_photo_path)
 
-    score0 = calculate_similarity(cv2.warpPerspective(original_image, transformation, (rec_width, rec_height)), rectified_image)
+    if original_image is None or rectified_image is None:
+        return None
 
-    rotated90 = cv2.rotate(original_image, cv2.cv2.ROTATE_90_CLOCKWISE)
-    score90 = calculate_similarity(cv2.warpPerspective(rotated90, transformation, (rec_width, rec_height)), rectified_image)
+    cv2.imwrite(output_photo_path, find_rotation(original_image, rectified_image, transformation))
 
-    rotated180 = cv2.rotate(original_image, cv2.cv2.ROTATE_180)
-    score180 = calculate_similarity(cv2.warpPerspective(rotated180, transformation, (rec_width, rec_height)), rectified_image)
+    return output_photo_path
 
-    rotated270 = cv2.rotate(original_image, cv2.cv2.ROTATE_90_COUNTERCLOCKWISE)
-    score270 = calculate_similarity(cv2.warpPerspective(rotated270, transformation, (rec_width, rec_height)), rectified_image)
 
-    best = np.argmin([score0, score90, score180, score270])
+def count_failures(results, total_files):
+    failed = 0
 
-    if best == 0:
-        result = original_image
-    elif best == 1:
-        result = rotated90
-    elif best == 2:
-        result = rotated180
-    else:
-        result = rotated270
-
-    return result
+    for index, result in enumerate(results):
+        if result is None:
+            failed += 1
 
+        print("\r{current}/{total} ({percentage:.2f} %)".format(current=index+1, total=total_files, percentage=100 * float(index+1) / total_files), end="")
 
-def process_directory(input_path, output_path, rectified_photos_path, original_photos_path, logs_path, translation):
-    input_files = [file for file in os.listdir(input_path) if file.endswith(".xml")]
+    return failed
 
-    total_files = len(input_files)
 
-    for index, input_file in enumerate(input_files):
-        print("\r{current}/{total} ({percentage:.2f} %)".format(current=index+1, total=total_files, percentage=100 * float(index+1) / total_files), end="")
+def process_directory(input_path, output_path, rectified_photos_path, original_photos_path, log_index, translation, workers=1):
+    input_files = sorted(file for file in os.listdir(input_path) if file.endswith(".xml"))
+    tasks = []
 
+    for input_file in input_files:
         id = input_file.split(".")[0]
         original_photo_path = os.path.join(original_photos_path, translation[id])
         rectified_photo_path = os.path.join(rectified_photos_path, input_file[:-4] + ".jpg")
 
-        transformation = read_log(logs_path + "/" + id + ".jpg.log")
+        transformation = log_index.transformation(id + ".jpg.log")
 
-        original_image = cv2.imread(original_photo_path)
-        rectified_image = cv2.imread(rectified_photo_path)
+        if transformation is None:
+            print("Transformation of {id} was not found in the logs.".format(id=id))
+            continue
 
-        original_image = find_rotation(original_image, rectified_image, transformation)
+        tasks.append((original_photo_path, rectified_photo_path, transformation, os.path.join(output_path, id + ".jpg")))
 
-        cv2.imwrite(output_path + "/" + id + ".jpg", original_image)
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers) as pool:
+            # the photographs are independent, they are reported in the order in which they are finished
+            failed = count_failures(pool.imap_unordered(process_photo, tasks), len(tasks))
+    else:
+        failed = count_failures(map(process_photo, tasks), len(tasks))
 
     print()
 
+    if failed > 0:
+        print("Photographs which could not be read:", failed)
+
 
 def main():
     args = parse_args()
 
     translation = load_translation(args.translation_file)
 
-    process_directory(args.input, args.output, args.rectified_photos_path, args.original_photos_path, args.logs_path, translation)
+    process_directory(args.input, args.output, args.rectified_photos_path, args.original_photos_path, load_log_index(args.logs_path, workers=args.workers), translation, args.workers)
 
     return 0
 
@@ -1,11 +1,24 @@
+import os
+import json
+import struct
+import itertools
 from os import listdir
 from os.path import isfile, join
+from collections.abc import MutableMapping
+from functools import partial
+from multiprocessing import Pool
 from typing import List, Dict, Optional
 from numbers import Number
 from lxml import etree
+import numpy as np
+
+from spatial_index import LineIndex
 
 
 class Point:
+    # geometry objects are created for every line of the dataset, __slots__ keeps them without per-instance __dict__
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -27,6 +40,8 @@ class Point:
 
 
 class Rectangle:
+    __slots__ = ("start", "end", "inner_points")
+
     def __init__(self, start=None, end=None, inner_points=None, **kwargs):
         self.start = start  # type: Point
         self.end = end  # type: Point
@@ -88,6 +103,8 @@ class Rectangle:
 
 
 class BoundingBox(Rectangle):
+    __slots__ = ()
+
     def get_xml_output(self) -> str:
         if len(self.inner_points) > 0:
             inner_points_string = " ".join(["{x},{y}".format(x=p.x, y=p.y) for p in self.inner_points])
@@ -96,10 +113,14 @@ class BoundingBox(Rectangle):
         return "{x1},{y1} {x2},{y2}".format(x1=self.start.x, y1=self.start.y, x2=self.end.x, y2=self.end.y)
 
 class Baseline(Rectangle):
+    __slots__ = ()
+
     def get_xml_output(self) -> str:
         return str(self.start.x) + "," + str(self.start.y) + " " + str(self.end.x) + "," + str(self.end.y)
 
 class Line:
+    __slots__ = ("text", "bounding_box", "baseline", "confidence")
+
     def __init__(self, text: str, bounding_box: Optional[BoundingBox], baseline: Optional[Baseline], confidence: Optional[Number]):
         self.text = text.strip()
         self.bounding_box = bounding_box
@@ -121,28 +142,50 @@ class Line:
     def get_xml_output(self) -> etree.ElementTree:
         text_line = etree.Element("TextLine")
 
-        if self.confidence is not None:
-            text_line.set("custom", "confidence:" + str(self.confidence) + ";")
-
         if self.bounding_box is not None:
-            line_coords = etree.SubElement(text_line, "Coords")
-            line_coords.set("points", self.bounding_box.get_xml_output())
+            etree.SubElement(text_line, "Coords")
 
         if self.baseline is not None:
-            line_baseline = etree.SubElement(text_line, "Baseline")
-            line_baseline.set("points", self.baseline.get_xml_output())
+            etree.SubElement(text_line, "Baseline")
 
         line_text_equiv = etree.SubElement(text_line, "TextEquiv")
-        line_unicode = etree.SubElement(line_text_equiv, "Unicode")
-        line_unicode.text = self.text
+        etree.SubElement(line_text_equiv, "Unicode")
+
+        self.fill_xml_output(text_line)
 
         return text_line
 
+    def get_xml_shape(self):
+        return self.confidence is not None, self.bounding_box is not None, self.baseline is not None
+
+    def fill_xml_output(self, text_line) -> None:
+        """Sets the values of the line to the output of get_xml_output() of a line with the same get_xml_shape()."""
+        children = iter(text_line)
+
+        if self.confidence is not None:
+            text_line.set("custom", "confidence:" + str(self.confidence) + ";")
+
+        if self.bounding_box is not None:
+            next(children).set("points", self.bounding_box.get_xml_output())
+
+        if self.baseline is not None:
+            next(children).set("points", self.baseline.get_xml_output())
+
+        next(children)[0].text = self.text
+
 
 class Page:
     def __init__(self, id: str, lines: List[Line]):
         self.id = id
         self.lines = lines
+        self._spatial_index = None
+
+    def get_spatial_index(self) -> LineIndex:
+        """Spatial index of the lines, built on the first call. It is not updated when the lines are modified."""
+        if self._spatial_index is None:
+            self._spatial_index = LineIndex(self.lines if self.lines is not None else [])
+
+        return self._spatial_index
 
     def get_xml_output(self) -> etree.ElementTree:
         output = etree.Element("PcGts")
@@ -156,21 +199,297 @@ class Page:
 
         return output
 
-    def save(self, path: str) -> None:
-        xml_output = self.get_xml_output()
-        string_output = str(etree.tostring(xml_output, pretty_print=True).decode("utf-8"))
+    def write(self, f) -> None:
+        """
+        Writes the page to a binary file. The output is the same as the pretty printed get_xml_output(), but the page
+        is serialized line by line and the indented elements of a line are reused for all lines of the same shape.
+        """
+        text_regions = {}
+
+        with etree.xmlfile(f) as xml_file:
+            with xml_file.element("PcGts"):
+                xml_file.write("\n  ")
+
+                if len(self.lines) == 0:
+                    xml_file.write(etree.Element("Page"))
+                else:
+                    with xml_file.element("Page"):
+                        for line in self.lines:
+                            shape = line.get_xml_shape()
+                            text_region = text_regions.get(shape)
+
+                            if text_region is None:
+                                text_region = etree.Element("TextRegion")
+                                text_region.append(line.get_xml_output())
+                                etree.indent(text_region, space="  ", level=2)
+                                text_regions[shape] = text_region
+                            else:
+                                line.fill_xml_output(text_region[0])
+
+                            xml_file.write("\n    ")
+                            xml_file.write(text_region)
 
+                        xml_file.write("\n  ")
+
+                xml_file.write("\n")
+
+        f.write(b"\n")
+
+    def save(self, path: str) -> None:
         filepath = join(path, self.id + ".xml")
-        with open(filepath, "w") as f:
-            f.write(string_output)
+
+        # the page is renamed only when it is complete, so an interrupted save never leaves a partial file
+        temporary_path = filepath + ".tmp"
+        with open(temporary_path, "wb") as f:
+            self.write(f)
+
+        os.replace(temporary_path, filepath)
+
+
+def _save_page(path, page):
+    page.save(path)
+
+
+def _load_page_or_error(path, filename):
+    # Module level so that it can be sent to worker processes; errors are returned instead of raised so that a
+    # broken file does not stop the whole load.
+    loader = Dataset()
+    loader.path = path
+
+    try:
+        return loader._load_page(filename), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _get_local_name(element):
+    tag = element.tag
+
+    # comments and processing instructions have a function as the tag
+    if not isinstance(tag, str):
+        return None
+
+    return tag[tag.rfind("}") + 1:]
+
+
+def _get_first_text(element):
+    if element.text is not None:
+        return element.text
+
+    for child in element:
+        if child.tail is not None:
+            return child.tail
+
+    return None
+
+
+CACHE_MAGIC = b"DSCACHE1"
+CACHE_ALIGNMENT = 64
+
+
+def _get_files_mtimes(path, files):
+    return {filename: os.stat(join(path, filename)).st_mtime_ns for filename in files}
+
+
+def _rectangle_points(rectangle):
+    if rectangle is None or rectangle.start is None or rectangle.end is None:
+        return []
+
+    return [rectangle.start.get_tuple()] + [point.get_tuple() for point in rectangle.inner_points] + [rectangle.end.get_tuple()]
+
+
+def _offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+class DatasetCache:
+    """
+    Parsed dataset stored in flat arrays. Every line is described by slices of the text, bounding box and baseline
+    arrays given by the offset arrays, so a page is built only when it is requested. The file consists of a magic
+    number, a JSON header and the raw arrays, which are memory-mapped when the cache is opened.
+    """
+    def __init__(self, header, arrays):
+        self.source = header["source"]  # type: Optional[str]
+        self.files = header["files"]  # type: Dict[str, int]
+        self.page_ids = header["page_ids"]  # type: List[str]
+        self.arrays = arrays  # type: Dict[str, np.ndarray]
+
+    @staticmethod
+    def write(path: str, page_ids: List[str], pages, source: Optional[str], files: Dict[str, int]) -> None:
+        page_lengths = []
+        texts = []
+        confidences = []
+        bounding_box_lengths = []
+        bounding_box_points = []
+        baseline_lengths = []
+        baseline_points = []
+
+        for page in pages:
+            page_lengths.append(len(page.lines))
+
+            for line in page.lines:
+                texts.append(line.text.encode("utf-8"))
+                confidences.append(np.nan if line.confidence is None else line.confidence)
+
+                points = _rectangle_points(line.bounding_box)
+                bounding_box_lengths.append(len(points))
+                bounding_box_points += points
+
+                points = _rectangle_points(line.baseline)
+                baseline_lengths.append(len(points))
+                baseline_points += points
+
+        arrays = {
+            "page_line_offsets": _offsets(page_lengths),
+            "text_offsets": _offsets([len(text) for text in texts]),
+            "text": np.frombuffer(b"".join(texts), dtype=np.uint8),
+            "confidences": np.array(confidences, dtype=np.float64),
+            "bounding_box_offsets": _offsets(bounding_box_lengths),
+            "bounding_box_points": np.array(bounding_box_points, dtype=np.int32).reshape(-1, 2),
+            "baseline_offsets": _offsets(baseline_lengths),
+            "baseline_points": np.array(baseline_points, dtype=np.int32).reshape(-1, 2),
+        }
+
+        layout = {}
+        position = 0
+        for name, array in arrays.items():
+            layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": position}
+            position += array.nbytes
+            position += -position % CACHE_ALIGNMENT
+
+        header = json.dumps({"source": source, "files": files, "page_ids": page_ids, "arrays": layout}).encode("utf-8")
+
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(CACHE_MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+
+            data_start = len(CACHE_MAGIC) + 8 + len(header)
+            f.write(b"\0" * (-data_start % CACHE_ALIGNMENT))
+            data_start += -data_start % CACHE_ALIGNMENT
+
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(array.tobytes())
+
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def open(path: str) -> Optional["DatasetCache"]:
+        with open(path, "rb") as f:
+            if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+
+            header_length, = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_length).decode("utf-8"))
+
+        data_start = len(CACHE_MAGIC) + 8 + header_length
+        data_start += -data_start % CACHE_ALIGNMENT
+
+        buffer = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) > data_start else np.zeros(0, dtype=np.uint8)
+
+        arrays = {}
+        for name, layout in header["arrays"].items():
+            dtype = np.dtype(layout["dtype"])
+            start = data_start + layout["offset"]
+            size = int(np.prod(layout["shape"])) * dtype.itemsize
+            arrays[name] = buffer[start:start + size].view(dtype).reshape(layout["shape"])
+
+        return DatasetCache(header, arrays)
+
+    def is_valid(self, path: Optional[str]) -> bool:
+        if path is None:
+            return True
+
+        try:
+            files = [f for f in listdir(path) if f.endswith(".xml") and isfile(join(path, f))]
+            return _get_files_mtimes(path, files) == self.files
+        except OSError:
+            return False
+
+    def _get_rectangles(self, rectangle_class, name, first_line, last_line):
+        offsets = self.arrays[name + "_offsets"][first_line:last_line + 1].tolist()
+        points = self.arrays[name + "_points"][offsets[0]:offsets[-1]].tolist()
+
+        rectangles = []
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            if start == end:
+                rectangles.append(None)
+            else:
+                rectangle_points = [Point(x, y) for x, y in points[start - offsets[0]:end - offsets[0]]]
+                rectangles.append(rectangle_class(rectangle_points[0], rectangle_points[-1], rectangle_points[1:-1]))
+
+        return rectangles
+
+    def get_page(self, index: int) -> Page:
+        first_line, last_line = self.arrays["page_line_offsets"][index:index + 2].tolist()
+
+        text_offsets = self.arrays["text_offsets"][first_line:last_line + 1].tolist()
+        text = bytes(self.arrays["text"][text_offsets[0]:text_offsets[-1]])
+        texts = [text[start - text_offsets[0]:end - text_offsets[0]].decode("utf-8") for start, end in zip(text_offsets[:-1], text_offsets[1:])]
+
+        bounding_boxes = self._get_rectangles(BoundingBox, "bounding_box", first_line, last_line)
+        baselines = self._get_rectangles(Baseline, "baseline", first_line, last_line)
+        confidences = [None if np.isnan(confidence) else confidence for confidence in self.arrays["confidences"][first_line:last_line].tolist()]
+
+        lines = [Line(*line) for line in zip(texts, bounding_boxes, baselines, confidences)]
+
+        return Page(self.page_ids[index], lines)
+
+
+class CachedPages(MutableMapping):
+    """Page dictionary of a dataset loaded from a cache, pages are built from the cache on the first access."""
+    def __init__(self, cache: DatasetCache, keys: List[str]):
+        self.cache = cache
+        self._indexes = {}  # type: Dict[str, int]
+        self._pages = {}  # type: Dict[str, Page]
+
+        for index, key in enumerate(keys):
+            self._indexes.setdefault(key, index)
+
+        self._keys = dict.fromkeys(self._indexes)
+
+    def __getitem__(self, key):
+        if key not in self._pages:
+            self._pages[key] = self.cache.get_page(self._indexes[key])
+
+        return self._pages[key]
+
+    def load(self, key) -> Page:
+        # same as self[key], but a page which was not accessed yet is not kept in memory
+        if key in self._pages:
+            return self._pages[key]
+
+        return self.cache.get_page(self._indexes[key])
+
+    def __setitem__(self, key, page):
+        self._pages[key] = page
+        self._keys[key] = None
+
+    def __delitem__(self, key):
+        del self._keys[key]
+        self._pages.pop(key, None)
+        self._indexes.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
 
 
 class Dataset:
-    def __init__(self, path: str = None, lazy: bool = False):
+    def __init__(self, path: str = None, lazy: bool = False, workers: int = 1):
         # self.pages: Dict[str, Page] = {}
         self.pages = {}  # type: Dict[str, Page]
         self.lazy = lazy # type: bool
         self.path = path # type: str
+        self.workers = workers # type: int
+        self.errors = {}  # type: Dict[str, str]
+        self._files = {}  # type: Dict[str, str]
 
         if self.path is not None:
             if not self.lazy:
@@ -181,12 +500,16 @@ class Dataset:
             else:
                 for page in self._get_dataset_files():
                     self.pages[page.split(".")[0]] = None
+                    self._files.setdefault(page.split(".")[0], page)
 
     def add_page(self, page: Page):
         self.pages[page.id] = page
 
     def get_page(self, id: str):
         if self.lazy:
+            if id in self._files:
+                return self._load_page(self._files[id])
+
             files = self._get_dataset_files(id)
             if len(files) > 0:
                 return self._load_page(files[0])
@@ -202,73 +525,119 @@ class Dataset:
 
         return page
 
-    def _load_lines(self, content):
-        lines = []
-        content = bytes(content.encode(encoding="utf16"))
+    def _create_line(self, element):
+        # one pass over the children gives the same values as the XPath queries
+        # '*[local-name()="TextEquiv"]/Unicode/text()', '*[local-name()="Coords"]/@points' and
+        # '*[local-name()="Baseline"]/@points', which are much slower when evaluated for every line
+        text = None
+        coords = None
+        baseline = None
+
+        for child in element:
+            name = _get_local_name(child)
+
+            if name == "Coords":
+                if coords is None:
+                    coords = child.get("points")
+            elif name == "Baseline":
+                if baseline is None:
+                    baseline = child.get("points")
+            elif name == "TextEquiv" and text is None:
+                for unicode in child:
+                    if unicode.tag == "Unicode":
+                        text = _get_first_text(unicode)
+
+                        if text is not None:
+                            break
 
-        parser = etree.XMLParser(recover=True)
+        try:
+            bounding_box = BoundingBox(xml_string=coords) if coords is not None else None
+        except ValueError:
+            bounding_box = None
 
         try:
-            root = etree.fromstring(content, parser)
-        except Exception as e:
-            print(e)
-            return None
+            baseline = Baseline(xml_string=baseline) if baseline is not None else None
+        except ValueError:
+            baseline = None
 
-        namespaces = root.nsmap
-        namespace = ""
+        line_text = ""
 
-        try:
-            namespace = namespaces[None]
-        except:
-            pass
+        if text is not None:
+            line_text = text
 
-        for element in root.iter():
-            if element.tag == "TextLine" or element.tag == "{" + namespace + "}TextLine":
-                text = element.xpath('*[local-name()="TextEquiv"]/Unicode/text()')
-                coords = element.xpath('*[local-name()="Coords"]/@points')
-                baseline = element.xpath('*[local-name()="Baseline"]/@points')
+        return Line(line_text, bounding_box, baseline, None)
 
-                try:
-                    bounding_box = BoundingBox(xml_string=coords[0])
-                except (ValueError, IndexError):
-                    bounding_box = None
+    def _load_lines(self, path):
+        lines = []
+        namespace = None
 
-                try:
-                    baseline = Baseline(xml_string=baseline[0])
-                except (ValueError, IndexError):
-                    baseline = None
+        try:
+            for _, element in etree.iterparse(path, events=("end",), tag="{*}TextLine"):
+                if namespace is None:
+                    namespace = element.getroottree().getroot().nsmap.get(None, "")
 
-                line_text = ""
+                if element.tag == "TextLine" or element.tag == "{" + namespace + "}TextLine":
+                    lines.append(self._create_line(element))
 
-                if len(text) > 0:
-                    line_text = text[0]
+                # processed elements are removed, so the tree does not grow with the file
+                element.clear(keep_tail=True)
 
-                lines.append(Line(line_text, bounding_box, baseline, None))
+                while element.getparent() is not None:
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+
+                    element = element.getparent()
+        except etree.XMLSyntaxError:
+            return self._load_lines_recover(path)
 
         return lines
 
+    def _load_lines_recover(self, path):
+        with open(path, "rb") as f:
+            root = etree.fromstring(f.read(), etree.XMLParser(recover=True))
+
+        if root is None:
+            raise ValueError("Could not parse XML file " + path)
+
+        namespace = root.nsmap.get(None, "")
+
+        return [self._create_line(element) for element in root.iter() if element.tag == "TextLine" or element.tag == "{" + namespace + "}TextLine"]
+
     def _load_page(self, filename):
         id = filename[:filename.rindex(".xml")]
 
-        content = None
-        with open(join(self.path, filename), "r") as f:
-            content = f.read()
-
-        lines = self._load_lines(content)
+        lines = self._load_lines(join(self.path, filename))
 
         return Page(id, lines)
 
     def _get_dataset_files(self, prefix=""):
-        return [f for f in listdir(self.path) if isfile(join(self.path, f)) and f.startswith(prefix) and f.endswith(".xml")]
+        return sorted([f for f in listdir(self.path) if isfile(join(self.path, f)) and f.startswith(prefix) and f.endswith(".xml")])
 
-    def _load_pages(self):
-        files = self._get_dataset_files()
-        pages = []
+    def _iter_loaded_pages(self, files):
+        load = partial(_load_page_or_error, self.path)
 
-        for filename in files:
-            pages.append(self._load_page(filename))
+        if self.workers > 1 and len(files) > 1:
+            # files are sent to the pool in batches, so only a limited number of parsed pages waits for the consumer
+            batch_size = self.workers * 16
 
-        return pages
+            with Pool(self.workers) as pool:
+                for start in range(0, len(files), batch_size):
+                    batch = files[start:start + batch_size]
+                    # imap keeps the order of the files, so the result does not depend on the number of workers
+                    yield from self._report_errors(zip(batch, pool.imap(load, batch, chunksize=4)))
+        else:
+            yield from self._report_errors((filename, load(filename)) for filename in files)
+
+    def _report_errors(self, results):
+        for filename, (page, error) in results:
+            if error is not None:
+                print("{file}: {error}".format(file=filename, error=error))
+                self.errors[filename] = error
+            else:
+                yield page
+
+    def _load_pages(self):
+        return list(self._iter_loaded_pages(self._get_dataset_files()))
 
     def __str__(self):
         output = ""
@@ -283,9 +652,90 @@ class Dataset:
 
         return output
 
-    def save(self, path: str) -> None:
-        for page_id, page in self.pages.items():
-            page.save(path)
+    def iter_pages(self, prefix: str = "", ids=None):
+        """
+        Yields pages whose ID starts with the prefix (and is in ids, if given). The pages of a lazy or cached dataset
+        are loaded one by one and they are not kept in the dataset, so the memory does not grow with the dataset.
+        """
+        if ids is not None:
+            ids = set(ids)
+
+        if self.lazy:
+            files = self._get_dataset_files(prefix)
+
+            if ids is not None:
+                files = [f for f in files if f.split(".")[0] in ids or f[:f.rindex(".xml")] in ids]
+
+            yield from self._iter_loaded_pages(files)
+        else:
+            for key in list(self.pages.keys()):
+                if key.startswith(prefix) and (ids is None or key in ids):
+                    page = self.pages.load(key) if isinstance(self.pages, CachedPages) else self.pages[key]
+
+                    if page is not None:
+                        yield page
+
+    def iter_lines(self, prefix: str = "", ids=None):
+        for page in self.iter_pages(prefix, ids):
+            yield from page.lines
+
+    def save(self, path: str, workers: int = 1) -> None:
+        pages = self.iter_pages()
+
+        if workers > 1:
+            save = partial(_save_page, path)
+
+            with Pool(workers) as pool:
+                while True:
+                    # pages are sent to the pool in batches, so a lazy dataset is not loaded into the memory at once
+                    batch = list(itertools.islice(pages, workers * 16))
+                    if len(batch) == 0:
+                        break
+
+                    for _ in pool.imap_unordered(save, batch, chunksize=4):
+                        pass
+        else:
+            for page in pages:
+                page.save(path)
+
+    def save_cache(self, path: str) -> None:
+        files = {}
+
+        if self.path is not None:
+            files = _get_files_mtimes(self.path, self._get_dataset_files())
+
+        pages = list(self.iter_pages())
+
+        DatasetCache.write(path, [page.id for page in pages], pages, self.path, files)
+
+    @staticmethod
+    def from_cache(path: str, dataset_path: str = None, lazy: bool = False, workers: int = 1) -> "Dataset":
+        """
+        Loads dataset from the cache created by save_cache. When the XML files of the dataset changed since the
+        cache was created (or the cache does not exist yet), the dataset is parsed again and the cache is rewritten.
+        With lazy=True the pages are keyed the same way as in the lazy loaded dataset.
+        """
+        cache = DatasetCache.open(path) if isfile(path) else None
+
+        if dataset_path is None:
+            if cache is None:
+                raise ValueError("Cache " + path + " does not exist and no dataset path was given.")
+
+            dataset_path = cache.source
+
+        if cache is None or not cache.is_valid(dataset_path):
+            Dataset(dataset_path, workers=workers).save_cache(path)
+            cache = DatasetCache.open(path)
+
+        keys = cache.page_ids
+        if lazy:
+            keys = [page_id.split(".")[0] for page_id in keys]
+
+        dataset = Dataset()
+        dataset.path = dataset_path
+        dataset.pages = CachedPages(cache, keys)
+
+        return dataset
 
     def get_page_statistics(self, lengths=False, characters=False, verbose=False) -> Dict[str, List[int]]:
         lengths_stat = []
@@ -293,11 +743,9 @@ class Dataset:
 
         total = len(self.pages.items())
 
-        for index, (page_id, _) in enumerate(self.pages.items()):
+        for index, page in enumerate(self.iter_pages()):
             if verbose:
-                print("{current}/{total}: {page}".format(current=index+1, total=total, page=page_id))
-
-            page = self.get_page(page_id)
+                print("{current}/{total}: {page}".format(current=index+1, total=total, page=page.id))
 
             if lengths:
                 lengths_stat.append(len(page.lines))
@@ -319,11 +767,4 @@ class Dataset:
         return statistics
 
     def count_lines(self):
-        number_of_lines = 0
-
-        if self.lazy:
-            number_of_lines = sum([len(self.get_page(page).lines) for page in self.pages.keys()])
-        else:
-            number_of_lines = sum([len(page.lines) for page in self.pages.values() if page is not None])
-
-        return number_of_lines
+        return sum(len(page.lines) for page in self.iter_pages())
@@ -2,15 +2,26 @@ import sys
 import cv2
 from os.path import join
 import os
+import json
+import time
+import hashlib
 import random
 import datetime
 import numpy as np
+from lxml import etree
+from multiprocessing import Pool
 
 from dataset import Dataset
+from log_index import load_log_index
 
 
 CURRENT_DATE = datetime.datetime.now().strftime("%Y-%m-%d")
 
+STAGES = ("decode", "warp", "resize", "encode", "write")
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
 
 def parse_arguments():
     import argparse
@@ -23,6 +34,10 @@ def parse_arguments():
     parser.add_argument("-b", "--bbox-adjustment", help="Expand bounding-box relative to its height.", required=False, default=1.0)
     parser.add_argument("-r", "--ratio", help="Train and test ratio.", required=False, default=0.8)
     parser.add_argument("--target-height", help="Target height of the image", required=False, default=64, type=int)
+    parser.add_argument("-c", "--cache", help="Path to dataset cache, it is created when it does not exist or it is outdated.", required=False, default=None)
+    parser.add_argument("-w", "--workers", help="Number of processes used for loading the dataset and cropping the pages.", required=False, default=1, type=int)
+    parser.add_argument("-s", "--seed", help="Seed of the train and test split.", required=False, default=0, type=int)
+    parser.add_argument("--incremental", help="Crop only pages changed since the last run recorded in the manifest of the output folder.", action="store_true")
     args = parser.parse_args()
     return args
 
@@ -54,8 +69,24 @@ def update_offsets(image):
     return int(offset)
 
 
+def encode_image(image):
+    _, data = cv2.imencode(".jpg", image)
+    return data.tobytes()
+
+
+def write_file(data, path):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
 def save_image(image, path):
-    cv2.imwrite(path, image)
+    write_file(encode_image(image), path)
+
+
+def add_duration(timings, stage, start):
+    end = time.perf_counter()
+    timings[stage] += end - start
+    return end
 
 
 def update_bounding_box(start, end, bbox_adjustment):
@@ -77,21 +108,25 @@ def get_resized_dimension(image, target_height):
     return target_width, target_height
 
 
-def crop_horizontal_bounding_box(image, line, offset, target_height, bbox_adjustment):
+def resize_line(cropped_line, target_height):
+    target_dimensions = get_resized_dimension(cropped_line, target_height)
+    return cv2.resize(cropped_line, target_dimensions)
+
+
+def warp_horizontal_bounding_box(image, line, offset, bbox_adjustment):
     start = line.bounding_box.start.get_tuple(offset, offset)
     end = line.bounding_box.end.get_tuple(offset, offset)
 
     start, end = update_bounding_box(start, end, bbox_adjustment)
 
-    cropped_line = image[start[1]:end[1], start[0]:end[0]]
-    target_dimensions = get_resized_dimension(cropped_line, target_height)
+    return image[start[1]:end[1], start[0]:end[0]]
 
-    cropped_line = cv2.resize(cropped_line, target_dimensions)
 
-    return cropped_line
+def crop_horizontal_bounding_box(image, line, offset, target_height, bbox_adjustment):
+    return resize_line(warp_horizontal_bounding_box(image, line, offset, bbox_adjustment), target_height)
 
 
-def crop_generic_bounding_box(image, line, offset, target_height, bbox_adjustment):
+def warp_generic_bounding_box(image, line, offset, bbox_adjustment):
     top_left_corner = np.array(line.bounding_box.start.get_tuple(offset, offset))
     top_right_corner = np.array(line.bounding_box.inner_points[1].get_tuple(offset, offset))
     bottom_left_corner = np.array(line.bounding_box.inner_points[0].get_tuple(offset, offset))
@@ -118,64 +153,69 @@ def crop_generic_bounding_box(image, line, offset, target_height, bbox_adjustmen
 
     T = cv2.getAffineTransform(source, target)
 
-    cropped_line = cv2.warpAffine(image, T, tuple(np.array((original_width, original_height) + 2 * adjustment)))
-    target_dimensions = get_resized_dimension(cropped_line, target_height)
-    cropped_line = cv2.resize(cropped_line, target_dimensions)
+    return cv2.warpAffine(image, T, tuple(np.array((original_width, original_height) + 2 * adjustment)))
+
 
-    return cropped_line
+def crop_generic_bounding_box(image, line, offset, target_height, bbox_adjustment):
+    return resize_line(warp_generic_bounding_box(image, line, offset, bbox_adjustment), target_height)
 
 
-def crop_image(image, page, original_name,  bbox_translation, output_folder, bbox_adjustment, target_height):
+def crop_image(image, page, original_name,  bbox_translation, lines_folder, bbox_adjustment, target_height, timings=None):
     offset = 0
     transcriptions = []
 
+    if timings is None:
+        timings = dict.fromkeys(STAGES, 0.0)
+
     if bbox_translation:
         offset = update_offsets(image)
 
     for index, line in enumerate(page.lines):
         if line.bounding_box is not None:
+            start = time.perf_counter()
+
             if len(line.bounding_box.inner_points) > 0:
-                cropped_line = crop_generic_bounding_box(image, line, offset, target_height, bbox_adjustment)
+                cropped_line = warp_generic_bounding_box(image, line, offset, bbox_adjustment)
             else:
-                cropped_line = crop_horizontal_bounding_box(image, line, offset, target_height, bbox_adjustment)
+                cropped_line = warp_horizontal_bounding_box(image, line, offset, bbox_adjustment)
+            start = add_duration(timings, "warp", start)
+
+            cropped_line = resize_line(cropped_line, target_height)
+            start = add_duration(timings, "resize", start)
+
+            data = encode_image(cropped_line)
+            start = add_duration(timings, "encode", start)
 
             filename = "{id}_l{index}.jpg".format(id=original_name, index=str(index).zfill(4))
-            save_image(cropped_line, join(output_folder, "lines." + CURRENT_DATE, filename))
+            write_file(data, join(lines_folder, filename))
+            add_duration(timings, "write", start)
 
             transcriptions.append("{filename} {text}".format(filename=filename, text=line.text))
 
     return transcriptions
 
 
-def get_images(images_folder):
-    return [image_name for image_name in os.listdir(images_folder) if image_name.endswith(('.png', '.jpg'))]
+def crop_page(task):
+    image_name, original_name, page, images_folder, lines_folder, bbox_translation, bbox_adjustment, target_height = task
+    timings = dict.fromkeys(STAGES, 0.0)
 
+    start = time.perf_counter()
+    image = load_image(images_folder, image_name)
+    add_duration(timings, "decode", start)
 
-def get_id_from_log(log_name, logs_folder):
-    with open(join(logs_folder, log_name)) as f:
-        for line in f:
-            if line.startswith("TEMPLATE"):
-                return line[line.rindex("/") + 1:line.rindex(".")]
-
-    return None
-
-
-def translate_logs(logs_folder):
-    log_names = [log_name for log_name in os.listdir(logs_folder) if log_name.endswith(".log")]
-
-    translation = {}
+    if image is None:
+        return None, timings
 
-    for log_name in log_names:
-        page_id = get_id_from_log(log_name, logs_folder)
+    return crop_image(image, page, original_name, bbox_translation, lines_folder, bbox_adjustment, target_height, timings), timings
 
-        if page_id is not None:
-            translation[log_name[:log_name.index(".")]] = page_id
 
-    return translation
+def get_images(images_folder):
+    # sorted, so the order of the transcriptions does not depend on the file system
+    return sorted(image_name for image_name in os.listdir(images_folder) if image_name.endswith(('.png', '.jpg')))
 
 
-def save_transcriptions(transcriptions, output_folder, ratio):
-    random.shuffle(transcriptions)
+def save_transcriptions(transcriptions, output_folder, ratio, seed=0):
+    random.Random(seed).shuffle(transcriptions)
     ratio = float(ratio)
 
     train_count = int(len(transcriptions) * ratio)
@@ -190,16 +230,7 @@ def save_transcriptions(transcriptions, output_folder, ratio):
         f.writelines("\n".join(test_transcriptions))
 
 
-def crop_dataset(dataset, images_folder, output_folder, bbox_adjustment, ratio, target_height, logs_folder=None, bbox_translation=False):
-    image_names = get_images(images_folder)
-    transcriptions = []
-    translation = {}
-
-    processed_pages = 0
-
-    if logs_folder is not None:
-        translation = translate_logs(logs_folder)
-
+def get_pages(dataset, image_names, translation):
     for image_name in image_names:
         id, _ = image_name.rsplit(".", maxsplit=1)
         page_id = None
@@ -213,24 +244,157 @@ def crop_dataset(dataset, images_folder, output_folder, bbox_adjustment, ratio,
             continue
 
         if page_id in dataset.pages:
-            processed_pages += 1
+            yield image_name, id, page_id
+        else:
+            print("Page id", page_id, "was not found in the dataset")
+
+
+def hash_file(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def hash_page(dataset, page_id):
+    if dataset.path is not None:
+        path = join(dataset.path, page_id + ".xml")
+
+        if os.path.isfile(path):
+            return hash_file(path)
 
-            print("\r{0:0.2f}%".format(float(processed_pages)/len(image_names) * 100), end="")
+    # the page does not come from an XML file (e.g. it was loaded from a cache without the dataset)
+    return hashlib.sha1(etree.tostring(dataset.pages[page_id].get_xml_output())).hexdigest()
 
-            page = dataset.pages[page_id]
-            image = load_image(images_folder, image_name)
 
-            if image is not None:
-                image_transcriptions = crop_image(image, page, id, bbox_translation, output_folder, bbox_adjustment, target_height)
-                transcriptions += image_transcriptions
+def load_manifest(output_folder):
+    try:
+        with open(join(output_folder, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
 
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+
+    return manifest
+
+
+def save_manifest(output_folder, lines_folder_name, pages):
+    manifest = {"version": MANIFEST_VERSION, "lines_folder": lines_folder_name, "pages": pages}
+    path = join(output_folder, MANIFEST_NAME)
+
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    os.replace(path + ".tmp", path)
+
+
+def get_crop_names(entry):
+    return [transcription.split(" ", maxsplit=1)[0] for transcription in entry["transcriptions"]]
+
+
+def is_up_to_date(previous, entry, lines_folder):
+    if any(previous.get(key) != entry[key] for key in ("image", "xml", "parameters")):
+        return False
+
+    return all(os.path.isfile(join(lines_folder, name)) for name in get_crop_names(previous))
+
+
+def remove_stale_crops(previous_pages, pages, lines_folder):
+    removed = 0
+
+    for image_name, previous in previous_pages.items():
+        current = set(get_crop_names(pages[image_name])) if image_name in pages else set()
+
+        for name in get_crop_names(previous):
+            if name not in current and os.path.isfile(join(lines_folder, name)):
+                os.remove(join(lines_folder, name))
+                removed += 1
+
+    return removed
+
+
+def collect_pages(tasks, results, pages, timings):
+    processed_pages = 0
+
+    for task, (image_transcriptions, page_timings) in zip(tasks, results):
+        processed_pages += 1
+
+        print("\r{0:0.2f}%".format(float(processed_pages)/len(tasks) * 100), end="")
+
+        for stage, duration in page_timings.items():
+            timings[stage] += duration
+
+        if image_transcriptions is not None:
+            pages[task[0]]["transcriptions"] = image_transcriptions
         else:
-            print("Page id", page_id, "was not found in the dataset")
+            del pages[task[0]]
+
+    return processed_pages
+
+
+def crop_dataset(dataset, images_folder, output_folder, bbox_adjustment, ratio, target_height, logs_folder=None, bbox_translation=False, workers=1, seed=0, incremental=False):
+    image_names = get_images(images_folder)
+    translation = {}
+    timings = dict.fromkeys(STAGES, 0.0)
+
+    reused_pages = 0
+    start = time.perf_counter()
+
+    if logs_folder is not None:
+        translation = load_log_index(logs_folder, workers=workers).translation
+
+    manifest = load_manifest(output_folder) if incremental else None
+
+    if manifest is not None:
+        lines_folder_name = manifest["lines_folder"]
+        previous_pages = manifest["pages"]
+    else:
+        lines_folder_name = "lines." + CURRENT_DATE
+        previous_pages = {}
 
-    save_transcriptions(transcriptions, output_folder, ratio)
+    lines_folder = join(output_folder, lines_folder_name)
+    create_dir(lines_folder)
+
+    parameters = {"bbox_adjustment": float(bbox_adjustment), "target_height": int(target_height), "bbox_translation": bool(bbox_translation)}
+
+    # manifest entries of the cropped pages in the order of the images
+    pages = {}
+    tasks = []
+
+    for image_name, original_name, page_id in get_pages(dataset, image_names, translation):
+        entry = {"image": hash_file(join(images_folder, image_name)), "xml": hash_page(dataset, page_id), "parameters": parameters}
+        previous = previous_pages.get(image_name)
+
+        if previous is not None and is_up_to_date(previous, entry, lines_folder):
+            entry["transcriptions"] = previous["transcriptions"]
+            reused_pages += 1
+        else:
+            tasks.append((image_name, original_name, dataset.pages[page_id], images_folder, lines_folder, bbox_translation, bbox_adjustment, target_height))
+
+        pages[image_name] = entry
+
+    if workers > 1 and len(tasks) > 1:
+        with Pool(workers) as pool:
+            # imap keeps the order of the pages, so the transcriptions do not depend on the number of workers
+            processed_pages = collect_pages(tasks, pool.imap(crop_page, tasks), pages, timings)
+    else:
+        processed_pages = collect_pages(tasks, map(crop_page, tasks), pages, timings)
+
+    removed_crops = remove_stale_crops(previous_pages, pages, lines_folder)
+
+    transcriptions = [transcription for entry in pages.values() for transcription in entry["transcriptions"]]
+    save_transcriptions(transcriptions, output_folder, ratio, seed)
+    save_manifest(output_folder, lines_folder_name, pages)
 
     print("\nProcessed pages:", processed_pages)
+    print("Reused pages:", reused_pages)
+    print("Removed crops:", removed_crops)
     print("Transcriptions:", len(transcriptions))
+    print("Time: {0:0.2f} s".format(time.perf_counter() - start))
+
+    # stage times are summed over all workers
+    for stage in STAGES:
+        print("  {stage:8} {duration:10.2f} s".format(stage=stage, duration=timings[stage]))
 
 
 def create_dir(path):
@@ -241,12 +405,13 @@ def create_dir(path):
 def main():
     args = parse_arguments()
 
-    dataset = Dataset(args.dataset)
+    if args.cache is not None:
+        dataset = Dataset.from_cache(args.cache, args.dataset, workers=args.workers)
+    else:
+        dataset = Dataset(args.dataset, workers=args.workers)
     print(dataset)
 
-    create_dir(join(args.output, "lines." + CURRENT_DATE))
-
-    crop_dataset(dataset, args.images, args.output, args.bbox_adjustment, args.ratio, args.target_height, args.logs, args.translate_bbox)
+    crop_dataset(dataset, args.images, args.output, args.bbox_adjustment, args.ratio, args.target_height, args.logs, args.translate_bbox, args.workers, args.seed, args.incremental)
 
     return 0
 
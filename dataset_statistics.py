@@ -9,6 +9,7 @@ import os
 import exifread
 
 from dataset import Dataset
+from log_index import load_log_index
 from typing import List, Dict, Tuple, Optional
 
 
@@ -23,33 +24,11 @@ def parse_arguments():
     parser.add_argument("--exif-data", required=False)
     parser.add_argument("--count-lines", help="Count lines of loaded dataset.", required=False, action="store_true")
     parser.add_argument("-s", "--show-charts", help="Show charts.", required=False, default=False, action="store_true")
+    parser.add_argument("-w", "--workers", help="Number of processes used for loading the dataset.", required=False, default=1, type=int)
     args = parser.parse_args()
     return args
 
 
-def get_id_from_log(log_name, logs_folder):
-    with open(os.path.join(logs_folder, log_name)) as f:
-        for line in f:
-            if line.startswith("TEMPLATE"):
-                return line[line.rindex("/") + 1:line.rindex(".")]
-
-    return None
-
-
-def translate_logs(logs_folder):
-    log_names = [log_name for log_name in os.listdir(logs_folder) if log_name.endswith(".log")]
-
-    translation = {}
-
-    for log_name in log_names:
-        page_id = get_id_from_log(log_name, logs_folder)
-
-        if page_id is not None:
-            translation[log_name[:log_name.index(".")]] = page_id
-
-    return translation
-
-
 def show_charts(dataset: Dataset) -> None:
     pass
     # statistics = dataset.get_statistics(lengths=True, characters=True, verbose=True)
@@ -359,7 +338,7 @@ def main():
     args = parse_arguments()
 
     if args.dataset is not None:
-        dataset = Dataset(args.dataset, lazy=True)
+        dataset = Dataset(args.dataset, lazy=True, workers=args.workers)
         print(dataset)
 
         if args.devices is not None:
@@ -390,7 +369,7 @@ def main():
         show_character_lengths(load_lengths(args.lines))
 
     if args.lines is not None and args.logs is not None:
-        translation = translate_logs(args.logs)
+        translation = load_log_index(args.logs, workers=args.workers).translation
         used_templates_lines, used_templates_pages = print_photograph_statistics(args.lines, translation)
 
         if args.show_charts:
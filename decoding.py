@@ -1,38 +1,174 @@
+import itertools
 import numpy as np
 
+def logsumexp(a, axis=None):
+    """log(sum(exp(a))) along the axis, rows of -inf give -inf."""
+    a = np.asarray(a)
+    a_max = np.max(a, axis=axis, keepdims=True)
+    a_max = np.where(np.isfinite(a_max), a_max, 0.0)
+    with np.errstate(divide="ignore"):
+        result = np.log(np.sum(np.exp(a - a_max), axis=axis, keepdims=True)) + a_max
+    return np.squeeze(result, axis=axis) if axis is not None else result.reshape(())[()]
+
 def forward_backward(lls, tr, ip, fs, evaluate_only=False):
     """
-    Not tested!!!
+    Forward-backward algorithm for the HMM with transition probabilities tr[from, to], initial probabilities ip and
+    final states fs. Returns the total log likelihood, the state posteriors and the forward and backward log
+    probabilities of the frames (rows of lls).
     """
-    ltr = np.log(tr)
+    with np.errstate(divide="ignore"):
+        ltr = np.log(tr)
+        lip = np.log(ip)
     lf = np.empty_like(lls); lf[:] = -np.inf
     lb = np.empty_like(lls); lb[:] = -np.inf
-    lf[0] = lls[0] + np.log(ip)
-    lb[fs,-1] = 0.0
-    
-    for ii in  xrange(1,len(lls)):
-        lf[ii] =  lls[ii] + logsumexp(lf[ii-1] + ltr.T, axis=1)
-    tll = logsumexp(lf[fs,-1])
+    lf[0] = lls[0] + lip
+    lb[-1, fs] = 0.0
+
+    for ii in range(1, len(lls)):
+        lf[ii] = lls[ii] + logsumexp(lf[ii-1] + ltr.T, axis=1)
+    tll = logsumexp(lf[-1, fs])
     if evaluate_only:
       return tll
-    for ii in reversed(xrange(len(lls)-1)):
+    for ii in reversed(range(len(lls)-1)):
         lb[ii] = logsumexp(ltr + lls[ii+1] + lb[ii+1], axis=1)
     sp = np.exp(lf + lb - tll)
     return tll, sp, lf, lb
 
+def _backpointer_dtype(states):
+    return np.int16 if states <= np.iinfo(np.int16).max else np.int32
+
+def _predecessors(tr):
+    """
+    Possible predecessors of every state in ascending order, pred[to] lists the states with a non-zero transition and
+    lw are the log probabilities of the transitions. The state 0 is always the first one (with the log probability
+    -inf when impossible), so that argmax over the predecessors of an unreachable state gives the state 0 as argmax
+    over all states does.
+    """
+    tr = np.asarray(tr)
+    possible = tr > 0
+    possible[0] = True
+    count = possible.sum(axis=0).max()
+    # the stable sort keeps the possible predecessors in ascending order before the others
+    pred = np.argsort(~possible.T, axis=1, kind="stable")[:, :count].astype(_backpointer_dtype(len(tr)))
+    with np.errstate(divide="ignore"):
+        lw = np.log(tr.T[np.arange(len(pred))[:, np.newaxis], pred])
+    return pred, lw
+
+def _viterbi_step(lf, pred, lw, lls, rows):
+    # hypothesis[..., to, k] is the score of the transition from pred[to, k], rows index all the other axes
+    hypothesis = lf[..., pred] + lw
+    best = hypothesis.argmax(axis=-1)
+    return lls + hypothesis[rows + (best,)], pred[rows[-1], best]
+
 def viterbi(lls, tr, ip, fs):
-    ltr = np.log(tr)
-    bt = np.zeros_like(lls, dtype=int)
-    lf = lls[0] + np.log(ip)    
-    for ii in  xrange(1,len(lls)):
-        hypothesis = lf + ltr.T
-        bt[ii] = np.argmax(hypothesis, axis=1)
-        lf = lls[ii] + hypothesis[xrange(len(tr)),bt[ii]]
-    path = [fs[np.argmax(lf[fs])]]
-    for ii in  reversed(xrange(1,len(lls))):
-      path.insert(0, bt[ii,path[0]])
+    """The most likely state sequence for the frames (rows of lls) which ends in one of the final states fs."""
+    pred, lw = _predecessors(tr)
+    with np.errstate(divide="ignore"):
+        lf = lls[0] + np.log(ip)
+    bt = np.zeros(lls.shape, dtype=_backpointer_dtype(len(pred)))
+    rows = (np.arange(len(pred)),)
+    for ii in range(1, len(lls)):
+        lf, bt[ii] = _viterbi_step(lf, pred, lw, lls[ii], rows)
+    path = [int(fs[np.argmax(lf[fs])])]
+    for ii in reversed(range(1, len(lls))):
+        path.append(int(bt[ii, path[-1]]))
+    path.reverse()
     return path
 
+def viterbi_batch(lls, lengths, tr, ip, fs):
+    """
+    Viterbi decoding of a batch of utterances padded to the same number of frames, lls has shape
+    (utterances, frames, states) and the frames after lengths[i] of the utterance i are ignored. Returns the list of
+    state sequences, the same as viterbi for every utterance separately.
+    """
+    lls = np.asarray(lls)
+    lengths = np.asarray(lengths)
+    batch, frames, states = lls.shape
+    fs = np.asarray(fs)
+    pred, lw = _predecessors(tr)
+    with np.errstate(divide="ignore"):
+        lf = lls[:, 0] + np.log(ip)
+    bt = np.zeros((batch, frames, states), dtype=_backpointer_dtype(states))
+    rows = (np.arange(batch)[:, np.newaxis], np.arange(states))
+    for ii in range(1, frames):
+        scores, bt[:, ii] = _viterbi_step(lf, pred, lw, lls[:, ii], rows)
+        # utterances which already ended keep the scores of their last frame
+        lf = np.where((ii < lengths)[:, np.newaxis], scores, lf)
+    paths = np.empty((batch, frames), dtype=int)
+    positions = np.arange(batch)
+    paths[:, -1] = fs[np.argmax(lf[:, fs], axis=1)]
+    for ii in reversed(range(1, frames)):
+        # before the last frame of an utterance, the path stays in its final state
+        paths[:, ii-1] = np.where(ii < lengths, bt[positions, ii, paths[:, ii]], paths[:, ii])
+    return [path[:length].tolist() for path, length in zip(paths, lengths)]
+
+class StreamingViterbi:
+    """
+    Viterbi decoding of a long sequence fed in chunks of frames. Only the backpointers of the frames whose state is
+    not decided yet are kept: when the best paths to all states share the same prefix, the prefix is returned by push
+    and forgotten. The concatenated output of push and finish is the same as the output of viterbi.
+    """
+    def __init__(self, tr, ip, fs):
+        self.pred, self.lw = _predecessors(tr)
+        self.rows = (np.arange(len(self.pred)),)
+        with np.errstate(divide="ignore"):
+            self.lip = np.log(ip)
+        self.fs = np.asarray(fs)
+        self.lf = None
+        # backpointers[k] leads from the undecided frame k to the frame k-1
+        self.backpointers = []
+        # states in the first undecided frame of the best paths to all states
+        self.ancestors = None
+
+    def push(self, lls):
+        """Processes the frames (rows of lls) and returns the states of the frames which were decided."""
+        for frame in lls:
+            if self.lf is None:
+                self.lf = frame + self.lip
+                self.backpointers = [None]
+                self.ancestors = np.arange(len(self.pred))
+            else:
+                self.lf, bt = _viterbi_step(self.lf, self.pred, self.lw, frame, self.rows)
+                self.backpointers.append(bt)
+                self.ancestors = self.ancestors[bt]
+        # the last frame is never decided, its state depends on the next frames
+        if len(self.backpointers) < 2 or self.ancestors.min() != self.ancestors.max():
+            return []
+        return self._decided()
+
+    def finish(self):
+        """Returns the states of the remaining frames, the last one is the best of the final states."""
+        if self.lf is None:
+            return []
+        state = self.fs[np.argmax(self.lf[self.fs])]
+        path = self._trace(state, len(self.backpointers) - 1)
+        self.lf = None
+        self.backpointers = []
+        self.ancestors = None
+        return path
+
+    def _decided(self):
+        # the latest frame where the best paths to all states meet
+        states = np.arange(len(self.pred))
+        for kk in range(len(self.backpointers) - 1, 0, -1):
+            states = self.backpointers[kk][states]
+            if states.min() == states.max():
+                break
+        path = self._trace(states[0], kk - 1)
+        # the predecessor of the first undecided frame is known
+        self.backpointers = [None] + self.backpointers[kk + 1:]
+        self.ancestors = np.arange(len(self.pred))
+        for bt in self.backpointers[1:]:
+            self.ancestors = self.ancestors[bt]
+        return path
+
+    def _trace(self, state, last):
+        path = [int(state)]
+        for kk in range(last, 0, -1):
+            path.append(int(self.backpointers[kk][path[-1]]))
+        path.reverse()
+        return path
+
 def nstate_monophn_rec(lls, phns, penalty, sil_index=0):
   """
   Simple monophone loop decoder.
@@ -57,59 +193,216 @@ def nstate_monophn_rec(lls, phns, penalty, sil_index=0):
   penalty += np.log(1./len(phns))
   lf[:]=-np.inf
   lf[sil_index]=lls[0,sil_index]
-  for ii in  xrange(1,len(lls)):
+  for ii in range(1,len(lls)):
     lpi = np.argmax(lf[-len(phns):])+len(lf)-len(phns)
     lpv = lf[lpi]
     m = lf[len(phns):] < lf[:-len(phns)]
-    lf[len(phns):][m] = lf[m]
+    lf[len(phns):][m] = lf[:-len(phns)][m]
     bt[ii,len(phns):][m] = np.nonzero(m)[0]
     m = lf[:len(phns)] < lpv + penalty
-    lf[m] = lpv + penalty
-    bt[ii][m] = lpi
+    lf[:len(phns)][m] = lpv + penalty
+    bt[ii,:len(phns)][m] = lpi
     lf += lls[ii]
   path = [sil_index+len(lf)-len(phns)]
-  for ii in  reversed(xrange(1,len(lls))):
-    path.insert(0, bt[ii,path[0]])
+  for ii in reversed(range(1,len(lls))):
+    path.append(bt[ii,path[-1]])
+  path.reverse()
   path = [phns[i] for i, junk in itertools.groupby(path) if i < len(phns)]
   return path
 
+def _insertion_pass(dist, ins_cost):
+    # dist[j] = min(dist[j], dist[j-1] + ins_cost) for all j from left to right
+    if np.issubdtype(dist.dtype, np.integer):
+        # For integers this is a running minimum of dist[k] - k*ins_cost, shifted back by j*ins_cost.
+        offsets = np.arange(len(dist)) * ins_cost
+        np.minimum.accumulate(dist - offsets, out=dist)
+        dist += offsets
+    else:
+        # float costs are accumulated in the same order as before to keep the results identical
+        for ii in range(len(dist) - 1):
+            if dist[ii + 1] > dist[ii] + ins_cost:
+                dist[ii + 1] = dist[ii] + ins_cost
+    return dist
+
+def _bit_parallel_levenshtein_distance(source, target):
+    """
+    Levenshtein distance with unit costs computed by the bit-parallel algorithm of Myers (1999) in the formulation of
+    Hyyro (2001). One column of the dynamic programming matrix is kept as bit vectors of vertical differences, so
+    a column costs a few operations on len(pattern)-bit integers. Symbols must be hashable.
+    """
+    pattern, text = (source, target) if len(source) >= len(target) else (target, source)
+
+    if len(pattern) == 0:
+        return 0
+
+    peq = {}
+    for index, symbol in enumerate(pattern):
+        peq[symbol] = peq.get(symbol, 0) | (1 << index)
+
+    mask = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    pv = mask
+    mv = 0
+    score = len(pattern)
+
+    for symbol in text:
+        eq = peq.get(symbol, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+
+        # the first row of the matrix increases by one in every column
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+
+    return score
+
 def levenshtein_distance(source, target, sub_cost=1, ins_cost=1, del_cost=1):
-    target=np.array(target)
+    if sub_cost == 1 and ins_cost == 1 and del_cost == 1:
+        try:
+            return _bit_parallel_levenshtein_distance(source, target)
+        except TypeError:
+            # unhashable symbols
+            pass
+
+    target = np.array(target)
     dist = np.arange(len(target) + 1) * ins_cost
     for s in source:
-        dist[1:] = np.minimum(dist[1:]+del_cost, dist[:-1] + (target != s) * sub_cost)
+        dist[1:] = np.minimum(dist[1:] + del_cost, dist[:-1] + (target != s) * sub_cost)
         dist[0] += del_cost
-        for ii in range(len(dist)-1):
-          if dist[ii+1] > dist[ii] + ins_cost:
-             dist[ii+1] = dist[ii] + ins_cost
+        _insertion_pass(dist, ins_cost)
     return dist[-1]
 
-def levenshtein_alignment(source, target, sub_cost=1, ins_cost=1, del_cost=1, empty_symbol=None):
-    target=np.array(target)
-    backtrack = np.ones((len(source)+1, len(target)+1))
-    backtrack[0] = -1
-    dist = np.arange(len(target) + 1) * ins_cost
-    for ii, s in enumerate(source):
-        cost4sub = dist[:-1] + (target != s) * sub_cost
-        dist += del_cost
-        where_sub = cost4sub < dist[1:]
-        dist[1:][where_sub] = cost4sub[where_sub]
-        backtrack[ii+1,1:][where_sub] = 0
-        for jj in range(len(dist)-1):
-          if dist[jj+1] > dist[jj] + ins_cost:
-             dist[jj+1] = dist[jj] + ins_cost
-             backtrack[ii+1,jj+1] = -1
+# subproblems of the Hirschberg alignment up to this number of cells are aligned with the full matrix of moves
+HIRSCHBERG_BLOCK_SIZE = 1 << 16
+
+# moves of the alignment stored in the backtrack matrix
+DELETION, SUBSTITUTION, INSERTION = 1, 0, -1
+
+def _alignment_row(dist, target, s, sub_cost, ins_cost, del_cost, moves=None):
+    """
+    Computes the next row of the alignment matrix from the previous row dist (the first cell is updated by the
+    caller). Deletion is preferred to substitution and both are preferred to insertion on ties.
+    """
+    cost4sub = dist[:-1] + (target != s) * sub_cost
+    dist = dist + del_cost
+    where_sub = cost4sub < dist[1:]
+    dist[1:][where_sub] = cost4sub[where_sub]
+    if moves is not None:
+        moves[:] = DELETION
+        moves[1:][where_sub] = SUBSTITUTION
+        before = dist.copy()
+        _insertion_pass(dist, ins_cost)
+        # the insertion pass changes exactly the cells where an insertion is strictly cheaper
+        moves[dist < before] = INSERTION
+    else:
+        _insertion_pass(dist, ins_cost)
+    return dist
+
+def _backtrack(moves, row_starts, source, target, empty_symbol):
     src_pos = len(source)
     tar_pos = len(target)
-    alig=[]
+    alig = []
     while tar_pos > 0 or src_pos > 0:
-        where = backtrack[src_pos, tar_pos]
+        where = moves[src_pos, tar_pos - row_starts[src_pos]]
         if where >= 0: src_pos -= 1
         if where <= 0: tar_pos -= 1
-        alig.insert(0, (empty_symbol if where < 0 else source[src_pos], 
-                        empty_symbol if where > 0 else target[tar_pos]))
+        alig.append((empty_symbol if where < 0 else source[src_pos],
+                     empty_symbol if where > 0 else target[tar_pos]))
+    alig.reverse()
     return alig
 
+def _full_alignment(source, target, sub_cost, ins_cost, del_cost, empty_symbol):
+    moves = np.empty((len(source) + 1, len(target) + 1), dtype=np.int8)
+    moves[0] = INSERTION
+    dist = np.arange(len(target) + 1) * ins_cost
+    for ii, s in enumerate(source):
+        dist = _alignment_row(dist, target, s, sub_cost, ins_cost, del_cost, moves[ii + 1])
+    return _backtrack(moves, np.zeros(len(source) + 1, dtype=int), source, target, empty_symbol)
+
+def _banded_alignment(source, target, band, sub_cost, ins_cost, del_cost, empty_symbol):
+    """
+    Ukkonen-style alignment restricted to the cells with |i - j| <= band (the caller widens the band to |n - m| so
+    that the end of the matrix is reachable). The rows are stored by the diagonal, cell k of row i is the column
+    j = i - band + k. Memory and time are O(n * band); the alignment is optimal whenever an optimal alignment stays
+    inside of the band (always for unit costs and a distance not larger than the band).
+    """
+    n, m = len(source), len(target)
+    width = 2 * band + 1
+    # symbol of the column j of row i is padded[i + k], the padding falls only on the cells outside of the matrix
+    padded = np.concatenate([np.repeat(target[:1], band + 1), target, np.repeat(target[:1], width)])
+    columns = np.arange(width) - band
+    dist = np.where((columns >= 0) & (columns <= m), columns * ins_cost, 0)
+    infinity = np.inf if dist.dtype.kind == "f" else np.iinfo(np.int64).max // 4
+    dist[(columns < 0) | (columns > m)] = infinity
+    moves = np.empty((n + 1, width), dtype=np.int8)
+    moves[0] = INSERTION
+    for ii, s in enumerate(source, start=1):
+        cost4sub = dist + (padded[ii:ii + width] != s) * sub_cost
+        dist = np.concatenate([dist[1:] + del_cost, [infinity]])
+        row = moves[ii]
+        row[:] = DELETION
+        where_sub = cost4sub < dist
+        dist[where_sub] = cost4sub[where_sub]
+        row[where_sub] = SUBSTITUTION
+        first, last = max(band - ii, 0), min(m - ii + band, width - 1)
+        dist[:first] = infinity
+        dist[last + 1:] = infinity
+        before = dist.copy()
+        _insertion_pass(dist, ins_cost)
+        row[dist < before] = INSERTION
+        dist[last + 1:] = infinity
+    return _backtrack(moves, np.arange(n + 1) - band, source, target, empty_symbol)
+
+def _last_row(source, target, sub_cost, ins_cost, del_cost):
+    dist = np.arange(len(target) + 1) * ins_cost
+    for s in source:
+        dist = _alignment_row(dist, target, s, sub_cost, ins_cost, del_cost)
+    return dist
+
+def _hirschberg_alignment(source, target, sub_cost, ins_cost, del_cost, empty_symbol, alignment):
+    """
+    Hirschberg's divide and conquer: the middle row of the source is split at the column where the costs of the
+    upper and the (reversed) lower half sum to the minimum and both halves are aligned recursively. Only O(n + m)
+    cells are kept besides the small subproblems aligned with the full matrix.
+    """
+    n, m = len(source), len(target)
+    if n <= 1 or (n + 1) * (m + 1) <= HIRSCHBERG_BLOCK_SIZE:
+        alignment.extend(_full_alignment(source, target, sub_cost, ins_cost, del_cost, empty_symbol))
+        return
+    middle = n // 2
+    forward = _last_row(source[:middle], target, sub_cost, ins_cost, del_cost)
+    backward = _last_row(source[middle:][::-1], target[::-1], sub_cost, ins_cost, del_cost)
+    split = int(np.argmin(forward + backward[::-1]))
+    _hirschberg_alignment(source[:middle], target[:split], sub_cost, ins_cost, del_cost, empty_symbol, alignment)
+    _hirschberg_alignment(source[middle:], target[split:], sub_cost, ins_cost, del_cost, empty_symbol, alignment)
+
+def levenshtein_alignment(source, target, sub_cost=1, ins_cost=1, del_cost=1, empty_symbol=None, band=None, hirschberg=False):
+    """
+    Alignment of the sequences as a list of (source symbol, target symbol) pairs, empty_symbol stands for the missing
+    symbol of insertions and deletions. With band, only the cells near the diagonal are computed (see
+    _banded_alignment); with hirschberg, the optimal alignment is found in linear memory. Both options may choose
+    a different alignment among the optimal ones than the default.
+    """
+    target = np.array(target)
+    if hirschberg:
+        alignment = []
+        _hirschberg_alignment(source, target, sub_cost, ins_cost, del_cost, empty_symbol, alignment)
+        return alignment
+    if band is not None:
+        band = max(band, abs(len(source) - len(target)))
+        if band < max(len(source), len(target)):
+            return _banded_alignment(source, target, band, sub_cost, ins_cost, del_cost, empty_symbol)
+    return _full_alignment(source, target, sub_cost, ins_cost, del_cost, empty_symbol)
+
 def edit_stats_for_alignment(alig, empty_symbol=None):
   alig = np.array(alig)
   ncor = np.sum(alig[:,0]==alig[:,1])
@@ -119,12 +412,103 @@ def edit_stats_for_alignment(alig, empty_symbol=None):
   nsub = nphn - ncor - ndel
   return nphn, ncor, nins, ndel, nsub
 
+class ConfusionMatrix:
+    """
+    Counts of the aligned symbol pairs of many alignments, the pairs are (hypothesis, reference) as returned by
+    levenshtein_alignment(hypothesis, reference). The symbols are encoded as integers (0 is the empty symbol) and only
+    the pairs which occurred are counted, so the memory grows with the number of distinct pairs, not symbols squared.
+    """
+    # encoded pairs are merged into the counts when this many of them are buffered
+    buffer_size = 1 << 20
+
+    def __init__(self, alignments=(), empty_symbol=None):
+        self.empty_symbol = empty_symbol
+        self.symbols = [empty_symbol]
+        self._codes = {empty_symbol: 0}
+        # keys are reference code << 32 | hypothesis code, sorted
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._buffer = []
+        self._buffered = 0
+        for alignment in alignments:
+            self.add(alignment)
+
+    def add(self, alignment):
+        symbols = [symbol for pair in alignment for symbol in pair]
+        for symbol in [symbol for symbol in dict.fromkeys(symbols) if symbol not in self._codes]:
+            self._codes[symbol] = len(self.symbols)
+            # numpy scalars from the target array of levenshtein_alignment are equal to the plain values
+            self.symbols.append(symbol.item() if isinstance(symbol, np.generic) else symbol)
+        codes = np.fromiter(map(self._codes.__getitem__, symbols), dtype=np.int64, count=len(symbols))
+        self._buffer.append((codes[1::2] << 32) | codes[0::2])
+        self._buffered += len(codes) // 2
+        if self._buffered >= self.buffer_size:
+            self._merge()
+
+    def _merge(self):
+        if not self._buffer:
+            return
+        keys = np.concatenate([self._keys] + self._buffer)
+        counts = np.concatenate([self._counts, np.ones(len(keys) - len(self._keys), dtype=np.int64)])
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._counts = np.bincount(inverse, weights=counts, minlength=len(self._keys)).astype(np.int64)
+        self._buffer = []
+        self._buffered = 0
+
+    def pairs(self):
+        """Codes of the reference and hypothesis symbols of the counted pairs and their counts."""
+        self._merge()
+        return self._keys >> 32, self._keys & 0xffffffff, self._counts
+
+    def top_confusions(self, count=10):
+        """The most frequent substitutions as (reference, hypothesis, count), ties in the order of the symbols."""
+        references, hypotheses, counts = self.pairs()
+        substitutions = np.flatnonzero((references != hypotheses) & (references != 0) & (hypotheses != 0))
+        order = substitutions[np.argsort(-counts[substitutions], kind="stable")[:count]]
+        return [(self.symbols[reference], self.symbols[hypothesis], int(number))
+                for reference, hypothesis, number in zip(references[order], hypotheses[order], counts[order])]
+
+    def _symbol_counts(self, codes, counts, where):
+        return np.bincount(codes[where], weights=counts[where], minlength=len(self.symbols))
+
+    def deletion_rates(self):
+        """Deletions of every reference symbol divided by its occurrences in the reference."""
+        references, hypotheses, counts = self.pairs()
+        occurrences = self._symbol_counts(references, counts, references != 0)
+        deletions = self._symbol_counts(references, counts, (references != 0) & (hypotheses == 0))
+        return {self.symbols[code]: float(deletions[code] / occurrences[code]) for code in np.flatnonzero(occurrences)}
+
+    def insertion_rates(self):
+        """Insertions of every hypothesis symbol divided by its occurrences in the hypothesis."""
+        references, hypotheses, counts = self.pairs()
+        occurrences = self._symbol_counts(hypotheses, counts, hypotheses != 0)
+        insertions = self._symbol_counts(hypotheses, counts, (hypotheses != 0) & (references == 0))
+        return {self.symbols[code]: float(insertions[code] / occurrences[code]) for code in np.flatnonzero(occurrences)}
+
+    def matrix(self, symbols=None):
+        """
+        Dense counts for the symbols (all of them by default), rows are the reference symbols and columns the
+        hypothesis symbols. The last row counts the insertions and the last column the deletions.
+        """
+        if symbols is None:
+            symbols = self.symbols[1:]
+        references, hypotheses, counts = self.pairs()
+        # position of every code in the matrix, -1 for the symbols which are left out
+        positions = np.full(len(self.symbols), -1, dtype=np.int64)
+        positions[0] = len(symbols)
+        codes = [self._codes[symbol] for symbol in symbols if symbol in self._codes]
+        positions[codes] = [position for position, symbol in enumerate(symbols) if symbol in self._codes]
+        rows, columns = positions[references], positions[hypotheses]
+        selected = (rows >= 0) & (columns >= 0)
+        matrix = np.zeros((len(symbols) + 1, len(symbols) + 1), dtype=np.int64)
+        matrix[rows[selected], columns[selected]] = counts[selected]
+        return matrix
+
 def print_confusion_matrix(alig, phns, tab=4, empty_symbol=None):
-  from collections import Counter
-  conf_counts=Counter(map(tuple, alig))
-  conf_mx = [[conf_counts[(row,col)] for row in list(phns)+[empty_symbol]] 
-                                       for col in list(phns)+[empty_symbol]]
-  print (" "*tab + (" %"+str(tab)+"s")*(len(phns)+1) % (tuple(phns)+ ('Del',)))
-  for phn, row in zip(list(phns), conf_mx[:-1]):
-    print ("%"+str(tab)+"s")%phn + (" %"+str(tab)+"s")*(len(phns)+1) % tuple(row)
-  print (" "*(tab-3)+"Ins") + ((" %"+str(tab)+"s")*len(phns) % tuple(conf_mx[-1][:-1]))
+  phns = list(phns)
+  conf_mx = ConfusionMatrix([alig], empty_symbol).matrix(phns)
+  cell = " %" + str(tab) + "s"
+  print(" "*tab + cell*(len(phns)+1) % (tuple(phns) + ('Del',)))
+  for phn, row in zip(phns, conf_mx[:-1]):
+    print(("%"+str(tab)+"s") % phn + cell*(len(phns)+1) % tuple(row))
+  print(" "*(tab-3) + "Ins" + cell*len(phns) % tuple(conf_mx[-1][:-1]))
@@ -4,6 +4,8 @@ import argparse
 
 from shutil import copy
 
+from log_index import load_log_index
+
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -14,29 +16,6 @@ def parse_args():
     return parser.parse_args()
 
 
-def get_id_from_log(log_name, logs_folder):
-    with open(os.path.join(logs_folder, log_name)) as f:
-        for line in f:
-            if line.startswith("TEMPLATE"):
-                return line[line.rindex("/") + 1:line.rindex(".")]
-
-    return None
-
-
-def load_logs(path):
-    log_names = [log_name for log_name in os.listdir(path) if log_name.endswith(".log")]
-
-    translation = {}
-
-    for log_name in log_names:
-        page_id = get_id_from_log(log_name, path)
-
-        if page_id is not None:
-            translation[log_name[:log_name.index(".")]] = page_id
-
-    return translation
-
-
 def load_templates(path):
     files = []
 
@@ -73,7 +52,7 @@ def get_photographs(input_path, logs, templates):
 def main():
     args = parse_args()
 
-    logs = load_logs(args.logs)
+    logs = load_log_index(args.logs).translation
     templates = load_templates(args.templates)
 
     photographs = get_photographs(args.input, logs, templates)
@@ -0,0 +1,152 @@
+import os
+import sys
+import zipfile
+import numpy as np
+from os.path import join
+from multiprocessing import Pool
+from typing import Optional
+
+
+INDEX_NAME = "logs.index.npz"
+
+
+def parse_arguments():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--logs", help="Path to logs.", required=True)
+    parser.add_argument("-i", "--index", help="Path to log index, default is " + INDEX_NAME + " in the logs folder.", required=False, default=None)
+    parser.add_argument("-w", "--workers", help="Number of processes used for parsing the logs.", required=False, default=1, type=int)
+    args = parser.parse_args()
+    return args
+
+
+def parse_matrix_row(row):
+    parts = row.split()
+    return [float(part) for part in parts]
+
+
+def parse_log(path):
+    template = None
+    transformation = np.full((3, 3), np.nan)
+
+    with open(path, "r") as f:
+        for index, line in enumerate(f):
+            if template is None and line.startswith("TEMPLATE"):
+                template = line[line.rindex("/") + 1:line.rindex(".")]
+
+            line = line.strip()
+
+            if index == 3 and line.startswith("T  [[") and line.endswith("]"):
+                row = parse_matrix_row(line[5:-1])
+                transformation[0, :len(row)] = row
+
+            elif index == 4 and line.startswith("[") and line.endswith("]"):
+                row = parse_matrix_row(line[1:-1])
+                transformation[1, :len(row)] = row
+
+            elif index == 5 and line.startswith("[") and line.endswith("]]"):
+                row = parse_matrix_row(line[1:-2])
+                transformation[2, :len(row)] = row
+
+            elif index > 5 and template is not None:
+                break
+
+    return template, transformation
+
+
+class LogIndex:
+    """
+    Templates and transformation matrices of the photographs parsed from the logs. The translation maps the photograph
+    ID (name of the log without extensions) to the template ID.
+    """
+    def __init__(self, names, templates, transformations):
+        self.names = names
+        self.templates = templates
+        self.transformations = transformations
+
+        self._positions = {name: position for position, name in enumerate(names)}
+        self.translation = {name[:name.index(".")]: template for name, template in zip(names, templates) if template}
+
+    def __len__(self):
+        return len(self.names)
+
+    def transformation(self, log_name) -> Optional[np.ndarray]:
+        position = self._positions.get(log_name)
+
+        if position is None or np.isnan(self.transformations[position]).any():
+            return None
+
+        return self.transformations[position].copy()
+
+
+def read_index(path):
+    """Returns the previously indexed logs as a dictionary name -> (mtime, size, template, transformation)."""
+    try:
+        with np.load(path) as data:
+            return {str(name): (int(mtime), int(size), str(template), transformation) for name, mtime, size, template, transformation
+                    in zip(data["names"], data["mtimes"], data["sizes"], data["templates"], data["transformations"])}
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return {}
+
+
+def write_index(path, names, mtimes, sizes, templates, transformations):
+    try:
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, names=np.array(names, dtype=str), mtimes=np.array(mtimes, dtype=np.int64), sizes=np.array(sizes, dtype=np.int64),
+                     templates=np.array(templates, dtype=str), transformations=transformations)
+
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        # the index only speeds up the next run, the logs may be in a read-only folder
+        print("Could not save log index:", e)
+
+
+def load_log_index(logs_folder, index_path=None, workers=1) -> LogIndex:
+    """
+    Loads the log index and parses only the logs which are new or whose modification time or size has changed.
+    The index is saved again when it is outdated.
+    """
+    if index_path is None:
+        index_path = join(logs_folder, INDEX_NAME)
+
+    names = sorted(name for name in os.listdir(logs_folder) if name.endswith(".log"))
+    stats = [os.stat(join(logs_folder, name)) for name in names]
+    mtimes = [stat.st_mtime_ns for stat in stats]
+    sizes = [stat.st_size for stat in stats]
+
+    indexed = read_index(index_path)
+    changed = [(name, mtime, size) for name, mtime, size in zip(names, mtimes, sizes) if indexed.get(name, (None, None))[:2] != (mtime, size)]
+    paths = [join(logs_folder, name) for name, _, _ in changed]
+
+    if workers > 1 and len(paths) > 1:
+        with Pool(workers) as pool:
+            parsed = pool.map(parse_log, paths, chunksize=64)
+    else:
+        parsed = [parse_log(path) for path in paths]
+
+    for (name, mtime, size), (template, transformation) in zip(changed, parsed):
+        indexed[name] = (mtime, size, template if template is not None else "", transformation)
+
+    templates = [indexed[name][2] for name in names]
+    transformations = np.array([indexed[name][3] for name in names], dtype=np.float64).reshape(len(names), 3, 3)
+
+    if len(changed) > 0 or len(indexed) != len(names):
+        write_index(index_path, names, mtimes, sizes, templates, transformations)
+
+    return LogIndex(names, templates, transformations)
+
+
+def main():
+    args = parse_arguments()
+
+    log_index = load_log_index(args.logs, args.index, args.workers)
+
+    print("Logs:", len(log_index))
+    print("Translated photographs:", len(log_index.translation))
+    print("Transformations:", sum(log_index.transformation(name) is not None for name in log_index.names))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
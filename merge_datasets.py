@@ -1,13 +1,23 @@
 import logging
 import os
 import sys
+import bisect
+from multiprocessing import Pool
 from typing import Tuple, List, Optional
 from time import gmtime, strftime
 import decoding
 from dataset import Dataset, Page, Line
+from spatial_index import get_bounds
 import cv2
 
 
+# minimal intersection over union of bounding boxes of lines paired by geometry
+MIN_OVERLAP = 0.5
+
+# lines are aligned only near the diagonal first, the band is doubled until the alignment is exact
+ALIGNMENT_BAND = 16
+
+
 def parse_arguments():
     import argparse
     parser = argparse.ArgumentParser()
@@ -15,6 +25,7 @@ def parse_arguments():
     parser.add_argument('-t', '--tesseract-folder', help='Path to tesseract input files.', required=True)
     parser.add_argument('-o', '--output-folder', help='Path to output folder.', required=True)
     parser.add_argument('-i', '--images-folder', help="Path to images folder.", required=False, default=None)
+    parser.add_argument('-w', '--workers', help="Number of processes used for loading, merging and saving the datasets.", required=False, default=1, type=int)
     args = parser.parse_args()
     return args
 
@@ -65,7 +76,112 @@ def get_same_lines(aligned_lines: List[Tuple[Line, Line]]) -> List[Line]:
     return result
 
 
+def get_overlap(bounds1, bounds2) -> float:
+    width = min(bounds1[2], bounds2[2]) - max(bounds1[0], bounds2[0])
+    height = min(bounds1[3], bounds2[3]) - max(bounds1[1], bounds2[1])
+
+    if width <= 0 or height <= 0:
+        return 0.0
+
+    intersection = width * height
+    area1 = (bounds1[2] - bounds1[0]) * (bounds1[3] - bounds1[1])
+    area2 = (bounds2[2] - bounds2[0]) * (bounds2[3] - bounds2[1])
+
+    return intersection / (area1 + area2 - intersection)
+
+
+def pair_lines_by_geometry(page1: Page, page2: Page) -> List[Tuple[int, int]]:
+    """Pairs of positions of lines with overlapping bounding boxes and the same text, every line is used at most once."""
+    bounds = [(position1, get_bounds(line1.bounding_box)) for position1, line1 in enumerate(page1.lines)]
+    bounds = [(position1, bounds1) for position1, bounds1 in bounds if bounds1 is not None]
+
+    # ABBYY pages store no coordinates (Coords points="None"), there is nothing to pair and no need to index page2
+    if len(bounds) == 0:
+        return []
+
+    index = page2.get_spatial_index()
+    candidates = []
+
+    for position1, bounds1 in bounds:
+        line1 = page1.lines[position1]
+
+        for position2 in index.intersecting(*bounds1):
+            line2 = page2.lines[position2]
+            overlap = get_overlap(bounds1, get_bounds(line2.bounding_box))
+
+            if overlap >= MIN_OVERLAP and line1 == line2:
+                candidates.append((-overlap, position1, position2))
+
+    pairs = []
+    used1 = set()
+    used2 = set()
+
+    for _, position1, position2 in sorted(candidates):
+        if position1 not in used1 and position2 not in used2:
+            pairs.append((position1, position2))
+            used1.add(position1)
+            used2.add(position2)
+
+    return sorted(pairs)
+
+
+def get_monotone_pairs(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Longest subsequence of pairs (sorted by the first position) increasing in the second position."""
+    tails = []
+    tail_positions = []
+    previous = [None] * len(pairs)
+
+    for index, (_, position2) in enumerate(pairs):
+        length = bisect.bisect_left(tails, position2)
+
+        if length == len(tails):
+            tails.append(position2)
+            tail_positions.append(index)
+        else:
+            tails[length] = position2
+            tail_positions[length] = index
+
+        previous[index] = tail_positions[length - 1] if length > 0 else None
+
+    result = []
+    index = tail_positions[-1] if len(tail_positions) > 0 else None
+
+    while index is not None:
+        result.append(pairs[index])
+        index = previous[index]
+
+    result.reverse()
+
+    return result
+
+
+def align_lines(lines1: List[Line], lines2: List[Line]) -> List[Line]:
+    """
+    Same lines of the optimal text alignment. The banded alignment is optimal when it needs at most band edits, because
+    no alignment with that many edits leaves the band, otherwise it is repeated with a wider band. Similar runs of lines
+    are aligned in O((n + m) * band) instead of O(n * m) and the result is the same as of the full alignment.
+    """
+    if len(lines1) == 0 or len(lines2) == 0:
+        return []
+
+    band = max(ALIGNMENT_BAND, abs(len(lines1) - len(lines2)))
+
+    while True:
+        alignment = decoding.levenshtein_alignment(lines1, lines2, band=band)
+
+        if band >= max(len(lines1), len(lines2)) or sum(line1 != line2 for line1, line2 in alignment) <= band:
+            return get_same_lines(alignment)
+
+        band *= 2
+
+
 def intersect_pages(page1: Page, page2: Page) -> Optional[Page]:
+    """
+    Lines with overlapping bounding boxes and the same text are paired first, the pairs which keep the reading order of
+    both pages are used as anchors and only the runs of lines between the anchors are aligned by their text. Pages
+    without coordinates are aligned by the text as a whole, this is always the case for ABBYY pages, which have no
+    coordinates, so merging ABBYY with Tesseract gives the same lines as the text alignment alone.
+    """
     lines1 = page1.lines
     lines2 = page2.lines
 
@@ -73,9 +189,20 @@ def intersect_pages(page1: Page, page2: Page) -> Optional[Page]:
     logging.debug("Page ID: " + page1.id)
     logging.debug("##########################################################")
 
-    aligned_lines = decoding.levenshtein_alignment(lines1, lines2)
+    anchors = get_monotone_pairs(pair_lines_by_geometry(page1, page2))
+
+    same_lines = []
+    start1 = 0
+    start2 = 0
 
-    same_lines = get_same_lines(aligned_lines)
+    for position1, position2 in anchors:
+        same_lines += align_lines(lines1[start1:position1], lines2[start2:position2])
+        same_lines.append(merge_lines(lines1[position1], lines2[position2]))
+
+        start1 = position1 + 1
+        start2 = position2 + 1
+
+    same_lines += align_lines(lines1[start1:], lines2[start2:])
 
     if len(same_lines) == 0:
         return None
@@ -83,18 +210,25 @@ def intersect_pages(page1: Page, page2: Page) -> Optional[Page]:
     return Page(page1.id, same_lines)
 
 
-def merge_datasets(dataset1: Dataset, dataset2: Dataset) -> Dataset:
+def intersect_page_pair(pages: Tuple[Page, Page]) -> Optional[Page]:
+    return intersect_pages(*pages)
+
+
+def merge_datasets(dataset1: Dataset, dataset2: Dataset, workers: int = 1) -> Dataset:
     result = Dataset()
 
-    for id in dataset1.pages:
-        if id in dataset2.pages:
-            page1 = dataset1.pages[id]
-            page2 = dataset2.pages[id]
+    page_pairs = ((dataset1.pages[id], dataset2.pages[id]) for id in dataset1.pages if id in dataset2.pages)
 
-            page = intersect_pages(page1, page2)
+    if workers > 1:
+        with Pool(workers) as pool:
+            # imap keeps the order of the pages
+            pages = list(pool.imap(intersect_page_pair, page_pairs, chunksize=4))
+    else:
+        pages = [intersect_page_pair(page_pair) for page_pair in page_pairs]
 
-            if page is not None:
-                result.add_page(page)
+    for page in pages:
+        if page is not None:
+            result.add_page(page)
 
     return result
 
@@ -132,16 +266,16 @@ def main():
     args = parse_arguments()
     logging.basicConfig(filename="merge." + strftime("%Y-%m-%d_%H-%M-%S", gmtime()) + ".log", level=logging.DEBUG)
 
-    abbyy_dataset = Dataset(args.abbyy_folder)
-    tesseract_dataset = Dataset(args.tesseract_folder)
+    abbyy_dataset = Dataset(args.abbyy_folder, workers=args.workers)
+    tesseract_dataset = Dataset(args.tesseract_folder, workers=args.workers)
 
-    merged_dataset = merge_datasets(abbyy_dataset, tesseract_dataset)
+    merged_dataset = merge_datasets(abbyy_dataset, tesseract_dataset, args.workers)
 
     if args.images_folder is not None:
         print("indenting")
         indent_dataset(merged_dataset, args.images_folder)
 
-    merged_dataset.save(args.output_folder)
+    merged_dataset.save(args.output_folder, workers=args.workers)
     print("Dataset saved to " + args.output_folder)
 
     return 0
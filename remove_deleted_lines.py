@@ -10,6 +10,7 @@ def parse_args():
     parser.add_argument("-d", "--dataset", help="Path to XMLs.", required=False)
     parser.add_argument("-l", "--lines", help="Path to lines with transcriptions.", required=False)
     parser.add_argument("-o", "--output", help="Path to output.", required=False)
+    parser.add_argument("-c", "--cache", help="Path to dataset cache, it is created when it does not exist or it is outdated.", required=False, default=None)
     args = parser.parse_args()
     return args
 
@@ -28,14 +29,12 @@ def load_lines(path):
 
 
 def process_dataset(dataset, lines):
-    new_dataset = Dataset(None)
-
     total_pages = len(dataset.pages)
 
-    for index, page_id in enumerate(dataset.pages):
-        print("{current}/{total} {percentage:.2f}".format(current=index, total=total_pages, percentage=100 * float(index)/total_pages))
+    for index, page in enumerate(dataset.iter_pages()):
+        page_id = page.id.split(".")[0]
 
-        page = dataset.get_page(page_id)
+        print("{current}/{total} {percentage:.2f}".format(current=index, total=total_pages, percentage=100 * float(index)/total_pages))
 
         new_lines = []
 
@@ -47,9 +46,7 @@ def process_dataset(dataset, lines):
             if filename in lines and line.text == lines[filename]:
                 new_lines.append(line)
 
-        new_dataset.add_page(Page(page_id + ".jpg_rec", new_lines))
-
-    return new_dataset
+        yield Page(page_id + ".jpg_rec", new_lines)
 
 
 def main():
@@ -57,9 +54,13 @@ def main():
 
     lines = load_lines(args.lines)
 
-    dataset = Dataset(args.dataset, lazy=True)
+    if args.cache is not None:
+        dataset = Dataset.from_cache(args.cache, args.dataset, lazy=True)
+    else:
+        dataset = Dataset(args.dataset, lazy=True)
     print(dataset)
-    process_dataset(dataset, lines).save(args.output)
+    for page in process_dataset(dataset, lines):
+        page.save(args.output)
 
     return 0
 
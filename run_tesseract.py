@@ -0,0 +1,51 @@
+import os
+import sys
+import subprocess
+from functools import partial
+from os.path import abspath, dirname, join
+
+import tesseract
+from batch_conversion import convert_directory
+
+
+CONFIG_FILE = join(dirname(abspath(__file__)), "tesseract_config.ini")
+
+
+def parse_arguments():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-i', '--input-folder', help='Path to folder with photographs (*.png).', required=True)
+    parser.add_argument('-o', '--output-folder', help='Path to output folder with XML files.', required=True)
+    parser.add_argument('-w', '--workers', help='Number of parallel tesseract processes, default is the number of CPUs.', required=False, default=os.cpu_count() or 1, type=int)
+    parser.add_argument('-c', '--config', help='Path to tesseract config file.', required=False, default=CONFIG_FILE)
+    parser.add_argument('--tesseract', help='Path to tesseract executable.', required=False, default="tesseract")
+    parser.add_argument('--resume', help='Skip photographs whose output is newer than the photograph.', required=False, default=False, action='store_true')
+    args = parser.parse_args()
+    return args
+
+
+def recognize(executable, config, input_file, output_file):
+    """Runs single-threaded tesseract on the photograph and converts the hOCR from its standard output to XML."""
+    # the processes run in parallel, so the OpenMP threads of each tesseract would only compete for the same cores
+    environment = dict(os.environ, OMP_THREAD_LIMIT="1")
+    result = subprocess.run([executable, input_file, "stdout", "hocr", config], stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environment)
+
+    if result.returncode != 0:
+        raise RuntimeError("tesseract exited with code {code}: {error}".format(code=result.returncode, error=result.stderr.decode("utf-8", "replace").strip()))
+
+    tesseract.write_output(tesseract.process(result.stdout), output_file)
+
+    return True
+
+
+def main():
+    args = parse_arguments()
+
+    convert = partial(recognize, args.tesseract, args.config)
+    failures = convert_directory(convert, args.input_folder, args.output_folder, ".png", args.workers, args.resume)
+
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ from os.path import join
 import os
 
 from dataset import Dataset
+from log_index import load_log_index
 
 
 def parse_arguments():
@@ -14,6 +15,7 @@ def parse_arguments():
     parser.add_argument("-l", "--logs", help="Path to logs.", required=False, default=None)
     parser.add_argument("-p", "--prefix", help="Preifx.", required=False, default="")
     parser.add_argument("-b", "--bbox-translation", help="Translate bounding-boxes.", required=False, default=False)
+    parser.add_argument("-c", "--cache", help="Path to dataset cache, it is created when it does not exist or it is outdated.", required=False, default=None)
     args = parser.parse_args()
     return args
 
@@ -85,29 +87,6 @@ def get_images(images_folder):
     return [image_name for image_name in os.listdir(images_folder) if image_name.endswith(('.png', '.jpg'))]
 
 
-def get_id_from_log(log_name, logs_folder):
-    with open(join(logs_folder, log_name)) as f:
-        for line in f:
-            if line.startswith("TEMPLATE"):
-                return line[line.rindex("/") + 1:line.rindex(".")]
-
-    return None
-
-
-def translate_logs(logs_folder):
-    log_names = [log_name for log_name in os.listdir(logs_folder) if log_name.endswith(".log")]
-
-    translation = {}
-
-    for log_name in log_names:
-        page_id = get_id_from_log(log_name, logs_folder)
-
-        if page_id is not None:
-            translation[log_name[:log_name.index(".")]] = page_id
-
-    return translation
-
-
 def save_image(image, path):
     cv2.imwrite(path, image)
 
@@ -119,7 +98,7 @@ def show_images(dataset, images_folder, logs_folder=None, bbox_translation=False
 
     translation = {}
     if logs_folder is not None:
-        translation = translate_logs(logs_folder)
+        translation = load_log_index(logs_folder).translation
 
     for image_name in image_names:
         id = image_name[:image_name.index(".")]
@@ -183,7 +162,10 @@ def show_images(dataset, images_folder, logs_folder=None, bbox_translation=False
 def main():
     args = parse_arguments()
 
-    dataset = Dataset(args.dataset, lazy=True)
+    if args.cache is not None:
+        dataset = Dataset.from_cache(args.cache, args.dataset, lazy=True)
+    else:
+        dataset = Dataset(args.dataset, lazy=True)
     print(dataset)
 
     show_images(dataset, args.images, args.logs, args.bbox_translation, args.prefix)
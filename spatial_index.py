@@ -0,0 +1,212 @@
+import numpy as np
+from typing import List, Optional
+
+
+MAX_CELLS_PER_AXIS = 256
+
+
+def get_bounds(rectangle) -> Optional[tuple]:
+    """Axis-aligned bounds (x0, y0, x1, y1) of all points of a bounding box or baseline."""
+    if rectangle is None or rectangle.start is None or rectangle.end is None:
+        return None
+
+    points = [rectangle.start, rectangle.end] + rectangle.inner_points
+    xs = [point.x for point in points]
+    ys = [point.y for point in points]
+
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def get_segments(baseline) -> List[tuple]:
+    """Segments (x0, y0, x1, y1) of the polyline start, inner points, end of a baseline."""
+    if baseline is None or baseline.start is None or baseline.end is None:
+        return []
+
+    points = [baseline.start] + baseline.inner_points + [baseline.end]
+
+    return [(first.x, first.y, second.x, second.y) for first, second in zip(points[:-1], points[1:])]
+
+
+def rectangle_distances(rectangles, x, y):
+    dx = np.maximum(np.maximum(rectangles[:, 0] - x, x - rectangles[:, 2]), 0)
+    dy = np.maximum(np.maximum(rectangles[:, 1] - y, y - rectangles[:, 3]), 0)
+
+    return np.hypot(dx, dy)
+
+
+def point_segment_distances(x, y, segments):
+    start_x, start_y = segments[:, 0], segments[:, 1]
+    direction_x, direction_y = segments[:, 2] - start_x, segments[:, 3] - start_y
+    length = direction_x * direction_x + direction_y * direction_y
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = ((x - start_x) * direction_x + (y - start_y) * direction_y) / length
+
+    # zero-length segments are points
+    t = np.clip(np.nan_to_num(t), 0, 1)
+
+    return np.hypot(start_x + t * direction_x - x, start_y + t * direction_y - y)
+
+
+def orientations(segments, x, y):
+    return np.sign((segments[:, 2] - segments[:, 0]) * (y - segments[:, 1]) - (segments[:, 3] - segments[:, 1]) * (x - segments[:, 0]))
+
+
+def segment_distances(segments, segment):
+    """Distances between the segments (n, 4) and one segment (x0, y0, x1, y1)."""
+    query = np.array([segment], dtype=np.float64)
+    x0, y0, x1, y1 = segment
+
+    distances = np.minimum.reduce([
+        point_segment_distances(segments[:, 0], segments[:, 1], query),
+        point_segment_distances(segments[:, 2], segments[:, 3], query),
+        point_segment_distances(x0, y0, segments),
+        point_segment_distances(x1, y1, segments),
+    ])
+
+    # properly crossing segments have all endpoints away from the other segment
+    crossing = (orientations(segments, x0, y0) * orientations(segments, x1, y1) < 0) & \
+               (orientations(query, segments[:, 0], segments[:, 1]) * orientations(query, segments[:, 2], segments[:, 3]) < 0)
+
+    return np.where(crossing, 0.0, distances)
+
+
+class Grid:
+    """
+    Uniform grid over rectangles (x0, y0, x1, y1), every cell keeps the positions of the rectangles overlapping it.
+    The cell size is the median size of the rectangles, so a typical rectangle is registered in a few cells.
+    """
+    def __init__(self, rectangles):
+        self.rectangles = np.array(rectangles, dtype=np.float64).reshape(-1, 4)
+        self.cells = {}
+
+        if len(self.rectangles) == 0:
+            return
+
+        self.origin = self.rectangles[:, :2].min(axis=0)
+        extent = self.rectangles[:, 2:].max(axis=0) - self.origin
+        sizes = self.rectangles[:, 2:] - self.rectangles[:, :2]
+        self.cell_size = np.maximum(np.maximum(np.median(sizes, axis=0), extent / MAX_CELLS_PER_AXIS), 1.0)
+
+        first = self.get_cells(self.rectangles[:, :2])
+        last = self.get_cells(self.rectangles[:, 2:])
+        self.last_cell = last.max(axis=0)
+
+        cells = {}
+
+        for position, (cx0, cy0, cx1, cy1) in enumerate(np.hstack([first, last]).tolist()):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cells.setdefault((cx, cy), []).append(position)
+
+        self.cells = {cell: np.array(positions) for cell, positions in cells.items()}
+
+    def get_cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def get_candidates(self, cx0, cy0, cx1, cy1):
+        if len(self.cells) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        cx0, cy0 = max(cx0, 0), max(cy0, 0)
+        cx1, cy1 = min(cx1, self.last_cell[0]), min(cy1, self.last_cell[1])
+
+        parts = [self.cells[(cx, cy)] for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in self.cells]
+
+        if len(parts) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.unique(np.concatenate(parts))
+
+    def query(self, x0, y0, x1, y1):
+        """Positions of the rectangles intersecting the rectangle, in ascending order."""
+        if len(self.cells) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        (cx0, cy0), (cx1, cy1) = self.get_cells(np.array([[x0, y0], [x1, y1]], dtype=np.float64))
+        positions = self.get_candidates(cx0, cy0, cx1, cy1)
+        rectangles = self.rectangles[positions]
+
+        return positions[(rectangles[:, 0] <= x1) & (rectangles[:, 2] >= x0) & (rectangles[:, 1] <= y1) & (rectangles[:, 3] >= y0)]
+
+    def nearest(self, x, y, count):
+        """Positions of the count nearest rectangles, ordered by the distance and the position."""
+        if len(self.cells) == 0 or count <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        cx, cy = self.get_cells(np.array([x, y], dtype=np.float64))
+        radius = 0
+
+        while True:
+            positions = self.get_candidates(cx - radius, cy - radius, cx + radius, cy + radius)
+            covers_all = cx - radius <= 0 and cy - radius <= 0 and cx + radius >= self.last_cell[0] and cy + radius >= self.last_cell[1]
+
+            if len(positions) >= count or covers_all:
+                distances = rectangle_distances(self.rectangles[positions], x, y)
+                order = np.lexsort((positions, distances))[:count]
+
+                # every rectangle outside of the searched cells is farther than radius cells from the point
+                if covers_all or distances[order[-1]] <= radius * self.cell_size.min():
+                    return positions[order]
+
+            radius += 1
+
+
+class LineIndex:
+    """
+    Spatial index of the lines of a page. The bounding boxes are indexed by their axis-aligned bounds and the
+    baselines by their segments. The queries return positions of the lines in the indexed list.
+    """
+    def __init__(self, lines):
+        box_lines = []
+        boxes = []
+
+        for position, line in enumerate(lines):
+            bounds = get_bounds(line.bounding_box)
+
+            if bounds is not None:
+                box_lines.append(position)
+                boxes.append(bounds)
+
+        segment_lines = []
+        segments = []
+
+        for position, line in enumerate(lines):
+            for segment in get_segments(line.baseline):
+                segment_lines.append(position)
+                segments.append(segment)
+
+        self.box_lines = np.array(box_lines, dtype=np.int64)
+        self.boxes = Grid(boxes)
+
+        self.segment_lines = np.array(segment_lines, dtype=np.int64)
+        self.segments = np.array(segments, dtype=np.float64).reshape(-1, 4)
+        self.segment_bounds = Grid(np.hstack([np.minimum(self.segments[:, :2], self.segments[:, 2:]), np.maximum(self.segments[:, :2], self.segments[:, 2:])]))
+
+    def intersecting(self, x0, y0, x1, y1) -> List[int]:
+        """Lines whose bounding box intersects the rectangle."""
+        return self.box_lines[self.boxes.query(x0, y0, x1, y1)].tolist()
+
+    def containing(self, x, y) -> List[int]:
+        """Lines whose bounding box contains the point."""
+        return self.intersecting(x, y, x, y)
+
+    def nearest(self, x, y, count=1) -> List[int]:
+        """The count lines with the nearest bounding boxes to the point (zero distance inside of the box)."""
+        return self.box_lines[self.boxes.nearest(x, y, count)].tolist()
+
+    def near_baseline(self, baseline, distance) -> List[int]:
+        """Lines whose baseline is at most distance from the baseline (a Baseline or a list of points)."""
+        if isinstance(baseline, (list, tuple)):
+            points = [(point[0], point[1]) for point in baseline]
+        else:
+            points = [point.get_tuple() for point in [baseline.start] + baseline.inner_points + [baseline.end]]
+
+        lines = set()
+
+        for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+            positions = self.segment_bounds.query(min(x0, x1) - distance, min(y0, y1) - distance, max(x0, x1) + distance, max(y0, y1) + distance)
+            near = positions[segment_distances(self.segments[positions], (x0, y0, x1, y1)) <= distance]
+            lines.update(self.segment_lines[near].tolist())
+
+        return sorted(lines)
@@ -6,6 +6,7 @@ import decoding
 import cv2
 
 from line_transcription import LineTranscription
+from log_index import load_log_index
 
 
 def parse_arguments():
@@ -35,29 +36,6 @@ def load_lines(path):
     return lines
 
 
-def get_id_from_log(log_name, logs_folder):
-    with open(os.path.join(logs_folder, log_name)) as f:
-        for line in f:
-            if line.startswith("TEMPLATE"):
-                return line[line.rindex("/") + 1:line.rindex(".")]
-
-    return None
-
-
-def load_logs(path):
-    log_names = [log_name for log_name in os.listdir(path) if log_name.endswith(".log")]
-
-    translation = {}
-
-    for log_name in log_names:
-        page_id = get_id_from_log(log_name, path)
-
-        if page_id is not None:
-            translation[log_name[:log_name.index(".")]] = page_id
-
-    return translation
-
-
 def get_used_templates(logs, crops_path):
     used_templates = set()
 
@@ -206,7 +184,7 @@ def main():
     args = parse_arguments()
 
     lines = load_lines(args.source)
-    logs = load_logs(args.logs)
+    logs = load_log_index(args.logs).translation
 
     if args.train is None or args.valid is None or args.test is None:
         templates = split_templates(logs, args.crops)
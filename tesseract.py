@@ -3,16 +3,26 @@ from lxml import etree
 from os import listdir
 from os.path import isfile, join, abspath
 import re
+from io import BytesIO
 
 from dataset import BoundingBox, Baseline
+from batch_conversion import convert_directory
 
 
 def parse_arguments():
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('-i', '--input-file', help='Path to input file.', required=True)
-    parser.add_argument('-o', '--output-file', help='Path to output file.', required=True)
+    parser.add_argument('-i', '--input-file', help='Path to input file.', required=False, default=None)
+    parser.add_argument('-o', '--output-file', help='Path to output file.', required=False, default=None)
+    parser.add_argument('--input-folder', help='Path to folder with input files (*.hocr) converted in batch mode.', required=False, default=None)
+    parser.add_argument('--output-folder', help='Path to output folder of batch mode.', required=False, default=None)
+    parser.add_argument('-w', '--workers', help='Number of processes used in batch mode.', required=False, default=1, type=int)
+    parser.add_argument('--force', help='Convert also files whose output is newer than the input in batch mode.', required=False, default=False, action='store_true')
     args = parser.parse_args()
+
+    if (args.input_file is None) == (args.input_folder is None) or (args.input_file is None) != (args.output_file is None) or (args.input_folder is None) != (args.output_folder is None):
+        parser.error("either --input-file and --output-file or --input-folder and --output-folder are required")
+
     return args
 
 
@@ -52,95 +62,104 @@ def get_bounding_box_and_baseline(line_tag):
     return bbox, baseline
 
 
-def process_line(line_tag):
+def create_text_line(line_tag, text):
     text_line = etree.Element("TextLine")
-
     bounding_box, baseline = get_bounding_box_and_baseline(line_tag)
-    text = ""
 
-    for span_tag in line_tag.iter():
-        if "class" in span_tag.attrib and span_tag.attrib["class"] == "ocrx_word":
-            for text_element in span_tag.xpath("descendant-or-self::*/text()"):
-                text += text_element + " "
+    if bounding_box is not None:
+        line_coords = etree.SubElement(text_line, "Coords")
+        line_coords.set("points", bounding_box.get_xml_output())
 
-    text = text.strip()
-    
-    if len(text) > 0:
-        if bounding_box is not None:
-            line_coords = etree.SubElement(text_line, "Coords")
-            line_coords.set("points", bounding_box.get_xml_output())
+    if baseline is not None:
+        line_baseline = etree.SubElement(text_line, "Baseline")
+        line_baseline.set("points", baseline.get_xml_output())
 
-        if baseline is not None:
-            line_baseline = etree.SubElement(text_line, "Baseline")
-            line_baseline.set("points", baseline.get_xml_output())
+    line_text_equiv = etree.SubElement(text_line, "TextEquiv")
+    line_unicode = etree.SubElement(line_text_equiv, "Unicode")
+    line_unicode.text = text
 
-        line_text_equiv = etree.SubElement(text_line, "TextEquiv")
-        line_unicode = etree.SubElement(line_text_equiv, "Unicode")
-        line_unicode.text = text
+    return text_line
 
-        return text_line
-
-    return None
 
+def process(content):
+    """
+    Converts hOCR (str or UTF-8 bytes) to PAGE XML in a single pass. Every ocr_carea with text lines becomes a TextRegion
+    with the ocr_line elements of its paragraphs, the text of a line is formed by the text of its ocrx_word elements.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+
+    output_root = etree.Element("PcGts")
+    page = etree.SubElement(output_root, "Page")
 
-def process_paragraph(paragraph_tag):
+    # open areas, paragraphs and lines, a line belongs to the innermost area
+    regions = []
+    paragraphs = 0
     lines = []
 
-    for span_tag in paragraph_tag.iter():
-        if "class" in span_tag.attrib and span_tag.attrib["class"] == "ocr_line":
-            text_line = process_line(span_tag)
-            if text_line is not None:
-                lines.append(text_line)
+    for event, tag in etree.iterparse(BytesIO(content), events=("start", "end")):
+        tag_class = tag.get("class")
 
-    return lines
+        if event == "start":
+            if tag_class == "ocr_carea":
+                # regions are kept in the order of the areas, empty ones are removed at the end of the area
+                regions.append(etree.SubElement(page, "TextRegion"))
+            elif tag_class == "ocr_par" and len(regions) > 0:
+                paragraphs += 1
+            elif tag_class == "ocr_line" and paragraphs > 0:
+                lines.append([])
 
-
-def process_area(area_tag):
-    text_region = etree.Element("TextRegion")
-    append = False
-
-    for p_tag in area_tag.iter():
-        if "class" in p_tag.attrib and p_tag.attrib["class"] == "ocr_par":
-            lines = process_paragraph(p_tag)
+        elif tag_class == "ocrx_word":
             if len(lines) > 0:
-                append = True
-                for line in lines:
-                    text_region.append(line)
+                lines[-1].extend(tag.itertext())
 
-    if append:
-        return text_region
+        elif tag_class == "ocr_line" and paragraphs > 0:
+            # words are separated by single spaces, as are the text nodes inside of a word
+            text = " ".join(lines.pop()).strip()
+            if len(text) > 0:
+                regions[-1].append(create_text_line(tag, text))
+            tag.clear()
 
-    return None
+        elif tag_class == "ocr_par" and len(regions) > 0:
+            paragraphs -= 1
 
+        elif tag_class == "ocr_carea":
+            text_region = regions.pop()
+            if len(text_region) == 0:
+                page.remove(text_region)
 
-def process(content):
-    content = bytes(content.encode(encoding="utf16"))
-    root = etree.fromstring(content)
+            tag.clear()
+            while tag.getprevious() is not None:
+                del tag.getparent()[0]
 
-    output_root = etree.Element("PcGts")    
-    page = etree.SubElement(output_root, "Page")
+    return output_root
 
-    for div_tag in root.iter():
-        if "class" in div_tag.attrib and div_tag.attrib["class"] == "ocr_carea":
-            text_region = process_area(div_tag)
-            if text_region is not None:
-                page.append(text_region)
 
-    return output_root
+def write_output(output, output_file):
+    output_xml_string = str(etree.tostring(output, pretty_print=True).decode("utf-8"))
 
+    with open(output_file, "w") as f:
+         f.write(output_xml_string)
 
-def main():
-    args = parse_arguments()
 
+def convert_file(input_file, output_file):
     content = None
-    with open(args.input_file, "r") as f:
+    with open(input_file, "rb") as f:
         content = f.read()
 
-    output = process(content)
-    output_xml_string = str(etree.tostring(output, pretty_print=True).decode("utf-8"))
+    write_output(process(content), output_file)
 
-    with open(args.output_file, "w") as f:
-         f.write(output_xml_string)
+    return True
+
+
+def main():
+    args = parse_arguments()
+
+    if args.input_folder is not None:
+        failures = convert_directory(convert_file, args.input_folder, args.output_folder, ".hocr", args.workers, not args.force)
+        return 1 if len(failures) > 0 else 0
+
+    convert_file(args.input_file, args.output_file)
 
     return 0
 
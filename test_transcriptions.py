@@ -1,5 +1,6 @@
 import sys
 import argparse
+import numpy as np
 import decoding
 
 
@@ -7,6 +8,7 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-s", "--source-transcriptions", required=True)
     parser.add_argument("-t", "--target-transcriptions", required=True)
+    parser.add_argument("--top-confusions", help="Number of the most frequent character confusions, deletions and insertions to print.", required=False, default=0, type=int)
     args = parser.parse_args()
     return args
 
@@ -51,22 +53,46 @@ def print_alignment(alignment):
     print(target_transcription)
 
 
-def test(source_transcriptions, target_transcriptions):
+def print_confusions(confusions, count):
+    print()
+    print("Top confusions (target -> source):")
+
+    for reference, hypothesis, number in confusions.top_confusions(count):
+        print("  {reference!r} -> {hypothesis!r}: {number}".format(reference=reference, hypothesis=hypothesis, number=number))
+
+    references, hypotheses, counts = confusions.pairs()
+
+    for name, rates, codes, errors in [("deletions", confusions.deletion_rates(), references, hypotheses == 0),
+                                       ("insertions", confusions.insertion_rates(), hypotheses, references == 0)]:
+        numbers = np.bincount(codes[errors], weights=counts[errors], minlength=len(confusions.symbols)).astype(int)
+        print("Top {name}:".format(name=name))
+
+        for code in np.argsort(-numbers[1:], kind="stable")[:count] + 1:
+            if numbers[code] > 0:
+                symbol = confusions.symbols[code]
+                print("  {symbol!r}: {number} ({rate:.2%})".format(symbol=symbol, number=numbers[code], rate=rates[symbol]))
+
+
+def test(source_transcriptions, target_transcriptions, top_confusions=0):
     first = True
     distances = []
     lengths = []
+    confusions = decoding.ConfusionMatrix()
 
     for filename in target_transcriptions:
         if filename in source_transcriptions:
             source = [c for c in source_transcriptions[filename]]
             target = [c for c in target_transcriptions[filename]]
-            alignment = decoding.levenshtein_alignment(source, target)
             distance = decoding.levenshtein_distance(source, target)
 
             distances.append(distance)
             lengths.append(len(target_transcriptions[filename]))
 
+            alignment = None
+
             if distance > 0:
+                alignment = decoding.levenshtein_alignment(source, target)
+
                 if first:
                     first = False
                 else:
@@ -75,6 +101,10 @@ def test(source_transcriptions, target_transcriptions):
                 print(filename)
                 print_alignment(alignment)
 
+            if top_confusions > 0:
+                # identical transcriptions are aligned character by character
+                confusions.add(alignment if alignment is not None else zip(source, target))
+
         else:
             print(filename, "could not be found in source transcriptions")
 
@@ -86,6 +116,9 @@ def test(source_transcriptions, target_transcriptions):
     print("Total distance:", total_distance)
     print("Accuracy:", float(total_length - total_distance) / total_length)
 
+    if top_confusions > 0:
+        print_confusions(confusions, top_confusions)
+
 
 def main():
     args = parse_args()
@@ -93,7 +126,7 @@ def main():
     source_transcriptions = load_transcriptions(args.source_transcriptions)
     target_transcriptions = load_transcriptions(args.target_transcriptions)
 
-    test(source_transcriptions, target_transcriptions)
+    test(source_transcriptions, target_transcriptions, args.top_confusions)
 
     return 0
 
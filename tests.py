@@ -1,6 +1,37 @@
+import io
+import os
 import sys
+import random
+import itertools
+import functools
+import contextlib
+import shutil
+import tempfile
 import unittest
-from dataset import BoundingBox, Point
+import unittest.mock
+from collections import Counter
+import cv2
+import numpy as np
+from lxml import etree
+import decoding
+import dataset_cropper
+import log_index
+import untransform_xmls
+import spatial_index
+import merge_datasets
+import copy_photographs
+import batch_conversion
+import tesseract
+import abbyy
+import run_tesseract
+import update_transcriptions
+import benchmark_dataset
+import benchmark_decoding
+import benchmark_untransform_xmls
+import benchmark_spatial_index
+import benchmark_copy_photographs
+import benchmark_tesseract
+from dataset import BoundingBox, Baseline, Dataset, Line, Page, Point
 
 start = Point(17, 17)
 end = Point(42, 42)
@@ -103,17 +134,1268 @@ class BoundingBoxTests(unittest.TestCase):
             b = BoundingBox(end_x=end.x, end_y=end.y)
 
 
+def create_page(id, number_of_lines):
+    lines = []
+
+    for index in range(number_of_lines):
+        bounding_box = BoundingBox(start=Point(10, 20 * index), end=Point(200, 20 * index + 15))
+        baseline = Baseline(start=Point(10, 20 * index + 12), end=Point(200, 20 * index + 12))
+        lines.append(Line("{id} line {index}".format(id=id, index=index), bounding_box, baseline, None))
+
+    return Page(id, lines)
+
+
+class DatasetTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        for index in range(6):
+            create_page("page{index}".format(index=index), index + 1).save(self.path)
+
+        with open(self.path + "/broken.xml", "w") as f:
+            f.write("")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_parallel_load_matches_serial_load(self):
+        serial = Dataset(self.path)
+        parallel = Dataset(self.path, workers=3)
+
+        self.assertEqual(list(serial.pages.keys()), list(parallel.pages.keys()))
+        for page_id, page in serial.pages.items():
+            self.assertEqual([line.text for line in page.lines], [line.text for line in parallel.pages[page_id].lines])
+
+    def test_broken_page_is_reported(self):
+        dataset = Dataset(self.path, workers=2)
+
+        self.assertEqual(len(dataset.pages), 6)
+        self.assertIn("broken.xml", dataset.errors)
+
+    def test_namespaced_page(self):
+        with open(os.path.join(self.path, "namespaced.xml"), "w") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<PcGts xmlns="http://schema.primaresearch.org/PAGE/gts/pagecontent/2013-07-15"><Metadata/><Page>'
+                    '<TextRegion><Coords points="0,0 100,100"/><TextLine><Coords points="1,2 30,4"/><Baseline points="1,3 30,3"/></TextLine></TextRegion>'
+                    '<TextRegion><TextLine><Coords points="5,6 7,8 9,10 50,60"/></TextLine><Other><TextLine/></Other></TextRegion>'
+                    '</Page></PcGts>')
+
+        page = Dataset(self.path).get_page("namespaced")
+
+        self.assertEqual(len(page.lines), 3)
+        self.assertEqual(page.lines[0].bounding_box.end.get_tuple(), (30, 4))
+        self.assertEqual(page.lines[0].baseline.start.get_tuple(), (1, 3))
+        self.assertEqual([point.get_tuple() for point in page.lines[1].bounding_box.inner_points], [(7, 8), (9, 10)])
+        self.assertIsNone(page.lines[2].bounding_box)
+
+    def test_malformed_page_is_recovered(self):
+        content = etree.tostring(create_page("malformed", 3).get_xml_output(), pretty_print=True).decode("utf-8")
+
+        with open(os.path.join(self.path, "malformed.xml"), "w") as f:
+            f.write(content[:content.rindex("</TextRegion>")])
+
+        page = Dataset(self.path).get_page("malformed")
+
+        self.assertEqual([line.text for line in page.lines], ["malformed line 0", "malformed line 1", "malformed line 2"])
+
+    def test_save_matches_pretty_printed_tree(self):
+        lines = [Line('Příliš "žluťoučký" <kůň> & úpěl', BoundingBox(Point(1, 2), Point(30, 4), [Point(1, 4), Point(30, 2)]), Baseline(Point(1, 3), Point(30, 3)), 0.5),
+                 Line("", None, None, None),
+                 Line("second", BoundingBox(Point(5, 6), Point(70, 8)), Baseline(Point(5, 7), Point(70, 7)), 0.25),
+                 Line("", BoundingBox(Point(5, 6), Point(70, 8)), Baseline(Point(5, 7), Point(70, 7)), 1),
+                 Line("last", None, None, None)]
+
+        for page in [Page("special", lines), Page("empty", []), create_page("generated", 3)]:
+            page.save(self.path)
+
+            with open(os.path.join(self.path, page.id + ".xml"), "rb") as f:
+                self.assertEqual(f.read(), etree.tostring(page.get_xml_output(), pretty_print=True))
+
+        self.assertEqual([name for name in os.listdir(self.path) if name.endswith(".tmp")], [])
+
+    def test_parallel_save(self):
+        dataset = Dataset(self.path)
+        serial_path = os.path.join(self.path, "serial")
+        parallel_path = os.path.join(self.path, "parallel")
+        os.makedirs(serial_path)
+        os.makedirs(parallel_path)
+
+        dataset.save(serial_path)
+        dataset.save(parallel_path, workers=2)
+
+        self.assertEqual(sorted(os.listdir(serial_path)), sorted(page.id + ".xml" for page in dataset.pages.values()))
+
+        for name in os.listdir(serial_path):
+            with open(os.path.join(serial_path, name), "rb") as serial, open(os.path.join(parallel_path, name), "rb") as parallel:
+                self.assertEqual(serial.read(), parallel.read())
+
+    def test_count_lines_lazy(self):
+        self.assertEqual(Dataset(self.path, lazy=True, workers=2).count_lines(), 21)
+
+    def test_iter_pages(self):
+        for dataset in [Dataset(self.path), Dataset(self.path, lazy=True), Dataset(self.path, lazy=True, workers=2)]:
+            self.assertEqual([page.id for page in dataset.iter_pages()], ["page{index}".format(index=index) for index in range(6)])
+            self.assertEqual([page.id for page in dataset.iter_pages(prefix="page1")], ["page1"])
+            self.assertEqual([page.id for page in dataset.iter_pages(ids=["page2", "page4"])], ["page2", "page4"])
+            self.assertEqual(len(list(dataset.iter_lines())), 21)
+
+    def test_lazy_get_page(self):
+        dataset = Dataset(self.path, lazy=True)
+
+        self.assertEqual(len(dataset.get_page("page3").lines), 4)
+        self.assertIsNone(dataset.get_page("missing"))
+
+    def test_cache_round_trip(self):
+        dataset = Dataset(self.path)
+        cache_path = os.path.join(self.path, "dataset.cache")
+        dataset.save_cache(cache_path)
+
+        cached = Dataset.from_cache(cache_path)
+        self.assertEqual(list(dataset.pages.keys()), list(cached.pages.keys()))
+
+        for page_id, page in dataset.pages.items():
+            cached_page = cached.get_page(page_id)
+            self.assertEqual([line.text for line in page.lines], [line.text for line in cached_page.lines])
+            self.assertEqual([line.bounding_box.get_xml_output() for line in page.lines], [line.bounding_box.get_xml_output() for line in cached_page.lines])
+            self.assertEqual([line.baseline.get_xml_output() for line in page.lines], [line.baseline.get_xml_output() for line in cached_page.lines])
+
+    def test_cache_is_invalidated(self):
+        cache_path = os.path.join(self.path, "dataset.cache")
+        Dataset(self.path).save_cache(cache_path)
+
+        create_page("page0", 10).save(self.path)
+        stat = os.stat(os.path.join(self.path, "page0.xml"))
+        os.utime(os.path.join(self.path, "page0.xml"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+        self.assertEqual(len(Dataset.from_cache(cache_path, self.path).get_page("page0").lines), 10)
+
+    def test_geometry_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_dataset.main(["geometry", "-n", "200"]), 0)
+
+    def test_load_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_dataset.main(["load", "-n", "200"]), 0)
+
+
+class DatasetCropperTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.dataset_path = os.path.join(self.path, "dataset")
+        self.images_path = os.path.join(self.path, "images")
+        os.makedirs(self.dataset_path)
+        os.makedirs(self.images_path)
+
+        generator = np.random.RandomState(0)
+
+        for index in range(4):
+            create_page("page{index}".format(index=index), 5).save(self.dataset_path)
+            image = generator.randint(0, 256, (120, 240, 3)).astype(np.uint8)
+            cv2.imwrite(os.path.join(self.images_path, "page{index}.jpg".format(index=index)), image)
+
+        self.dataset = Dataset(self.dataset_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def crop(self, name, workers):
+        output = os.path.join(self.path, name)
+        os.makedirs(os.path.join(output, "lines." + dataset_cropper.CURRENT_DATE))
+        dataset_cropper.crop_dataset(self.dataset, self.images_path, output, 1.0, 0.5, 32, workers=workers)
+
+        files = {}
+        for root, _, filenames in os.walk(output):
+            for filename in filenames:
+                with open(os.path.join(root, filename), "rb") as f:
+                    files[os.path.relpath(os.path.join(root, filename), output)] = f.read()
+
+        return files
+
+    def test_output_does_not_depend_on_workers(self):
+        serial = self.crop("serial", 1)
+        parallel = self.crop("parallel", 2)
+
+        self.assertEqual(len(serial), 4 * 5 + 3)
+        self.assertEqual(serial, parallel)
+
+    def test_incremental_crop(self):
+        output = os.path.join(self.path, "output")
+        dataset_cropper.crop_dataset(self.dataset, self.images_path, output, 1.0, 0.5, 32)
+
+        create_page("page1", 3).save(self.dataset_path)
+        os.remove(os.path.join(self.images_path, "page3.jpg"))
+        self.dataset = Dataset(self.dataset_path)
+
+        lines_folder = os.path.join(output, "lines." + dataset_cropper.CURRENT_DATE)
+        unchanged = os.path.join(lines_folder, "page0_l0000.jpg")
+        os.utime(unchanged, (0, 0))
+
+        dataset_cropper.crop_dataset(self.dataset, self.images_path, output, 1.0, 0.5, 32, incremental=True)
+        incremental = self.crop("full", 1)
+
+        self.assertEqual(os.stat(unchanged).st_mtime, 0)
+        self.assertEqual(sorted(os.listdir(lines_folder)), sorted(name.split(os.sep)[-1] for name in incremental if name.startswith("lines.")))
+
+        for extension in (".trn", ".tst"):
+            with open(os.path.join(output, dataset_cropper.CURRENT_DATE + extension), "rb") as f:
+                self.assertEqual(f.read(), incremental[dataset_cropper.CURRENT_DATE + extension])
+
+
+def write_log(path, template, shift):
+    with open(path, "w") as f:
+        f.write("PHOTO /photos/{name}\n".format(name=os.path.basename(path)))
+        f.write("TEMPLATE /templates/{template}.jpg\n".format(template=template))
+        f.write("\n")
+        f.write("T  [[1.0 0.0 {shift}]\n".format(shift=shift))
+        f.write("[0.0 1.0 2.0]\n")
+        f.write("[0.0 0.0 1.0]]\n")
+
+
+class LogIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        for index in range(5):
+            write_log(os.path.join(self.path, "photo{index}.jpg.log".format(index=index)), "template{index}".format(index=index), index)
+
+        with open(os.path.join(self.path, "empty.jpg.log"), "w") as f:
+            f.write("")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_translation_and_transformation(self):
+        index = log_index.load_log_index(self.path)
+
+        self.assertEqual(index.translation, {"photo{index}".format(index=i): "template{index}".format(index=i) for i in range(5)})
+        np.testing.assert_array_equal(index.transformation("photo3.jpg.log"), [[1, 0, 3], [0, 1, 2], [0, 0, 1]])
+        self.assertIsNone(index.transformation("empty.jpg.log"))
+        self.assertIsNone(index.transformation("missing.jpg.log"))
+
+    def test_index_is_updated(self):
+        log_index.load_log_index(self.path, workers=2)
+        self.assertTrue(os.path.exists(os.path.join(self.path, log_index.INDEX_NAME)))
+
+        write_log(os.path.join(self.path, "photo1.jpg.log"), "changed", 10)
+        os.remove(os.path.join(self.path, "photo2.jpg.log"))
+        write_log(os.path.join(self.path, "photo9.jpg.log"), "template9", 9)
+
+        index = log_index.load_log_index(self.path)
+
+        self.assertEqual(index.translation["photo1"], "changed")
+        self.assertNotIn("photo2", index.translation)
+        self.assertEqual(index.translation["photo9"], "template9")
+        self.assertEqual(index.transformation("photo1.jpg.log")[0, 2], 10)
+        self.assertEqual(index.transformation("photo0.jpg.log")[0, 2], 0)
+
+        indexed = log_index.read_index(os.path.join(self.path, log_index.INDEX_NAME))
+        self.assertEqual(sorted(indexed), sorted(name for name in os.listdir(self.path) if name.endswith(".log")))
+
+        for name, (mtime, size, _, _) in indexed.items():
+            stat = os.stat(os.path.join(self.path, name))
+            self.assertEqual((mtime, size), (stat.st_mtime_ns, stat.st_size))
+
+    def test_touched_log_keeps_its_entry(self):
+        log_index.load_log_index(self.path)
+
+        path = os.path.join(self.path, "photo2.jpg.log")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        index = log_index.load_log_index(self.path)
+        self.assertEqual(index.translation, {"photo{index}".format(index=i): "template{index}".format(index=i) for i in range(5)})
+
+        indexed = log_index.read_index(os.path.join(self.path, log_index.INDEX_NAME))
+
+        for name, (mtime, size, template, transformation) in indexed.items():
+            stat = os.stat(os.path.join(self.path, name))
+            self.assertEqual((mtime, size), (stat.st_mtime_ns, stat.st_size))
+            np.testing.assert_array_equal(transformation, log_index.parse_log(os.path.join(self.path, name))[1])
+
+
+class UntransformTests(unittest.TestCase):
+    def test_page_transformation_matches_point_transformation(self):
+        generator = np.random.RandomState(0)
+        lines = []
+
+        for index in range(50):
+            x, y = (int(value) for value in generator.randint(0, 3000, 2))
+            bounding_box = BoundingBox(Point(x, y), Point(x + 400, y + 40), [Point(x, y + 40), Point(x + 400, y)] if index % 2 else [])
+            lines.append(Line("line", bounding_box, Baseline(Point(x, y + 30), Point(x + 400, y + 30)), None))
+
+        transformation = np.linalg.inv(np.array([[0.98, 0.05, 30.5], [-0.04, 1.01, 12.25], [1e-5, 2e-5, 1.0]]))
+        new_lines = untransform_xmls.transform_lines(lines, transformation)
+
+        for line, new_line in zip(lines, new_lines):
+            expected = [untransform_xmls.transform_point(point, transformation).get_tuple() for point in untransform_xmls.get_points([line])]
+            self.assertEqual([point.get_tuple() for point in untransform_xmls.get_points([new_line])], expected)
+
+    def test_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_untransform_xmls.main(["-n", "200"]), 0)
+
+
+def random_lines(count, seed):
+    generator = random.Random(seed)
+    lines = []
+
+    for index in range(count):
+        x, y = generator.randint(0, 2000), generator.randint(0, 3000)
+        width, height = generator.randint(50, 800), generator.randint(10, 60)
+
+        bounding_box = None
+        if index % 7 != 0:
+            inner_points = [Point(x, y + height), Point(x + width, y)] if index % 3 == 0 else []
+            bounding_box = BoundingBox(Point(x, y), Point(x + width, y + height), inner_points)
+
+        baseline = None
+        if index % 5 != 0:
+            inner_points = [Point(x + width // 2, y + height - generator.randint(0, 10))] if index % 4 == 0 else []
+            baseline = Baseline(Point(x, y + height - 5), Point(x + width, y + height - 5), inner_points)
+
+        lines.append(Line(str(index), bounding_box, baseline, None))
+
+    return lines
+
+
+def reference_point_segment_distance(x, y, segment):
+    x0, y0, x1, y1 = segment
+    length = (x1 - x0) ** 2 + (y1 - y0) ** 2
+    t = 0 if length == 0 else max(0, min(1, ((x - x0) * (x1 - x0) + (y - y0) * (y1 - y0)) / length))
+
+    return ((x0 + t * (x1 - x0) - x) ** 2 + (y0 + t * (y1 - y0) - y) ** 2) ** 0.5
+
+
+def reference_segment_distance(first, second):
+    def orientation(segment, x, y):
+        value = (segment[2] - segment[0]) * (y - segment[1]) - (segment[3] - segment[1]) * (x - segment[0])
+        return (value > 0) - (value < 0)
+
+    if orientation(first, *second[:2]) * orientation(first, *second[2:]) < 0 and orientation(second, *first[:2]) * orientation(second, *first[2:]) < 0:
+        return 0
+
+    return min(reference_point_segment_distance(first[0], first[1], second), reference_point_segment_distance(first[2], first[3], second),
+               reference_point_segment_distance(second[0], second[1], first), reference_point_segment_distance(second[2], second[3], first))
+
+
+class SpatialIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.lines = random_lines(300, 0)
+        self.page = Page("page", self.lines)
+        self.bounds = [spatial_index.get_bounds(line.bounding_box) for line in self.lines]
+        self.generator = random.Random(1)
+
+    def random_point(self):
+        return self.generator.randint(-100, 3000), self.generator.randint(-100, 3200)
+
+    def test_index_is_cached(self):
+        self.assertIs(self.page.get_spatial_index(), self.page.get_spatial_index())
+
+    def test_intersecting_and_containing(self):
+        index = self.page.get_spatial_index()
+
+        for _ in range(200):
+            x, y = self.random_point()
+            width, height = self.generator.randint(0, 300), self.generator.randint(0, 300)
+
+            expected = [i for i, b in enumerate(self.bounds) if b is not None and b[0] <= x + width and b[2] >= x and b[1] <= y + height and b[3] >= y]
+            self.assertEqual(index.intersecting(x, y, x + width, y + height), expected)
+
+            expected = [i for i, b in enumerate(self.bounds) if b is not None and b[0] <= x <= b[2] and b[1] <= y <= b[3]]
+            self.assertEqual(index.containing(x, y), expected)
+
+    def test_nearest(self):
+        index = self.page.get_spatial_index()
+
+        for count in [1, 3, 500]:
+            for _ in range(50):
+                x, y = self.random_point()
+                distances = [(((max(b[0] - x, x - b[2], 0)) ** 2 + (max(b[1] - y, y - b[3], 0)) ** 2) ** 0.5, i) for i, b in enumerate(self.bounds) if b is not None]
+                expected = [i for _, i in sorted(distances)[:count]]
+
+                self.assertEqual(index.nearest(x, y, count), expected)
+
+    def test_near_baseline(self):
+        index = self.page.get_spatial_index()
+
+        for line in self.lines[:60]:
+            if line.baseline is None:
+                continue
+
+            query = spatial_index.get_segments(line.baseline)
+            expected = [i for i, other in enumerate(self.lines)
+                        if any(reference_segment_distance(first, second) <= 25 for first in query for second in spatial_index.get_segments(other.baseline))]
+
+            self.assertEqual(index.near_baseline(line.baseline, 25), expected)
+
+        self.assertEqual(Page("empty", []).get_spatial_index().near_baseline([(0, 0), (10, 10)], 5), [])
+        self.assertEqual(Page("empty", []).get_spatial_index().nearest(0, 0), [])
+
+    def test_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_spatial_index.main(["-n", "1000", "-q", "20"]), 0)
+
+
+class MergeDatasetsTests(unittest.TestCase):
+    def create_lines(self, texts, geometry=True):
+        lines = []
+
+        for index, text in enumerate(texts):
+            bounding_box = BoundingBox(Point(10, 30 * index), Point(300, 30 * index + 20)) if geometry and text is not None else None
+            lines.append(Line(text if text is not None else "noise", bounding_box, None, None))
+
+        return lines
+
+    def test_pages_without_geometry_are_aligned_by_text(self):
+        generator = random.Random(0)
+
+        for _ in range(20):
+            texts1 = [generator.choice("abcdef") for _ in range(generator.randint(0, 15))]
+            texts2 = [generator.choice("abcdef") for _ in range(generator.randint(0, 15))]
+            page1 = Page("page", self.create_lines(texts1, geometry=False))
+            page2 = Page("page", self.create_lines(texts2, geometry=False))
+
+            expected = merge_datasets.get_same_lines(decoding.levenshtein_alignment(page1.lines, page2.lines)) if len(texts1) and len(texts2) else []
+            merged = merge_datasets.intersect_pages(page1, page2)
+
+            self.assertEqual([line.text for line in merged.lines] if merged is not None else [], [line.text for line in expected])
+
+    def test_lines_are_paired_by_geometry(self):
+        page1 = Page("page", self.create_lines(["a", "b", "c", "d", "e"]))
+        lines2 = self.create_lines(["a", "b", "x", "d", "e"])
+        # a line without coordinates shifts the text alignment, but not the geometry
+        page2 = Page("page", lines2[:1] + [Line("a", None, None, None)] + lines2[1:])
+
+        merged = merge_datasets.intersect_pages(page1, page2)
+
+        self.assertEqual([line.text for line in merged.lines], ["a", "b", "d", "e"])
+        self.assertIs(merged.lines[1].bounding_box, page1.lines[1].bounding_box)
+
+    def test_abbyy_and_tesseract_pages(self):
+        generator = random.Random(1)
+        words = ["slovo", "kůň", "úpěl", "ódy", "text", "řádek", "a"]
+        texts = [" ".join(generator.choice(words) for _ in range(generator.randint(1, 4))) for _ in range(60)]
+
+        # ABBYY misses some lines and tesseract reads some of them differently
+        abbyy_texts = [text for index, text in enumerate(texts) if index % 7 != 3]
+        tesseract_texts = [text + " x" if index % 5 == 1 else text for index, text in enumerate(texts)]
+
+        paragraphs = ["<p>{lines}</p>".format(lines="<br/>".join(abbyy_texts[start:start + 6])) for start in range(0, len(abbyy_texts), 6)]
+        abbyy_content = "<html><body>{paragraphs}</body></html>".format(paragraphs="\n".join(paragraphs))
+
+        hocr_lines = ["<span class='ocr_line' title='bbox 10 {y0} 900 {y1}; baseline 0 -5'><span class='ocrx_word' title='bbox 10 {y0} 900 {y1}'>{text}</span></span>".format(y0=40 * index, y1=40 * index + 30, text=text)
+                      for index, text in enumerate(tesseract_texts)]
+        hocr_content = "<html><body><div class='ocr_carea' title='bbox 0 0 1000 3000'><p class='ocr_par' title='bbox 0 0 1000 3000'>{lines}</p></div></body></html>".format(lines="".join(hocr_lines))
+
+        path = tempfile.mkdtemp()
+
+        try:
+            for folder, module, content in [("abbyy", abbyy, abbyy_content), ("tesseract", tesseract, hocr_content)]:
+                os.makedirs(os.path.join(path, folder))
+                with open(os.path.join(path, folder, "page.xml"), "wb") as f:
+                    f.write(etree.tostring(module.process(content), pretty_print=True))
+
+            abbyy_dataset = Dataset(os.path.join(path, "abbyy"))
+            tesseract_dataset = Dataset(os.path.join(path, "tesseract"))
+        finally:
+            shutil.rmtree(path)
+
+        abbyy_page = abbyy_dataset.pages["page"]
+        tesseract_page = tesseract_dataset.pages["page"]
+        self.assertEqual([line.text for line in abbyy_page.lines], abbyy_texts)
+        self.assertTrue(all(line.bounding_box is None for line in abbyy_page.lines))
+        self.assertEqual(merge_datasets.pair_lines_by_geometry(abbyy_page, tesseract_page), [])
+
+        # the whole page is aligned in the band, the full matrix of the alignment is never computed
+        with unittest.mock.patch.object(decoding, "_full_alignment", wraps=decoding._full_alignment) as full_alignment, \
+                unittest.mock.patch.object(decoding, "_banded_alignment", wraps=decoding._banded_alignment) as banded_alignment:
+            merged = merge_datasets.merge_datasets(abbyy_dataset, tesseract_dataset).pages["page"]
+
+        self.assertGreater(banded_alignment.call_count, 0)
+        self.assertTrue(all(call[0][2] < len(tesseract_page.lines) for call in banded_alignment.call_args_list))
+        full_alignment.assert_not_called()
+
+        expected = merge_datasets.get_same_lines(decoding.levenshtein_alignment(abbyy_page.lines, tesseract_page.lines))
+
+        self.assertEqual([line.text for line in merged.lines], [line.text for line in expected])
+        self.assertEqual([line.bounding_box.get_xml_output() for line in merged.lines], [line.bounding_box.get_xml_output() for line in expected])
+
+    def test_alignment_band_is_widened(self):
+        generator = random.Random(2)
+
+        # the same lines shifted by more positions than the initial band and pages which differ in many lines
+        texts = [str(index) for index in range(60)]
+        pairs = [(["x"] * 20 + texts, texts + ["y"] * 20)]
+        pairs += [([generator.choice("abcdefgh") for _ in range(generator.randint(0, 150))], [generator.choice("abcdefgh") for _ in range(generator.randint(0, 150))]) for _ in range(10)]
+
+        for texts1, texts2 in pairs:
+            lines1 = self.create_lines(texts1, geometry=False)
+            lines2 = self.create_lines(texts2, geometry=False)
+
+            expected = merge_datasets.get_same_lines(decoding.levenshtein_alignment(lines1, lines2)) if len(texts1) and len(texts2) else []
+            self.assertEqual([line.text for line in merge_datasets.align_lines(lines1, lines2)], [line.text for line in expected])
+
+    def test_monotone_pairs(self):
+        self.assertEqual(merge_datasets.get_monotone_pairs([(0, 3), (1, 0), (2, 1), (3, 4), (4, 2), (5, 5)]), [(1, 0), (2, 1), (4, 2), (5, 5)])
+        self.assertEqual(merge_datasets.get_monotone_pairs([]), [])
+
+    def test_parallel_merge(self):
+        dataset1 = Dataset()
+        dataset2 = Dataset()
+
+        for index in range(10):
+            dataset1.add_page(Page("page{index}".format(index=index), self.create_lines(["a", "b", str(index), "c"])))
+            dataset2.add_page(Page("page{index}".format(index=index), self.create_lines(["a", "x", str(index), "c"])))
+
+        serial = merge_datasets.merge_datasets(dataset1, dataset2)
+        parallel = merge_datasets.merge_datasets(dataset1, dataset2, workers=2)
+
+        self.assertEqual(list(serial.pages.keys()), list(parallel.pages.keys()))
+        self.assertEqual([[line.text for line in page.lines] for page in serial.pages.values()], [[line.text for line in page.lines] for page in parallel.pages.values()])
+        self.assertEqual([line.text for line in serial.pages["page3"].lines], ["a", "3", "c"])
+
+
+def reference_levenshtein_distance(source, target, sub_cost=1, ins_cost=1, del_cost=1):
+    dist = [[0] * (len(target) + 1) for _ in range(len(source) + 1)]
+
+    for i in range(len(source) + 1):
+        for j in range(len(target) + 1):
+            if i == 0 or j == 0:
+                dist[i][j] = i * del_cost + j * ins_cost
+            else:
+                dist[i][j] = min(dist[i - 1][j] + del_cost, dist[i][j - 1] + ins_cost, dist[i - 1][j - 1] + (source[i - 1] != target[j - 1]) * sub_cost)
+
+    return dist[-1][-1]
+
+
+def random_sequences(count, alphabet, max_length):
+    generator = random.Random(42)
+    return [([generator.choice(alphabet) for _ in range(generator.randint(0, max_length))],
+             [generator.choice(alphabet) for _ in range(generator.randint(0, max_length))]) for _ in range(count)]
+
+
+class LevenshteinDistanceTests(unittest.TestCase):
+    def test_characters(self):
+        for source, target in random_sequences(300, "abcd ", 80):
+            self.assertEqual(decoding.levenshtein_distance(source, target), reference_levenshtein_distance(source, target))
+
+    def test_long_sequences(self):
+        for source, target in random_sequences(3, "abcdefgh", 400):
+            self.assertEqual(decoding.levenshtein_distance(source, target), reference_levenshtein_distance(source, target))
+
+    def test_words(self):
+        for source, target in random_sequences(100, ["one", "two", "three"], 20):
+            self.assertEqual(decoding.levenshtein_distance(source, target), reference_levenshtein_distance(source, target))
+
+    def test_costs(self):
+        for source, target in random_sequences(100, "abc", 30):
+            self.assertEqual(decoding.levenshtein_distance(source, target, sub_cost=3, ins_cost=2, del_cost=1), reference_levenshtein_distance(source, target, sub_cost=3, ins_cost=2, del_cost=1))
+
+    def test_unhashable_symbols(self):
+        source = [Line(text, None, None, None) for text in ["a", "b", "c"]]
+        target = [Line(text, None, None, None) for text in ["a", "c"]]
+        self.assertEqual(decoding.levenshtein_distance(source, target), 1)
+
+    def test_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_decoding.main(["levenshtein", "-n", "20", "-p", "200"]), 0)
+
+
+def reference_levenshtein_alignment(source, target, sub_cost=1, ins_cost=1, del_cost=1):
+    # deletion is preferred to substitution and both are preferred to insertion on ties, as in the original implementation
+    dist = [[j * ins_cost for j in range(len(target) + 1)]]
+    moves = [[-1] * (len(target) + 1)]
+
+    for i in range(1, len(source) + 1):
+        dist.append([dist[i - 1][0] + del_cost])
+        moves.append([1])
+
+        for j in range(1, len(target) + 1):
+            cost, move = dist[i - 1][j] + del_cost, 1
+
+            if dist[i - 1][j - 1] + (source[i - 1] != target[j - 1]) * sub_cost < cost:
+                cost, move = dist[i - 1][j - 1] + (source[i - 1] != target[j - 1]) * sub_cost, 0
+
+            if dist[i][j - 1] + ins_cost < cost:
+                cost, move = dist[i][j - 1] + ins_cost, -1
+
+            dist[i].append(cost)
+            moves[i].append(move)
+
+    i, j = len(source), len(target)
+    alignment = []
+
+    while i > 0 or j > 0:
+        move = moves[i][j]
+        alignment.append((source[i - 1] if move >= 0 else None, target[j - 1] if move <= 0 else None))
+        i, j = i - (move >= 0), j - (move <= 0)
+
+    return alignment[::-1]
+
+
+def get_alignment_cost(alignment, sub_cost=1, ins_cost=1, del_cost=1):
+    return sum(ins_cost if source is None else del_cost if target is None else (source != target) * sub_cost for source, target in alignment)
+
+
+class LevenshteinAlignmentTests(unittest.TestCase):
+    def check_alignment(self, alignment, source, target, distance, **costs):
+        self.assertEqual([pair[0] for pair in alignment if pair[0] is not None], source)
+        self.assertEqual([pair[1] for pair in alignment if pair[1] is not None], target)
+        self.assertEqual(get_alignment_cost(alignment, **costs), distance)
+
+    def test_default_alignment(self):
+        for source, target in random_sequences(300, "abcd ", 40):
+            self.assertEqual(decoding.levenshtein_alignment(source, target), reference_levenshtein_alignment(source, target))
+
+    def test_costs(self):
+        for costs in [{"sub_cost": 3, "ins_cost": 2, "del_cost": 1}, {"sub_cost": 0.5, "ins_cost": 1.5, "del_cost": 1.0}]:
+            for source, target in random_sequences(100, "abc", 30):
+                self.assertEqual(decoding.levenshtein_alignment(source, target, **costs), reference_levenshtein_alignment(source, target, **costs))
+
+    def test_band(self):
+        for source, target in random_sequences(300, "abcd ", 40):
+            distance = decoding.levenshtein_distance(source, target)
+
+            for band in [0, 2, 8]:
+                alignment = decoding.levenshtein_alignment(source, target, band=band)
+
+                if distance <= max(band, abs(len(source) - len(target))):
+                    self.check_alignment(alignment, source, target, distance)
+                else:
+                    self.check_alignment(alignment, source, target, get_alignment_cost(alignment))
+
+            self.assertEqual(decoding.levenshtein_alignment(source, target, band=80), reference_levenshtein_alignment(source, target))
+
+    def test_hirschberg(self):
+        block_size = decoding.HIRSCHBERG_BLOCK_SIZE
+        decoding.HIRSCHBERG_BLOCK_SIZE = 16
+
+        try:
+            for costs in [{}, {"sub_cost": 3, "ins_cost": 2, "del_cost": 1}]:
+                for source, target in random_sequences(200, "abcd ", 40):
+                    alignment = decoding.levenshtein_alignment(source, target, hirschberg=True, **costs)
+                    self.check_alignment(alignment, source, target, decoding.levenshtein_distance(source, target, **costs), **costs)
+        finally:
+            decoding.HIRSCHBERG_BLOCK_SIZE = block_size
+
+    def test_unhashable_symbols(self):
+        source = [Line(text, None, None, None) for text in ["a", "b", "c"]]
+        target = [Line(text, None, None, None) for text in ["a", "c"]]
+
+        for options in [{}, {"band": 1}, {"hirschberg": True}]:
+            alignment = decoding.levenshtein_alignment(source, target, **options)
+            self.assertEqual([(first.text if first is not None else None, second.text if second is not None else None) for first, second in alignment],
+                             [("a", "a"), ("b", None), ("c", "c")])
+
+
+def random_hmm(generator, states, frames):
+    lls = generator.normal(size=(frames, states))
+    # some transitions are impossible as in left-to-right models
+    tr = generator.random((states, states)) * (generator.random((states, states)) > 0.4)
+    tr[tr.sum(axis=1) == 0, 0] = 1.0
+    tr /= tr.sum(axis=1, keepdims=True)
+    ip = generator.random(states)
+    ip /= ip.sum()
+    fs = sorted(set(generator.integers(0, states, size=2).tolist()))
+
+    return lls, tr, ip, fs
+
+
+def random_possible_hmm(generator):
+    """Random small HMM with at least one possible state sequence, the best sequence is then unique."""
+    while True:
+        lls, tr, ip, fs = random_hmm(generator, int(generator.integers(1, 4)), int(generator.integers(1, 6)))
+        scores = brute_force_paths(lls, tr, ip, fs)
+
+        if max(scores.values()) > -np.inf:
+            return lls, tr, ip, fs, scores
+
+
+def brute_force_paths(lls, tr, ip, fs):
+    """Log probabilities of all state sequences which end in a final state."""
+    with np.errstate(divide="ignore"):
+        ltr, lip = np.log(tr), np.log(ip)
+
+    scores = {}
+
+    for path in itertools.product(range(lls.shape[1]), repeat=len(lls)):
+        if path[-1] in fs:
+            scores[path] = lip[path[0]] + lls[0, path[0]] + sum(ltr[first, second] + lls[ii, second] for ii, (first, second) in enumerate(zip(path[:-1], path[1:]), start=1))
+
+    return scores
+
+
+class HMMDecodingTests(unittest.TestCase):
+    def test_viterbi(self):
+        generator = np.random.default_rng(0)
+
+        for _ in range(100):
+            lls, tr, ip, fs, scores = random_possible_hmm(generator)
+            best = max(scores, key=scores.get)
+
+            self.assertEqual(decoding.viterbi(lls, tr, ip, fs), list(best))
+
+    def test_forward_backward(self):
+        generator = np.random.default_rng(1)
+
+        for _ in range(50):
+            lls, tr, ip, fs, scores = random_possible_hmm(generator)
+            total = decoding.logsumexp(np.array(list(scores.values())))
+
+            posteriors = np.zeros(lls.shape)
+
+            for path, score in scores.items():
+                posteriors[np.arange(len(path)), path] += np.exp(score - total)
+
+            tll, sp, _, _ = decoding.forward_backward(lls, tr, ip, fs)
+            self.assertAlmostEqual(tll, total)
+            self.assertAlmostEqual(decoding.forward_backward(lls, tr, ip, fs, evaluate_only=True), total)
+            np.testing.assert_allclose(sp, posteriors, atol=1e-9)
+
+    def test_viterbi_batch(self):
+        generator = np.random.default_rng(2)
+        lls, tr, ip, fs = random_hmm(generator, 5, 40)
+        batch = generator.normal(size=(8, 40, 5))
+        lengths = [40, 1, 17, 3, 40, 25, 2, 39]
+
+        expected = [decoding.viterbi(utterance[:length], tr, ip, fs) for utterance, length in zip(batch, lengths)]
+        self.assertEqual(decoding.viterbi_batch(batch, lengths, tr, ip, fs), expected)
+
+    def test_streaming_viterbi(self):
+        generator = np.random.default_rng(3)
+
+        for states, frames in [(1, 10), (3, 200), (8, 1000)]:
+            lls, tr, ip, fs = random_hmm(generator, states, frames)
+            decoder = decoding.StreamingViterbi(tr, ip, fs)
+            path = []
+
+            for chunk in np.array_split(lls, 7):
+                path += decoder.push(chunk)
+
+            self.assertEqual(path + decoder.finish(), decoding.viterbi(lls, tr, ip, fs))
+            self.assertEqual(decoder.finish(), [])
+
+    def test_monophone_loop(self):
+        # two states per phoneme, the columns are ordered as phoneme1-state1, phoneme1-state2, phoneme2-state1, ...
+        lls = np.full((11, 6), -10.0)
+
+        for frame, (phoneme, state) in enumerate([(0, 0), (0, 1), (1, 0), (1, 1), (1, 1), (2, 0), (2, 1), (1, 0), (1, 1), (0, 0), (0, 1)]):
+            lls[frame, 2 * phoneme + state] = 0.0
+
+        self.assertEqual(decoding.nstate_monophn_rec(lls, ["sil", "a", "b"], 0.0), ["sil", "a", "b", "a", "sil"])
+
+
+class ConfusionMatrixTests(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(0)
+        self.alignments = []
+
+        for _ in range(100):
+            hypothesis = [generator.choice("abcde") for _ in range(generator.randint(0, 30))]
+            reference = [generator.choice("abcde") for _ in range(generator.randint(0, 30))]
+            self.alignments.append(decoding.levenshtein_alignment(hypothesis, reference))
+
+        # (reference, hypothesis) -> count
+        self.reference = Counter((reference, hypothesis) for alignment in self.alignments for hypothesis, reference in alignment)
+
+    def test_pairs(self):
+        confusions = decoding.ConfusionMatrix(self.alignments)
+        references, hypotheses, counts = confusions.pairs()
+
+        self.assertEqual({(confusions.symbols[reference], confusions.symbols[hypothesis]): count for reference, hypothesis, count in zip(references, hypotheses, counts)},
+                         dict(self.reference))
+
+    def test_top_confusions(self):
+        top = decoding.ConfusionMatrix(self.alignments).top_confusions(5)
+        substitutions = sorted((count for (reference, hypothesis), count in self.reference.items() if None not in (reference, hypothesis) and reference != hypothesis), reverse=True)
+
+        self.assertEqual([count for _, _, count in top], substitutions[:5])
+
+        for reference, hypothesis, count in top:
+            self.assertEqual(self.reference[(reference, hypothesis)], count)
+
+    def test_rates(self):
+        confusions = decoding.ConfusionMatrix(self.alignments)
+        deletion_rates = confusions.deletion_rates()
+        insertion_rates = confusions.insertion_rates()
+
+        for symbol in "abcde":
+            in_reference = sum(count for (reference, _), count in self.reference.items() if reference == symbol)
+            in_hypothesis = sum(count for (_, hypothesis), count in self.reference.items() if hypothesis == symbol)
+
+            self.assertAlmostEqual(deletion_rates[symbol], self.reference[(symbol, None)] / in_reference)
+            self.assertAlmostEqual(insertion_rates[symbol], self.reference[(None, symbol)] / in_hypothesis)
+
+    def test_matrix(self):
+        symbols = ["c", "a", "x"]
+        matrix = decoding.ConfusionMatrix(self.alignments).matrix(symbols)
+
+        self.assertEqual(matrix.tolist(), [[self.reference[(reference, hypothesis)] for hypothesis in symbols + [None]] for reference in symbols + [None]][:-1] +
+                         [[self.reference[(None, hypothesis)] for hypothesis in symbols] + [0]])
+
+    def test_many_symbols(self):
+        confusions = decoding.ConfusionMatrix()
+        confusions.buffer_size = 1000
+        alignment = [(chr(0x4e00 + index), chr(0x4e00 + (index * 7) % 5000)) for index in range(5000)]
+
+        for _ in range(3):
+            confusions.add(alignment)
+
+        references, _, counts = confusions.pairs()
+        self.assertEqual(len(references), 5000)
+        self.assertEqual(counts.tolist(), [3] * 5000)
+        self.assertEqual(len(confusions.top_confusions(10)), 10)
+        self.assertEqual(confusions.matrix([chr(0x4e00), chr(0x4e00 + 1)]).sum(), 3)
+
+    def test_print_confusion_matrix(self):
+        output = io.StringIO()
+
+        with contextlib.redirect_stdout(output):
+            decoding.print_confusion_matrix(decoding.levenshtein_alignment(list("ab"), list("abc")), "abc")
+
+        self.assertEqual(output.getvalue().splitlines(), ["        a    b    c  Del",
+                                                          "   a    1    0    0    0",
+                                                          "   b    0    1    0    0",
+                                                          "   c    0    0    0    1",
+                                                          " Ins    0    0    0"])
+
+
+def reference_search_in_dataset(dataset, filename, transcription):
+    base_filename = filename.rsplit("_", maxsplit=1)[0]
+    distances = [(reference_levenshtein_distance(dataset[f], transcription), f) for f in dataset if f.startswith(base_filename)]
+
+    # the first file with the minimal distance
+    return min(distances, key=lambda distance: distance[0])[1] if distances else None
+
+
+class UpdateTranscriptionsTests(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(0)
+        self.dataset = {}
+
+        for page in generator.sample(range(100), 40):
+            for line in generator.sample(range(30), generator.randint(1, 12)):
+                self.dataset["page{page}_{line}".format(page=page, line=line)] = "".join(generator.choice("ab ") for _ in range(generator.randint(0, 8)))
+
+        # short transcriptions over a small alphabet have many ties
+        self.tests = {"page{page}_{line}".format(page=generator.randrange(100), line=generator.randrange(30)): "".join(generator.choice("abc ") for _ in range(generator.randint(0, 8)))
+                      for _ in range(300)}
+
+    def test_prefix(self):
+        index = update_transcriptions.TranscriptionIndex(self.dataset)
+
+        for prefix in ["page1", "page12_", "page7", "page9", "page99_", "x", ""]:
+            self.assertEqual(index.with_prefix(prefix), sorted(f for f in self.dataset if f.startswith(prefix)))
+
+    def test_search(self):
+        index = update_transcriptions.TranscriptionIndex(self.dataset)
+
+        for filename, transcription in self.tests.items():
+            self.assertEqual(update_transcriptions.search_in_dataset(self.dataset, filename, transcription, index),
+                             reference_search_in_dataset(self.dataset, filename, transcription))
+
+    def test_update(self):
+        updated = update_transcriptions.update(self.dataset, self.tests)
+        expected = ["{filename} {transcription}\n".format(filename=reference_search_in_dataset(self.dataset, filename, transcription), transcription=transcription)
+                    for filename, transcription in self.tests.items() if reference_search_in_dataset(self.dataset, filename, transcription) is not None]
+
+        self.assertEqual(updated, expected)
+
+    def test_non_ascii(self):
+        dataset = {"page_1": "žluťoučký kůň", "page_2": "zlutoucky kun", "other_1": "žluťoučký kůň"}
+
+        self.assertEqual(update_transcriptions.search_in_dataset(dataset, "page_5", "žluťoučky kůň"), "page_1")
+        self.assertEqual(update_transcriptions.search_in_dataset(dataset, "page_5", "zlutoucky kůn"), "page_2")
+        self.assertIsNone(update_transcriptions.search_in_dataset(dataset, "missing_1", "kůň"))
+
+
+def create_photograph(generator, width, height):
+    # smooth random colors which survive the downscaling of the rotation search
+    return cv2.resize(generator.integers(0, 255, (height // 50, width // 50, 3), dtype=np.uint8), (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+class CopyPhotographsTests(unittest.TestCase):
+    transformation = np.array([[0.8, 0.05, -20], [-0.03, 0.82, 15], [1e-5, -2e-5, 1.0]])
+
+    def create_pair(self, generator, rotation):
+        photograph = create_photograph(generator, 640, 480)
+        rectified = cv2.warpPerspective(photograph, self.transformation, (500, 380))
+
+        # the stored photograph is rotated back by the search
+        inverse = {None: None, cv2.ROTATE_90_CLOCKWISE: cv2.ROTATE_90_COUNTERCLOCKWISE, cv2.ROTATE_180: cv2.ROTATE_180, cv2.ROTATE_90_COUNTERCLOCKWISE: cv2.ROTATE_90_CLOCKWISE}
+        return copy_photographs.rotate(photograph, inverse[rotation]), rectified, photograph
+
+    def test_find_rotation(self):
+        generator = np.random.default_rng(0)
+
+        for rotation in copy_photographs.ROTATIONS:
+            stored, rectified, photograph = self.create_pair(generator, rotation)
+            self.assertTrue(np.array_equal(copy_photographs.find_rotation(stored, rectified, self.transformation), photograph))
+
+    def test_parallel_process_directory(self):
+        generator = np.random.default_rng(1)
+        path = tempfile.mkdtemp()
+
+        try:
+            for folder in ["xml", "rectified", "original", "serial", "parallel"]:
+                os.makedirs(os.path.join(path, folder))
+
+            names = []
+
+            for index, rotation in enumerate(copy_photographs.ROTATIONS):
+                stored, rectified, _ = self.create_pair(generator, rotation)
+                open(os.path.join(path, "xml", "photo{index}.xml".format(index=index)), "w").close()
+                cv2.imwrite(os.path.join(path, "rectified", "photo{index}.jpg".format(index=index)), rectified)
+                cv2.imwrite(os.path.join(path, "original", "stored{index}.png".format(index=index)), stored)
+                names.append("photo{index}.jpg.log".format(index=index))
+
+            # the last photograph has no transformation
+            transformations = np.array([self.transformation] * 3 + [np.full((3, 3), np.nan)])
+            index = log_index.LogIndex(names, ["template"] * len(names), transformations)
+            translation = {"photo{index}".format(index=index): "stored{index}.png".format(index=index) for index in range(len(names))}
+
+            for folder, workers in [("serial", 1), ("parallel", 2)]:
+                copy_photographs.process_directory(os.path.join(path, "xml"), os.path.join(path, folder), os.path.join(path, "rectified"),
+                                                   os.path.join(path, "original"), index, translation, workers)
+
+            self.assertEqual(sorted(os.listdir(os.path.join(path, "serial"))), ["photo0.jpg", "photo1.jpg", "photo2.jpg"])
+
+            for name in os.listdir(os.path.join(path, "serial")):
+                with open(os.path.join(path, "serial", name), "rb") as serial, open(os.path.join(path, "parallel", name), "rb") as parallel:
+                    self.assertEqual(serial.read(), parallel.read())
+        finally:
+            shutil.rmtree(path)
+
+
+HOCR_PAGE = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+ <head><title></title></head>
+ <body>
+  <div class='ocr_page' id='page_1' title='image "page.png"; bbox 0 0 1000 800; ppageno 0'>
+   <div class='ocr_carea' id='block_1_1' title="bbox 10 10 500 100">
+    <p class='ocr_par' id='par_1_1' lang='ces' title="bbox 10 10 500 100">
+     <span class='ocr_line' id='line_1_1' title="bbox 10 10 500 40; baseline 0.01 -5; x_size 30; x_descenders 6; x_ascenders 7">
+      <span class='ocrx_word' id='word_1_1' title='bbox 10 10 100 40; x_wconf 90'>Žluťoučký</span>
+      <span class='ocrx_word' id='word_1_2' title='bbox 110 10 200 40; x_wconf 91'><strong>kůň</strong></span>
+     </span>
+     <span class='ocr_line' id='line_1_2' title="bbox 10 50 500 80">
+      <span class='ocrx_word' id='word_1_3' title='bbox 10 50 100 80; x_wconf 80'>{word}</span>
+     </span>
+     <span class='ocr_line' id='line_1_3' title="bbox 10 85 500 100">
+      <span class='ocrx_word' id='word_1_4' title='bbox 10 85 100 100; x_wconf 10'> </span>
+     </span>
+    </p>
+   </div>
+   <div class='ocr_carea' id='block_1_2' title="bbox 10 200 500 300">
+    <p class='ocr_par' id='par_1_2' lang='ces' title="bbox 10 200 500 300">
+     <span class='ocr_line' id='line_1_4' title="bbox 10 200 500 240; baseline -0.02 -3">
+      <span class='ocrx_word' id='word_1_5' title='bbox 10 200 100 240; x_wconf 95'>druhý</span>
+      <span class='ocrx_word' id='word_1_6' title='bbox 110 200 200 240; x_wconf 95'>sloupec &amp; text</span>
+     </span>
+    </p>
+   </div>
+   <div class='ocr_carea' id='block_1_3' title="bbox 600 600 700 700"></div>
+  </div>
+ </body>
+</html>
+"""
+
+
+def reference_process_hocr(content):
+    root = etree.fromstring(content.encode("utf-8"))
+    output_root = etree.Element("PcGts")
+    page = etree.SubElement(output_root, "Page")
+
+    for area in root.iter():
+        if area.get("class") != "ocr_carea":
+            continue
+
+        text_region = etree.Element("TextRegion")
+
+        for paragraph in area.iter():
+            if paragraph.get("class") != "ocr_par":
+                continue
+
+            for line in paragraph.iter():
+                if line.get("class") != "ocr_line":
+                    continue
+
+                text = ""
+                for word in line.iter():
+                    if word.get("class") == "ocrx_word":
+                        for text_element in word.xpath("descendant-or-self::*/text()"):
+                            text += text_element + " "
+
+                if len(text.strip()) > 0:
+                    text_region.append(tesseract.create_text_line(line, text.strip()))
+
+        if len(text_region) > 0:
+            page.append(text_region)
+
+    return output_root
+
+
+def generate_irregular_hocr(seed):
+    random.seed(seed)
+
+    def bbox():
+        x, y = random.randint(0, 1000), random.randint(0, 1000)
+        return "bbox {x0} {y0} {x1} {y1}".format(x0=x, y0=y, x1=x + random.randint(1, 300), y1=y + random.randint(1, 50))
+
+    def words():
+        parts = []
+        for _ in range(random.randint(0, 4)):
+            text = random.choice(["slovo", "a&amp;b", " ", "", "x<!-- comment -->y", "<strong>tučně</strong> konec", "  mezery  "])
+            parts.append('<span class="ocrx_word" title="{bbox}; x_wconf 90">{text}</span>{tail}'.format(bbox=bbox(), text=text, tail=random.choice(["", " ", "\n  "])))
+        return "".join(parts)
+
+    def lines():
+        parts = []
+        for _ in range(random.randint(0, 3)):
+            title = bbox() + random.choice(["", "; baseline 0.015 -4", "; baseline -0.1 0; x_size 20"])
+            line = '<span class="ocr_line" title="{title}">{words}</span>'.format(title=title, words=words())
+            parts.append(random.choice([line, line, '<span class="ocr_textfloat">' + line + '</span>']))
+        return "".join(parts)
+
+    areas = []
+    for _ in range(random.randint(0, 4)):
+        content = []
+        for _ in range(random.randint(0, 3)):
+            content.append(random.choice([
+                '<p class="ocr_par" title="{bbox}">{lines}</p>'.format(bbox=bbox(), lines=lines()),
+                '<p class="ocr_par" title="{bbox}"><span>{lines}</span>{words}</p>'.format(bbox=bbox(), lines=lines(), words=words()),
+                lines(),
+                words(),
+            ]))
+        areas.append('<div class="ocr_carea" title="{bbox}">{content}</div>'.format(bbox=bbox(), content="".join(content)))
+
+    outside = '<p class="ocr_par">{lines}</p>'.format(lines=lines())
+
+    return '<html xmlns="http://www.w3.org/1999/xhtml"><body><div class="ocr_page">{areas}</div>{outside}</body></html>'.format(areas="\n".join(areas), outside=outside)
+
+
+class TesseractTests(unittest.TestCase):
+    def test_process(self):
+        output = tesseract.process(HOCR_PAGE.format(word="slovo"))
+
+        regions = output.findall("Page/TextRegion")
+        self.assertEqual([[line.findtext("TextEquiv/Unicode") for line in region.findall("TextLine")] for region in regions],
+                         [["Žluťoučký kůň", "slovo"], ["druhý sloupec & text"]])
+
+        first_line = regions[0].find("TextLine")
+        self.assertEqual(first_line.find("Coords").get("points"), BoundingBox(start_x=10, start_y=10, end_x=500, end_y=40).get_xml_output())
+        self.assertEqual(first_line.find("Baseline").get("points"), Baseline(start_x=10, start_y=35, end_x=500, end_y=39).get_xml_output())
+        self.assertIsNone(regions[0].findall("TextLine")[1].find("Baseline"))
+
+    def test_bytes_and_str(self):
+        content = HOCR_PAGE.format(word="slovo")
+        self.assertEqual(etree.tostring(tesseract.process(content.encode("utf-8"))), etree.tostring(tesseract.process(content)))
+
+    def test_matches_nested_traversal(self):
+        for seed in range(300):
+            content = generate_irregular_hocr(seed)
+            self.assertEqual(etree.tostring(tesseract.process(content)), etree.tostring(reference_process_hocr(content)), content)
+
+    def test_invalid(self):
+        with self.assertRaises(etree.XMLSyntaxError):
+            tesseract.process("<html><body><div class='ocr_carea'>")
+
+
+ABBYY_PAGE = """<!DOCTYPE html PUBLIC "-//W3C//DTD HTML 4.01//EN">
+<html><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8"><title>page</title></head>
+<body><p align="justify">Žluťoučký kůň&nbsp;&amp; spol.<br>úpěl <b>ďábelské</b> ódy</p>
+<p></p><p>  <br>  </p>
+<table><tr><td><p>v tabulce</p></td><td><p>druhá<!-- komentář --> buňka</p></td></tr></table>
+<div>bez odstavce</div>
+</body></html>
+"""
+
+
+class AbbyyTests(unittest.TestCase):
+    def get_lines(self, output):
+        return [[line.findtext("TextEquiv/Unicode") for line in region.findall("TextLine")] for region in output.findall("Page/TextRegion")]
+
+    def test_process(self):
+        output = abbyy.process(ABBYY_PAGE.encode("utf-8"))
+
+        self.assertEqual(self.get_lines(output), [["Žluťoučký kůň\xa0& spol.", "úpěl ", "ďábelské", " ódy"], [], [], ["v tabulce"], ["druhá", " buňka"]])
+        self.assertEqual(output.find("Page/TextRegion/TextLine/Coords").get("points"), "None")
+
+    def test_content_before_html(self):
+        content = "\ufeffexport header <p>ignored</p>\n" + ABBYY_PAGE
+        self.assertEqual(self.get_lines(abbyy.process(content)), self.get_lines(abbyy.process(ABBYY_PAGE)))
+
+    def test_without_html(self):
+        self.assertIsNone(abbyy.process(b"<body><p>text</p></body>"))
+
+
+class BatchConversionTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.input_folder = os.path.join(self.path, "hocr")
+        self.output_folder = os.path.join(self.path, "xml")
+        os.makedirs(self.input_folder)
+
+        for index in range(5):
+            with open(os.path.join(self.input_folder, "page{index}.hocr".format(index=index)), "w") as f:
+                f.write(HOCR_PAGE.format(word="slovo{index}".format(index=index)))
+
+        with open(os.path.join(self.input_folder, "broken.hocr"), "w") as f:
+            f.write("<html><body><div class='ocr_carea'>")
+
+        with open(os.path.join(self.input_folder, "ignored.txt"), "w") as f:
+            f.write("not hOCR")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def convert(self, workers=1, skip_up_to_date=True):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return batch_conversion.convert_directory(tesseract.convert_file, self.input_folder, self.output_folder, ".hocr", workers, skip_up_to_date)
+
+    def test_convert_directory(self):
+        failures = self.convert(workers=2)
+
+        self.assertEqual([os.path.basename(path) for path, _ in failures], ["broken.hocr"])
+        self.assertEqual(sorted(os.listdir(self.output_folder)), ["page{index}.xml".format(index=index) for index in range(5)])
+
+        for index in range(5):
+            output_path = os.path.join(self.output_folder, "page{index}.xml".format(index=index))
+            expected_path = os.path.join(self.path, "expected.xml")
+            tesseract.convert_file(os.path.join(self.input_folder, "page{index}.hocr".format(index=index)), expected_path)
+
+            with open(output_path, "rb") as output, open(expected_path, "rb") as expected:
+                self.assertEqual(output.read(), expected.read())
+
+    def test_up_to_date_files_are_skipped(self):
+        self.convert()
+        os.remove(os.path.join(self.output_folder, "page0.xml"))
+
+        # the input of page1 is newer than its output and the input of page2 is as old as its output
+        for index, offset in [(1, 10 ** 9), (2, 0), (3, -10 ** 9), (4, -10 ** 9)]:
+            modified = os.stat(os.path.join(self.output_folder, "page{index}.xml".format(index=index))).st_mtime_ns
+            os.utime(os.path.join(self.input_folder, "page{index}.hocr".format(index=index)), ns=(modified + offset, modified + offset))
+
+        tasks, skipped = batch_conversion.get_tasks(tesseract.convert_file, self.input_folder, self.output_folder, ".hocr")
+        self.assertEqual(sorted(os.path.basename(task[1]) for task in tasks), ["broken.hocr", "page0.hocr", "page1.hocr", "page2.hocr"])
+        self.assertEqual(skipped, 2)
+
+        tasks, skipped = batch_conversion.get_tasks(tesseract.convert_file, self.input_folder, self.output_folder, ".hocr", skip_up_to_date=False)
+        self.assertEqual((len(tasks), skipped), (6, 0))
+
+    def test_abbyy_without_html_has_no_output(self):
+        input_folder = os.path.join(self.path, "abbyy")
+        os.makedirs(input_folder)
+
+        with open(os.path.join(input_folder, "page.htm"), "w") as f:
+            f.write("<html><body><p>first line<br/>second line</p></body></html>")
+
+        with open(os.path.join(input_folder, "empty.htm"), "w") as f:
+            f.write("no markup")
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            failures = batch_conversion.convert_directory(abbyy.convert_file, input_folder, self.output_folder, ".htm")
+
+        self.assertEqual(failures, [(os.path.join(input_folder, "empty.htm"), "no output")])
+        self.assertEqual(sorted(os.listdir(self.output_folder)), ["page.xml"])
+
+    def test_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_tesseract.main(["-n", "500"]), 0)
+
+
+FAKE_TESSERACT = """#!{executable}
+import os
+import sys
+
+image, output, *configs = sys.argv[1:]
+name = os.path.splitext(os.path.basename(image))[0]
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "calls.txt"), "a") as f:
+    f.write(name + "\\n")
+
+if os.environ.get("OMP_THREAD_LIMIT") != "1" or output != "stdout" or configs[0] != "hocr" or name == "broken":
+    sys.stderr.write("cannot read " + image)
+    sys.exit(1)
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "page.hocr"), "rb") as f:
+    sys.stdout.buffer.write(f.read().replace(b"{{word}}", name.encode("utf-8")))
+"""
+
+
+class RunTesseractTests(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.input_folder = os.path.join(self.path, "photos")
+        self.output_folder = os.path.join(self.path, "xml")
+        os.makedirs(self.input_folder)
+
+        self.executable = os.path.join(self.path, "tesseract")
+        with open(self.executable, "w") as f:
+            f.write(FAKE_TESSERACT.format(executable=sys.executable))
+        os.chmod(self.executable, 0o755)
+
+        with open(os.path.join(self.path, "page.hocr"), "w", encoding="utf-8") as f:
+            f.write(HOCR_PAGE)
+
+        for name in ["photo0", "photo1", "photo2", "broken"]:
+            open(os.path.join(self.input_folder, name + ".png"), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def get_calls(self):
+        with open(os.path.join(self.path, "calls.txt")) as f:
+            return sorted(f.read().split())
+
+    def run_tesseract(self, workers, resume):
+        convert = functools.partial(run_tesseract.recognize, self.executable, run_tesseract.CONFIG_FILE)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            return batch_conversion.convert_directory(convert, self.input_folder, self.output_folder, ".png", workers, resume)
+
+    def test_recognize(self):
+        failures = self.run_tesseract(workers=2, resume=False)
+
+        self.assertEqual([os.path.basename(path) for path, _ in failures], ["broken.png"])
+        self.assertIn("cannot read", failures[0][1])
+        self.assertEqual(sorted(os.listdir(self.output_folder)), ["photo0.xml", "photo1.xml", "photo2.xml"])
+
+        with open(os.path.join(self.output_folder, "photo1.xml"), encoding="utf-8") as f:
+            output = f.read()
+
+        expected = etree.tostring(tesseract.process(HOCR_PAGE.format(word="photo1")), pretty_print=True).decode("utf-8")
+        self.assertEqual(output, expected)
+
+    def test_resume(self):
+        self.run_tesseract(workers=1, resume=True)
+        self.assertEqual(self.get_calls(), ["broken", "photo0", "photo1", "photo2"])
+
+        os.remove(os.path.join(self.output_folder, "photo2.xml"))
+        self.run_tesseract(workers=1, resume=True)
+        self.assertEqual(self.get_calls(), ["broken", "broken", "photo0", "photo1", "photo2", "photo2"])
+
+
 def main():
     args = parse_arguments()
 
     if args.verbose:
-        suite = unittest.TestLoader().loadTestsFromTestCase(BoundingBoxTests)
+        suite = unittest.TestLoader().loadTestsFromModule(sys.modules[__name__])
         unittest.TextTestRunner(verbosity=2).run(suite)
     else:
         unittest.main()
 
     return 0
 
+    def test_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_decoding.main(["hmm", "-n", "5", "-f", "60"]), 0)
+
+    def test_benchmark(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(benchmark_copy_photographs.main(["-n", "2", "--width", "400"]), 0)
+
 
 if __name__ == '__main__':
     sys.exit(main())
\ No newline at end of file
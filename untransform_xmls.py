@@ -1,10 +1,11 @@
-import os
 import sys
 import cv2
-import math
 import argparse
+import itertools
 import numpy as np
+from multiprocessing import Pool
 from dataset import Dataset, Point, Line, Page, Baseline, BoundingBox
+from log_index import load_log_index
 
 
 def parse_args():
@@ -12,102 +13,121 @@ def parse_args():
     parser.add_argument("-i", "--input", required=True)
     parser.add_argument("-o", "--output", required=True)
     parser.add_argument("-l", "--logs", required=True)
+    parser.add_argument("-c", "--cache", help="Path to dataset cache, it is created when it does not exist or it is outdated.", required=False, default=None)
+    parser.add_argument("-w", "--workers", help="Number of processes used for transforming the pages.", required=False, default=1, type=int)
     return parser.parse_args()
 
 
-def parse_matrix_row(row):
-    parts = row.split()
-    return [float(part) for part in parts]
+def transform_point(point, transformation):
+    np_point = np.array([[float(point.x), float(point.y)]])
+    np_new_point = cv2.perspectiveTransform(np_point[None, :, :], transformation)
+    new_point = Point(int(round(np_new_point[0][0][0])), int(round(np_new_point[0][0][1])))
 
+    return new_point
 
-def fill_transformation_row(transformation, row, data):
-    for index, value in enumerate(data):
-        transformation[row][index] = value
 
-    return transformation
+def get_points(lines):
+    points = []
 
+    for line in lines:
+        points.append(line.bounding_box.start)
+        points.append(line.bounding_box.end)
 
-def read_log(path):
-    transformation_width = 3
-    transformation_height = 3
+        if line.bounding_box.inner_points is not None:
+            points += line.bounding_box.inner_points
 
-    transformation = [[None for _ in range(transformation_width)] for _ in range(transformation_height)]
+        points.append(line.baseline.start)
+        points.append(line.baseline.end)
 
-    with open(path, "r") as f:
-        for index, line in enumerate(f):
-            line = line.strip()
+    return points
 
-            if index == 3 and line.startswith("T  [[") and line.endswith("]"):
-                transformation = fill_transformation_row(transformation, 0, parse_matrix_row(line[5:-1]))
 
-            elif index == 4 and line.startswith("[") and line.endswith("]"):
-                transformation = fill_transformation_row(transformation, 1, parse_matrix_row(line[1:-1]))
+def transform_lines(lines, transformation):
+    points = get_points(lines)
 
-            elif index == 5 and line.startswith("[") and line.endswith("]]"):
-                transformation = fill_transformation_row(transformation, 2, parse_matrix_row(line[1:-2]))
+    if len(points) == 0:
+        return []
 
-    return np.array(transformation)
+    # all points of the page are transformed by a single call, np.rint rounds half to even like round() in transform_point
+    coordinates = np.array([(point.x, point.y) for point in points], dtype=np.float64)
+    transformed = np.rint(cv2.perspectiveTransform(coordinates[None, :, :], transformation)[0]).astype(np.int64)
+    new_points = iter([Point(x, y) for x, y in transformed.tolist()])
 
+    new_lines = []
 
-def transform_point(point, transformation):
-    np_point = np.array([[float(point.x), float(point.y)]])
-    np_new_point = cv2.perspectiveTransform(np_point[None, :, :], transformation)
-    new_point = Point(int(round(np_new_point[0][0][0])), int(round(np_new_point[0][0][1])))
+    for line in lines:
+        new_bb_start = next(new_points)
+        new_bb_end = next(new_points)
 
-    return new_point
+        new_bb_inner_points = []
 
+        if line.bounding_box.inner_points is not None:
+            new_bb_inner_points = [next(new_points) for _ in line.bounding_box.inner_points]
 
-def process_dataset(dataset, log_path):
-    new_dataset = Dataset()
+        new_baseline_start = next(new_points)
+        new_baseline_end = next(new_points)
 
+        new_lines.append(Line(line.text, BoundingBox(new_bb_start, new_bb_end, new_bb_inner_points), Baseline(new_baseline_start, new_baseline_end), None))
+
+    return new_lines
+
+
+def untransform_page(task):
+    page_id, lines, inversion = task
+    return Page(page_id + ".jpg_rec", transform_lines(lines, inversion) if lines is not None else [])
+
+
+def get_tasks(dataset, log_index):
     total_pages = len(dataset.pages)
 
-    for index, page_id in enumerate(dataset.pages):
+    for index, page in enumerate(dataset.iter_pages()):
+        page_id = page.id.split(".")[0]
+
         print("\r{current}/{total} ({percentage:.2f} %)".format(current=index+1, total=total_pages, percentage=100 * float(index+1) / total_pages), end="")
 
-        transformation = read_log(os.path.join(log_path, page_id.split(".")[0] + ".jpg.log"))
+        transformation = log_index.transformation(page_id + ".jpg.log")
 
         try:
             inversion = np.linalg.inv(transformation)
-        except:
+        except (TypeError, np.linalg.LinAlgError):
             print("\nPage ID: {id}".format(id=page_id))
             print("Transformation matrix: {matrix}".format(matrix=transformation))
             continue
 
-        page = dataset.get_page(page_id)
-
-        lines = []
+        yield page_id, page.lines, inversion
 
-        if page.lines is not None:
-            for line in page.lines:
-                new_bb_start = transform_point(line.bounding_box.start, inversion)
-                new_bb_end = transform_point(line.bounding_box.end, inversion)
 
-                new_bb_inner_points = []
+def process_dataset(dataset, log_index, workers=1):
+    tasks = get_tasks(dataset, log_index)
 
-                if line.bounding_box.inner_points is not None:
-                    for point in line.bounding_box.inner_points:
-                        new_bb_inner_points.append(transform_point(point, inversion))
+    if workers > 1:
+        # pages are sent to the pool in batches, so only a limited number of pages is kept in memory
+        batch_size = workers * 16
 
-                new_baseline_start = transform_point(line.baseline.start, inversion)
-                new_baseline_end = transform_point(line.baseline.end, inversion)
+        with Pool(workers) as pool:
+            while True:
+                batch = list(itertools.islice(tasks, batch_size))
+                if len(batch) == 0:
+                    break
 
-                lines.append(Line(line.text, BoundingBox(new_bb_start, new_bb_end, new_bb_inner_points), Baseline(new_baseline_start, new_baseline_end), None))
-
-        new_dataset.add_page(Page(page_id + ".jpg_rec", lines))
+                yield from pool.imap(untransform_page, batch, chunksize=4)
+    else:
+        yield from map(untransform_page, tasks)
 
     print()
 
-    return new_dataset
-
 
 def main():
     args = parse_args()
 
-    dataset = Dataset(args.input, lazy=True)
+    if args.cache is not None:
+        dataset = Dataset.from_cache(args.cache, args.input, lazy=True)
+    else:
+        dataset = Dataset(args.input, lazy=True)
     print(dataset)
 
-    process_dataset(dataset, args.logs).save(args.output)
+    for page in process_dataset(dataset, load_log_index(args.logs, workers=args.workers), args.workers):
+        page.save(args.output)
 
     return 0
 
@@ -1,5 +1,8 @@
 import sys
+import bisect
 import argparse
+import numpy as np
+from typing import List, Optional, Tuple
 import decoding
 
 
@@ -24,30 +27,105 @@ def load_transcriptions(path):
     return transcriptions
 
 
-def search_in_dataset(dataset, filename, transcription):
-    result = None
+# characters are counted in this many buckets by their code point
+COUNT_BUCKETS = 64
 
-    base_filename = filename.rsplit("_", maxsplit=1)[0]
-    possible_files = [f for f in dataset if f.startswith(base_filename)]
 
-    best_match_distance = None
-    transcription_chars = [c for c in transcription]
+def get_character_counts(transcriptions) -> np.ndarray:
+    """Counts of the characters of every transcription in COUNT_BUCKETS buckets by the code point."""
+    lengths = [len(transcription) for transcription in transcriptions]
+    code_points = np.frombuffer("".join(transcriptions).encode("utf-32-le"), dtype=np.uint32)
+    rows = np.repeat(np.arange(len(transcriptions)), lengths)
+    counts = np.bincount(rows * COUNT_BUCKETS + code_points % COUNT_BUCKETS, minlength=len(transcriptions) * COUNT_BUCKETS)
+
+    return counts.reshape(len(transcriptions), COUNT_BUCKETS).astype(np.int32)
+
+
+def get_distance_lower_bounds(counts, transcription_counts) -> np.ndarray:
+    # every edit operation removes at most one surplus character on each side, also when the characters share buckets,
+    # the bound is at least the length difference
+    difference = counts - transcription_counts
+
+    return np.maximum(np.maximum(difference, 0).sum(axis=1), np.maximum(-difference, 0).sum(axis=1))
+
+
+class TranscriptionIndex:
+    """
+    Dataset transcriptions with filenames sorted for prefix searches with bisect. Character counts of the
+    transcriptions give lower bounds of the edit distance, the candidates are checked from the lowest bound and the
+    exact distance is computed only while a candidate can still be better than the best one found.
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.filenames = sorted(dataset)
+        # positions in the dataset decide between candidates with the same distance
+        order = {filename: position for position, filename in enumerate(dataset)}
+        self.positions = np.array([order[filename] for filename in self.filenames], dtype=np.int64)
+        self.counts = get_character_counts([dataset[filename] for filename in self.filenames])
+
+    def get_range(self, prefix) -> Tuple[int, int]:
+        """Range of the sorted filenames which start with the prefix."""
+        start = bisect.bisect_left(self.filenames, prefix)
+
+        if len(prefix) == 0:
+            return start, len(self.filenames)
+
+        # the filenames starting with the prefix sort before the prefix with its last character incremented
+        end = bisect.bisect_left(self.filenames, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+
+        return start, end
 
-    for possible_file in possible_files:
-        distance = decoding.levenshtein_distance([c for c in dataset[possible_file]], transcription_chars)
+    def with_prefix(self, prefix) -> List[str]:
+        start, end = self.get_range(prefix)
+        return self.filenames[start:end]
 
-        if best_match_distance is None or best_match_distance > distance:
-            best_match_distance = distance
-            result = possible_file
+    def search(self, prefix, transcription) -> Optional[str]:
+        """Filename with the prefix and the nearest transcription, the first one in the dataset on ties."""
+        start, end = self.get_range(prefix)
+        lower_bounds = get_distance_lower_bounds(self.counts[start:end], get_character_counts([transcription])[0])
+        positions = self.positions[start:end]
+        transcription_chars = [c for c in transcription]
+
+        result = None
+        best_match = None
+
+        for candidate in np.lexsort((positions, lower_bounds)).tolist():
+            lower_bound, position = lower_bounds[candidate], positions[candidate]
+
+            if best_match is not None:
+                # the remaining candidates cannot be nearer
+                if lower_bound > best_match[0]:
+                    break
+
+                # the same distance would lose by the position
+                if (lower_bound, position) >= best_match:
+                    continue
+
+            filename = self.filenames[start + candidate]
+            distance = decoding.levenshtein_distance([c for c in self.dataset[filename]], transcription_chars)
+
+            if best_match is None or (distance, position) < best_match:
+                best_match = (distance, position)
+                result = filename
+
+        return result
+
+
+def search_in_dataset(dataset, filename, transcription, index=None):
+    if index is None:
+        index = TranscriptionIndex(dataset)
+
+    base_filename = filename.rsplit("_", maxsplit=1)[0]
 
-    return result
+    return index.search(base_filename, transcription)
 
 
 def update(dataset_transcriptions, test_transcriptions):
     updated_transcriptions = []
+    index = TranscriptionIndex(dataset_transcriptions)
 
     for filename in test_transcriptions:
-        dataset_filename = search_in_dataset(dataset_transcriptions, filename, test_transcriptions[filename])
+        dataset_filename = search_in_dataset(dataset_transcriptions, filename, test_transcriptions[filename], index)
 
         if dataset_filename is not None:
             updated_transcriptions.append("{filename} {transcription}\n".format(filename=dataset_filename, transcription=test_transcriptions[filename]))